@@ -1,15 +1,68 @@
-from typing import Any
+import heapq
+import itertools
+from threading import Lock
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
 
 import pandas as pd
 from PyQt6 import QtCore
-from PyQt6.QtCore import QModelIndex
+from PyQt6.QtCore import QModelIndex, Qt, pyqtSignal
 from pandas import DataFrame
 
+from src.family_album_lib.progress import ProgressTracker
+from src.family_album_lib.scan_control import CancellationToken
+
+_VISIBLE = 0  # priorities of lazy evaluation: rows shown by the view (the most recently shown first),
+_SORTED = 1  # rows of the table sorted by a lazy column,
+_BACKGROUND = 2  # the other rows in the order of the table
+_EVALUATION_BATCH = 16  # rows passed to the evaluation function at once
+_PLACEHOLDER = "..."  # text of lazy columns of rows which are not evaluated yet
+
 
 class DataFrameModel(QtCore.QAbstractTableModel):
-    def __init__(self, df: DataFrame = DataFrame(), parent=None):
+    """
+    Table model of DataFrame.
+
+    In lazy mode values of lazy columns of pending rows are empty at first and are evaluated in the background by
+    'evaluate_pending' - rows requested by the view go first, so the visible part of the table is filled before the
+    rest. Evaluated values are memoized in the DataFrame in the GUI thread. Sorting by a lazy column raises
+    priority of all pending rows and the table is sorted again when they are evaluated.
+    """
+
+    _Evaluated = pyqtSignal(object)  # evaluated keys and DataFrame with their rows
+
+    def __init__(self, df: DataFrame = DataFrame(), parent=None, lazy_columns: Iterable[str] = (),
+                 pending: Iterable = (), key_column: str = "file_path"):
+        """
+        :param df: DataFrame shown by the model, it is sorted and updated in place.
+        :param lazy_columns: columns evaluated on demand.
+        :param pending: keys of rows whose lazy columns are not evaluated yet.
+        :param key_column: column with unique keys of rows, e.g. paths of files.
+        """
         QtCore.QAbstractTableModel.__init__(self, parent=parent)
         self.__dataframe = df
+        self.__key_column = key_column
+        self.__lazy_columns = [column for column in lazy_columns if column in df.columns and key_column in df.columns]
+        self.__waiting = set(pending) if self.__lazy_columns else set()  # rows not evaluated yet, GUI thread only
+        self.__positions: Optional[Dict[Any, int]] = None  # positions of rows by keys, rebuilt after sorting
+        self.__sort_order: Optional[Tuple[str, bool]] = None  # lazy column to sort by again when it is evaluated
+        self.__lock = Lock()  # guards the queue shared with the evaluation
+        self.__queued = set(self.__waiting)  # rows not taken by the evaluation yet
+        self.__priorities = dict.fromkeys(self.__queued, _BACKGROUND)
+        self.__sequence = itertools.count()
+        self.__heap: List[Tuple[int, int, Any]] = []
+        if self.__queued:
+            keys = df[key_column].tolist()
+            self.__heap = [(_BACKGROUND, position, key) for position, key in enumerate(keys) if key in self.__queued]
+        self._Evaluated.connect(self.__apply_evaluated, Qt.ConnectionType.QueuedConnection)
+
+    @property
+    def dataframe(self) -> DataFrame:
+        return self.__dataframe
+
+    @property
+    def pending(self) -> set:
+        """Keys of rows whose lazy columns are not evaluated yet."""
+        return set(self.__waiting)
 
     def headerData(self, section: int, orientation: QtCore.Qt.Orientation,
                    role: int = QtCore.Qt.ItemDataRole.DisplayRole):
@@ -31,6 +84,11 @@ class DataFrameModel(QtCore.QAbstractTableModel):
             return None
         if not index.isValid():
             return None
+        if self.__waiting and self.__dataframe.columns[index.column()] in self.__lazy_columns:
+            key = self.__dataframe[self.__key_column].iat[index.row()]
+            if key in self.__waiting:
+                self.__request([key], _VISIBLE)
+                return _PLACEHOLDER
         return str(self.__dataframe.iloc[index.row(), index.column()])
 
     def setData(self, index: QModelIndex, value: Any, role: int) -> bool:
@@ -53,7 +111,100 @@ class DataFrameModel(QtCore.QAbstractTableModel):
 
     def sort(self, column: int, order: int):
         column_name = self.__dataframe.columns.tolist()[column]
+        ascending = order == QtCore.Qt.SortOrder.AscendingOrder
+        self.__sort_order = None
+        if column_name in self.__lazy_columns and self.__waiting:
+            keys = self.__dataframe[self.__key_column].tolist()
+            self.__request([key for key in keys if key in self.__waiting], _SORTED)
+            self.__sort_order = (column_name, ascending)
+        self.__sort_by(column_name, ascending)
+
+    def evaluate_pending(self, evaluate: Callable[[List[Any]], DataFrame], token: CancellationToken,
+                         report: Callable) -> int:
+        """
+        Evaluate lazy columns of pending rows, it is a job function running in a thread of 'JobManager'. Rows left
+        by a cancelled or failed evaluation stay pending and are evaluated by the next call.
+
+        :param evaluate: function returning DataFrame with rows of the passed keys (rows that can not be evaluated
+                         may be missing), it is called in the thread of the job.
+        :param token: token of the job.
+        :param report: progress callback of the job.
+        :return: number of evaluated rows.
+        """
+        with self.__lock:
+            total = len(self.__queued)
+        progress = ProgressTracker(total, lambda snapshot: report(snapshot.files_done, snapshot.files_total,
+                                                                  snapshot))
+        evaluated = 0
+        while token.wait_while_paused():
+            keys = self.__take(_EVALUATION_BATCH)
+            if not keys:
+                break
+            try:
+                data_frame = evaluate(keys)
+            except Exception:
+                self.__release(keys)
+                raise
+            self._Evaluated.emit((keys, data_frame))
+            evaluated += len(keys)
+            progress.advance(len(keys))
+        if not token.is_cancelled and total > 0:
+            progress.finish()
+        return evaluated
+
+    def __request(self, keys: Iterable, priority: int) -> None:
+        with self.__lock:
+            for key in keys:
+                if key in self.__queued and priority < self.__priorities[key]:
+                    self.__priorities[key] = priority
+                    order = next(self.__sequence)
+                    heapq.heappush(self.__heap, (priority, -order if priority == _VISIBLE else order, key))
+
+    def __take(self, count: int) -> list:
+        with self.__lock:
+            keys = []
+            while self.__heap and len(keys) < count:
+                priority, _, key = heapq.heappop(self.__heap)
+                if key in self.__queued and self.__priorities[key] == priority:  # skip outdated requests
+                    self.__queued.discard(key)
+                    keys.append(key)
+            return keys
+
+    def __release(self, keys: list) -> None:
+        """Return taken rows to the queue, e.g. when their evaluation failed."""
+        with self.__lock:
+            for key in keys:
+                self.__queued.add(key)
+                self.__priorities[key] = _BACKGROUND
+                heapq.heappush(self.__heap, (_BACKGROUND, next(self.__sequence), key))
+
+    def __apply_evaluated(self, evaluated: Tuple[list, DataFrame]) -> None:
+        """Memoize evaluated values in the DataFrame, it runs in the GUI thread."""
+        keys, data_frame = evaluated
+        if self.__positions is None:
+            self.__positions = {key: position for position, key in
+                                enumerate(self.__dataframe[self.__key_column].tolist())}
+        found = [(self.__positions[key], source) for source, key in enumerate(data_frame[self.__key_column])
+                 if key in self.__positions and key in self.__waiting]
+        if found:
+            rows = [row for row, _ in found]
+            sources = [source for _, source in found]
+            for column in self.__lazy_columns:
+                values = data_frame[column].to_numpy()[sources]
+                self.__dataframe.iloc[rows, self.__dataframe.columns.get_loc(column)] = values
+        self.__waiting.difference_update(keys)
+        rows = [self.__positions[key] for key in keys if key in self.__positions]
+        if rows:
+            columns = [self.__dataframe.columns.get_loc(column) for column in self.__lazy_columns]
+            self.dataChanged.emit(self.index(min(rows), min(columns)), self.index(max(rows), max(columns)))
+        if not self.__waiting and self.__sort_order is not None:
+            column_name, ascending = self.__sort_order
+            self.__sort_order = None
+            self.__sort_by(column_name, ascending)
+
+    def __sort_by(self, column_name: str, ascending: bool) -> None:
         self.layoutAboutToBeChanged.emit()
-        self.__dataframe.sort_values(column_name, ascending=order == QtCore.Qt.SortOrder.AscendingOrder, inplace=True)
+        self.__dataframe.sort_values(column_name, ascending=ascending, inplace=True)
         self.__dataframe.reset_index(inplace=True, drop=True)
+        self.__positions = None
         self.layoutChanged.emit()
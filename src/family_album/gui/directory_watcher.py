@@ -0,0 +1,116 @@
+from functools import partial
+from typing import Any, Callable, Optional, Set
+
+from PyQt6.QtCore import QFileSystemWatcher, QObject, QTimer, pyqtSignal
+
+from src.family_album.gui.job_manager import JobManager
+from src.family_album_lib.directory_state import DirectoryState, FileChanges
+from src.family_album_lib.scan_control import CancellationToken
+
+
+class DirectoryWatcher(QObject):
+    """
+    Watch mode of the selected directory. Directories of the tree are watched by QFileSystemWatcher, bursts of
+    notifications are collected for a short delay and only the reported directories are listed again. When the
+    system does not accept watches for all directories (e.g. limit of inotify watches is reached), directories
+    are polled by their modification time instead. With a job manager the initial walk of the tree runs as its job
+    and watching starts when the job is finished.
+    """
+    _DELAY = 500  # msec to collect notifications before directories are listed
+    _POLL_INTERVAL = 5_000  # msec between polls of the fallback
+
+    FilesChanged = pyqtSignal(object)  # FileChanges
+    WatchStarted = pyqtSignal(str, bool)  # directory, True if it is polled
+
+    def __init__(self, parent: Optional[QObject] = None, job_manager: Optional[JobManager] = None) -> None:
+        super().__init__(parent)
+        self.__job_manager = job_manager
+        self.__state_job: Optional[int] = None  # job walking the directory before it is watched
+        if job_manager is not None:
+            job_manager.JobFinished.connect(self.__job_finished)
+        self.__state: Optional[DirectoryState] = None
+        self.__changed: Set[str] = set()
+        self.__watcher: Optional[QFileSystemWatcher] = None
+        self.__delay = QTimer(self)
+        self.__delay.setSingleShot(True)
+        self.__delay.setInterval(self._DELAY)
+        self.__delay.timeout.connect(self.__refresh)
+        self.__poll = QTimer(self)
+        self.__poll.setInterval(self._POLL_INTERVAL)
+        self.__poll.timeout.connect(self.__poll_changes)
+
+    @property
+    def directory(self) -> str:
+        return self.__state.directory if self.__state is not None else ""
+
+    @property
+    def is_polling(self) -> bool:
+        return self.__poll.isActive()
+
+    def watch(self, directory: str) -> None:
+        """
+        Start watching the directory, the previous one is not watched anymore. 'WatchStarted' is emitted when the
+        directory is walked and watched.
+        """
+        self.stop()
+        if self.__job_manager is None:
+            self.__start(DirectoryState(directory))
+        else:
+            self.__state_job = self.__job_manager.submit(f"walk of {directory} to watch it",
+                                                         partial(self.__walk, directory))
+
+    @staticmethod
+    def __walk(directory: str, token: CancellationToken, report: Callable) -> DirectoryState:
+        """Job building the initial state of the directory, it runs in a thread of the job manager."""
+        return DirectoryState(directory)
+
+    def __job_finished(self, job_id: int, result: Any) -> None:
+        if job_id == self.__state_job:
+            self.__state_job = None
+            self.__start(result)
+
+    def __start(self, state: DirectoryState) -> None:
+        self.__state = state
+        self.__watcher = QFileSystemWatcher(self)
+        self.__watcher.directoryChanged.connect(self.__directory_changed)
+        if self.__watcher.addPaths(self.__state.directories):
+            self.__watcher.removePaths(self.__watcher.directories())
+            self.__poll.start()  # not all directories can be watched, so none of them is
+        self.WatchStarted.emit(state.directory, self.is_polling)
+
+    def stop(self) -> None:
+        if self.__state_job is not None:
+            self.__job_manager.cancel(self.__state_job)  # the walk is not watched when it returns
+            self.__state_job = None
+        self.__delay.stop()
+        self.__poll.stop()
+        if self.__watcher is not None:
+            self.__watcher.deleteLater()
+            self.__watcher = None
+        self.__state = None
+        self.__changed = set()
+
+    def __directory_changed(self, path: str) -> None:
+        self.__changed.add(path)
+        self.__delay.start()
+
+    def __refresh(self) -> None:
+        if self.__state is None:
+            return
+        changed, self.__changed = self.__changed, set()
+        watched = set(self.__state.directories)
+        self.__emit(self.__state.refresh(changed))
+        directories = set(self.__state.directories)
+        if directories - watched and self.__watcher.addPaths(list(directories - watched)):
+            self.__watcher.removePaths(self.__watcher.directories())
+            self.__poll.start()
+        if watched - directories:
+            self.__watcher.removePaths(list(watched - directories))
+
+    def __poll_changes(self) -> None:
+        if self.__state is not None:
+            self.__emit(self.__state.poll())
+
+    def __emit(self, changes: FileChanges) -> None:
+        if changes:
+            self.FilesChanged.emit(changes)
@@ -0,0 +1,169 @@
+from threading import Lock
+from typing import Any, Callable, Dict, Optional
+
+from PyQt6.QtCore import QObject, QThreadPool, Qt, pyqtSignal
+
+from src.family_album.gui.progress_bus import ProgressBus
+from src.family_album_lib.progress import ProgressSnapshot
+from src.family_album_lib.scan_control import CancellationToken
+
+# function of a job: takes the token of the job and the progress callback with the signature of 'update_progress'
+JobFunction = Callable[[CancellationToken, Callable[..., None]], Any]
+
+
+class Job:
+    """Operation queued by 'JobManager', it runs in a thread of the pool and reports back by signals."""
+
+    def __init__(self, job_id: int, name: str, function: JobFunction, progress: ProgressBus,
+                 done: pyqtSignal) -> None:
+        self.job_id = job_id
+        self.name = name
+        self.token = CancellationToken()
+        self.progress = progress
+        self.__function = function
+        self.__done = done
+        self.__lock = Lock()
+        self.__running = False
+        self.__dropped = False
+
+    def drop(self) -> bool:
+        """
+        Drop the job if it has not started running yet, it returns without calling the function then.
+
+        :return: True if the job was dropped, False if it is already running and ends by itself.
+        """
+        with self.__lock:
+            self.__dropped = not self.__running
+            return self.__dropped
+
+    def run(self) -> None:
+        with self.__lock:
+            self.__running = not self.__dropped
+        if not self.__running:
+            return  # the manager has already finished the dropped job, its progress bus may be deleted
+        if self.token.is_cancelled:
+            self.__done.emit(self.job_id, JobManager.CANCELLED, None)
+            return
+        self.progress.report(0, 0)  # the job has started
+        try:
+            result = self.__function(self.token, self.progress.report)
+        except Exception as err:
+            self.__done.emit(self.job_id, JobManager.FAILED, f"{self.name} failed: {err}")
+            return
+        self.__done.emit(self.job_id, JobManager.CANCELLED if self.token.is_cancelled else JobManager.FINISHED,
+                         result)
+
+
+class JobManager(QObject):
+    """
+    Queue of long-running operations executed in the background by QThreadPool, so the GUI stays responsive.
+
+    Up to 'max_jobs' jobs run at the same time, e.g. scans of several directories, the others wait in the
+    queue. Every job has its own cancellation token, so it can be cancelled or paused, and its own progress.
+    All signals are delivered in the GUI thread: progress is coalesced to the latest state of the job and
+    result of the job function is passed by 'JobFinished'.
+    """
+    _MAX_JOBS = 4  # jobs running at the same time
+    FINISHED = "finished"
+    CANCELLED = "cancelled"
+    FAILED = "failed"
+
+    JobStarted = pyqtSignal(int, str)  # job id, name
+    JobProgress = pyqtSignal(int, object)  # job id, ProgressSnapshot
+    JobFinished = pyqtSignal(int, object)  # job id, result of the job function
+    JobCancelled = pyqtSignal(int)  # job id, the job was cancelled before or while it ran
+    JobFailed = pyqtSignal(int, str)  # job id, error message
+    _JobDone = pyqtSignal(int, str, object)
+
+    def __init__(self, parent: Optional[QObject] = None, max_jobs: int = _MAX_JOBS) -> None:
+        super().__init__(parent)
+        self.__pool = QThreadPool(self)
+        self.__pool.setMaxThreadCount(max(1, max_jobs))
+        self.__jobs: Dict[int, Job] = {}
+        self.__started: Dict[int, bool] = {}
+        self.__next_id = 1
+        self._JobDone.connect(self.__job_done, Qt.ConnectionType.QueuedConnection)
+
+    @property
+    def jobs(self) -> Dict[int, str]:
+        """Names of queued and running jobs by their ids."""
+        return {job_id: job.name for job_id, job in self.__jobs.items()}
+
+    @property
+    def is_paused(self) -> bool:
+        """True if all jobs are paused."""
+        return bool(self.__jobs) and all(job.token.is_paused for job in self.__jobs.values())
+
+    def submit(self, name: str, function: JobFunction) -> int:
+        """
+        Queue the job.
+
+        :param name: name of the job shown to the user.
+        :param function: function called in a thread of the pool with the token of the job and the progress
+                         callback, which accepts (finished, total, progress snapshot) as 'update_progress'
+                         of analysers does.
+        :return: id of the job, it is passed by all signals of the job.
+        """
+        job_id = self.__next_id
+        self.__next_id += 1
+        progress = ProgressBus(self)
+        progress.ProgressChanged.connect(lambda snapshot: self.__job_progress(job_id, snapshot))
+        job = Job(job_id, name, function, progress, self._JobDone)
+        self.__jobs[job_id] = job
+        self.__started[job_id] = False
+        self.__pool.start(job.run)
+        return job_id
+
+    def cancel(self, job_id: int) -> None:
+        job = self.__jobs.get(job_id)
+        if job is None:
+            return
+        job.token.cancel()
+        if job.drop():  # queued job is finished at once, a running one reports cancellation when it returns
+            self.__job_done(job_id, self.CANCELLED, None)
+
+    def pause(self, job_id: int) -> None:
+        if job_id in self.__jobs:
+            self.__jobs[job_id].token.pause()
+
+    def resume(self, job_id: int) -> None:
+        if job_id in self.__jobs:
+            self.__jobs[job_id].token.resume()
+
+    def cancel_all(self) -> None:
+        for job_id in list(self.__jobs):
+            self.cancel(job_id)
+
+    def pause_all(self) -> None:
+        for job_id in self.__jobs:
+            self.pause(job_id)
+
+    def resume_all(self) -> None:
+        for job_id in self.__jobs:
+            self.resume(job_id)
+
+    def wait(self, msecs: int = -1) -> bool:
+        """Wait until running jobs are finished, e.g. before the application quits after 'cancel_all'."""
+        return self.__pool.waitForDone(msecs)
+
+    def __job_progress(self, job_id: int, snapshot: ProgressSnapshot) -> None:
+        if job_id not in self.__jobs:
+            return
+        if not self.__started[job_id]:
+            self.__started[job_id] = True
+            self.JobStarted.emit(job_id, self.__jobs[job_id].name)
+        if snapshot.files_total > 0:
+            self.JobProgress.emit(job_id, snapshot)
+
+    def __job_done(self, job_id: int, state: str, result: Any) -> None:
+        job = self.__jobs.pop(job_id, None)
+        self.__started.pop(job_id, None)
+        if job is None:
+            return
+        job.progress.deleteLater()
+        if state == self.FINISHED:
+            self.JobFinished.emit(job_id, result)
+        elif state == self.CANCELLED:
+            self.JobCancelled.emit(job_id)
+        else:
+            self.JobFailed.emit(job_id, result)
@@ -5,16 +5,19 @@ __version__ = "0.1"
 __license__ = """MIT Licence"""
 
 import os
-import time
 
 from PyQt6 import uic, QtWidgets
 from PyQt6.QtWidgets import QMainWindow, QVBoxLayout
 
+from src.family_album.gui.directory_watcher import DirectoryWatcher
+from src.family_album.gui.job_manager import JobManager
 from src.family_album.gui.widgets.directory_view import DirectoryView
 from src.family_album.gui.widgets.duplication_checker import DuplicationChecker
 from src.family_album.gui.widgets.file_organizer import FileOrganizer
 from src.family_album.gui.py_ui.main_window import Ui_FamilyAlbumUI
 from src.family_album_lib.create_logger import CustomLogger
+from src.family_album_lib.directory_state import FileChanges
+from src.family_album_lib.progress import ProgressSnapshot
 
 
 class MainWindow(QMainWindow, Ui_FamilyAlbumUI):
@@ -31,6 +34,18 @@ class MainWindow(QMainWindow, Ui_FamilyAlbumUI):
             self.setWindowTitle(self.title)
             self.dir_viewer = DirectoryView(self)
             self.dir_viewer.ItemSelected.connect(self.evt_dir_selected)
+            self.dir_viewer.WatchToggled.connect(self.evt_watch_toggled)
+            self._selected_dir: str = ""
+            self.job_manager = JobManager(self)  # long operations run in background, widgets submit them here
+            self.dir_watcher = DirectoryWatcher(self, self.job_manager)  # the tree is walked by a job
+            self.dir_watcher.FilesChanged.connect(self.evt_files_changed)
+            self.dir_watcher.WatchStarted.connect(self.evt_watch_started)
+            self.job_manager.JobStarted.connect(self.evt_job_started)
+            self.job_manager.JobProgress.connect(self.evt_job_progress)
+            self.job_manager.JobFinished.connect(self.evt_job_done)
+            self.job_manager.JobCancelled.connect(self.evt_job_done)
+            self.job_manager.JobFailed.connect(self.evt_job_done)
+            self._jobs_progress: dict = {}  # the latest progress of running jobs by job id
             self.duplication_checker = DuplicationChecker(self)
             self.duplication_checker.ItemSelected.connect(self.evt_show_in_statusbar)
             self.file_organizer = FileOrganizer(self)
@@ -60,6 +75,18 @@ class MainWindow(QMainWindow, Ui_FamilyAlbumUI):
             self.progressBar.setValue(0)
             self.progressBar.setVisible(False)
             self.progressBar.setTextVisible(False)
+            # pause and cancel all background jobs
+            self.pbPauseJobs = QtWidgets.QToolButton()
+            self.pbPauseJobs.setText("Pause")
+            self.pbPauseJobs.setCheckable(True)
+            self.pbPauseJobs.toggled.connect(self.evt_pause_jobs)
+            self.statusBar().addPermanentWidget(self.pbPauseJobs)
+            self.pbCancelJobs = QtWidgets.QToolButton()
+            self.pbCancelJobs.setText("Cancel")
+            self.pbCancelJobs.clicked.connect(self.job_manager.cancel_all)
+            self.statusBar().addPermanentWidget(self.pbCancelJobs)
+            self.pbPauseJobs.setVisible(False)
+            self.pbCancelJobs.setVisible(False)
         except Exception as err:
             self._logger.log_error(f"Error on main window initialization: {err}")
 
@@ -69,10 +96,32 @@ class MainWindow(QMainWindow, Ui_FamilyAlbumUI):
             self.statusBar().showMessage(message, self._interval)
             self.duplication_checker.selected_path = selected_dir
             self.file_organizer.selected_path = selected_dir
+            self._selected_dir = selected_dir
+            if self.dir_viewer.cb_watch.isChecked():
+                self.evt_watch_toggled(True)
         elif os.path.isfile(selected_dir):
             message = f'Selected file {selected_dir}.'
             self.statusBar().showMessage(message, self._interval)
 
+    def evt_watch_toggled(self, enabled: bool) -> None:
+        try:
+            if enabled and os.path.isdir(self._selected_dir):
+                self.dir_watcher.watch(self._selected_dir)
+            else:
+                self.dir_watcher.stop()
+        except Exception as err:
+            self.log_event(f"Error on watching directory {self._selected_dir}: {err}")
+
+    def evt_watch_started(self, directory: str, polling: bool) -> None:
+        mode = "by polling" if polling else "by notifications"
+        self.statusBar().showMessage(f"Watching {directory} for changes {mode}.", self._interval)
+
+    def evt_files_changed(self, changes: FileChanges) -> None:
+        self.statusBar().showMessage(f"Files changed: {len(changes.added)} added, {len(changes.removed)} removed, " +
+                                     f"{len(changes.modified)} modified.", self._interval)
+        self.duplication_checker.apply_changes(changes)
+        self.file_organizer.apply_changes(changes)
+
     def evt_show_in_statusbar(self, message: str) -> None:
         self.statusBar().showMessage(message, self._interval)
 
@@ -84,28 +133,71 @@ class MainWindow(QMainWindow, Ui_FamilyAlbumUI):
         self._logger.log_debug(f"Start analysis '{message}'")
         self.update()
 
-    def evt_update_progress(self, finished: int, total: int) -> None:
-        progress = int(finished / total * 100)
-        current_progress = self.progressBar.value()
-        if current_progress < progress <= self.progressBar.maximum():
-            self.progressBar.setValue(progress)
-            self.statusBar().showMessage(f"Finished {finished} files from {total} total scope of " +
-                                         f"files to analyze", self._interval)
-            self.update()
-        self._logger.log_debug(f"Update progress: done '{finished}' files of totally '{total}' to be analyzed")
-        if finished == total:
-            time.sleep(1)
+    def evt_job_started(self, job_id: int, name: str) -> None:
+        self._jobs_progress[job_id] = None
+        if self.pbPauseJobs.isChecked():
+            self.job_manager.pause(job_id)  # jobs started while paused wait with the others
+        self.pbPauseJobs.setVisible(True)
+        self.pbCancelJobs.setVisible(True)
+        self.evt_start_analysis(f"Start {name}.")
+
+    def evt_job_progress(self, job_id: int, progress: ProgressSnapshot) -> None:
+        """Show progress of all running jobs together."""
+        self._jobs_progress[job_id] = progress
+        running = [snapshot for snapshot in self._jobs_progress.values() if snapshot is not None]
+        etas = [snapshot.eta for snapshot in running if snapshot.eta is not None]
+        self.evt_update_progress(ProgressSnapshot(sum(snapshot.files_done for snapshot in running),
+                                                  sum(snapshot.files_total for snapshot in running),
+                                                  sum(snapshot.bytes_done for snapshot in running),
+                                                  sum(snapshot.files_per_second for snapshot in running),
+                                                  sum(snapshot.bytes_per_second for snapshot in running),
+                                                  max(etas) if etas else None,
+                                                  sum(snapshot.level for snapshot in running)))
+
+    def evt_job_done(self, job_id: int, *_) -> None:
+        self._jobs_progress.pop(job_id, None)
+        if not self.job_manager.jobs:
+            self.pbPauseJobs.setChecked(False)
+            self.pbPauseJobs.setVisible(False)
+            self.pbCancelJobs.setVisible(False)
             self.evt_finish_analysis("Finish analysis.")
 
+    def evt_pause_jobs(self, paused: bool) -> None:
+        if paused:
+            self.job_manager.pause_all()
+        else:
+            self.job_manager.resume_all()
+        self.pbPauseJobs.setText("Resume" if paused else "Pause")
+
+    def evt_update_progress(self, progress: ProgressSnapshot) -> None:
+        if progress.files_total == 0:
+            return
+        percent = int(progress.files_done / progress.files_total * 100)
+        self.progressBar.setValue(min(self.progressBar.maximum(), percent))
+        details = [f"{progress.files_per_second:.1f} files/s"]
+        if progress.bytes_per_second > 0:
+            details.append(f"{progress.bytes_per_second / 1024 / 1024:.1f} MB/s")
+        if progress.level:
+            details.append(f"reading {progress.level} files at once")
+        if progress.eta is not None:
+            minutes, seconds = divmod(int(progress.eta), 60)
+            details.append(f"{minutes}:{seconds:02d} left")
+        self.statusBar().showMessage(f"Finished {progress.files_done} files from {progress.files_total} total scope "
+                                     f"of files to analyze ({', '.join(details)})", self._interval)
+
     def evt_finish_analysis(self, message: str) -> None:
         self.progressBar.setValue(0)
         self.progressBar.setVisible(False)
         self.progressBar.setTextVisible(False)
         self.statusBar().showMessage(message, self._interval)
         self._logger.log_debug(f"Finish analysis '{message}'")
-        self.duplication_checker.populate_duplications()
         self.update()
 
+    def closeEvent(self, event) -> None:
+        self.job_manager.cancel_all()
+        self.job_manager.wait()
+        super().closeEvent(event)
+
     def log_event(self, message: str) -> None:
         if 'error' in message.lower():
             self._logger.log_error(message)
@@ -0,0 +1,38 @@
+from threading import Lock
+from typing import Optional
+
+from PyQt6.QtCore import QObject, Qt, pyqtSignal
+
+from src.family_album_lib.progress import ProgressSnapshot
+
+
+class ProgressBus(QObject):
+    """
+    Delivery of progress of analysers to the GUI thread. 'report' may be called from any thread, updates are
+    coalesced: while one is waiting for the event loop, newer updates replace it, so the GUI handles only the
+    latest state and never falls behind the workers.
+    """
+
+    ProgressChanged = pyqtSignal(object)  # ProgressSnapshot
+    _Delivery = pyqtSignal()
+
+    def __init__(self, parent: Optional[QObject] = None) -> None:
+        super().__init__(parent)
+        self.__lock = Lock()
+        self.__latest: Optional[ProgressSnapshot] = None
+        self._Delivery.connect(self.__deliver, Qt.ConnectionType.QueuedConnection)
+
+    def report(self, finished: int, total: int, progress: Optional[ProgressSnapshot] = None) -> None:
+        """Take update of the analyser, it has the signature of 'update_progress' of analysers."""
+        snapshot = progress if isinstance(progress, ProgressSnapshot) else ProgressSnapshot(finished, total)
+        with self.__lock:
+            waiting = self.__latest is not None
+            self.__latest = snapshot
+        if not waiting:
+            self._Delivery.emit()
+
+    def __deliver(self) -> None:
+        with self.__lock:
+            snapshot, self.__latest = self.__latest, None
+        if snapshot is not None:
+            self.ProgressChanged.emit(snapshot)
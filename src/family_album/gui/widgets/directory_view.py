@@ -13,6 +13,7 @@ from src.family_album.gui.widgets.py_ui.directory_view import Ui_Form
 
 class DirectoryView(QtWidgets.QWidget, Ui_Form):
     ItemSelected = pyqtSignal(str)
+    WatchToggled = pyqtSignal(bool)
 
     def __init__(self, parent):
         super().__init__(parent)
@@ -33,6 +34,7 @@ class DirectoryView(QtWidgets.QWidget, Ui_Form):
         self.directory_tree.sortByColumn(0, QtCore.Qt.SortOrder.AscendingOrder)
         # Set the width for better visual presentation of directory names
         self.directory_tree.setColumnWidth(0, 400)
+        self.cb_watch.toggled.connect(self.WatchToggled.emit)
 
     @QtCore.pyqtSlot(QtCore.QModelIndex)
     def on_treeView_clicked(self, index):
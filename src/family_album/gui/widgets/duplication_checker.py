@@ -3,19 +3,35 @@ import json
 import os.path
 import shutil
 import sys
+from functools import partial
 from os import path
+from typing import Any, Callable, Dict, Tuple
 from PyQt6 import QtWidgets, uic, QtGui
 from PyQt6.QtCore import pyqtSignal, QStringListModel, Qt, QItemSelectionModel
-from PyQt6.QtGui import QAction
+from PyQt6.QtGui import QAction, QStandardItemModel, QStandardItem
 from PyQt6.QtWidgets import QVBoxLayout, QDialog, QMessageBox, QLabel, QMainWindow, QMenu, QListView
 
 from family_album.gui.widgets.py_ui.duplication_checker_ui import Ui_Form
 from src.family_album.utility_functions.image_utils import is_image_file
+from src.family_album_lib.directory_state import FileChanges
 from src.family_album_lib.duplicate_file_analyser import DuplicateFileAnalyser
+from src.family_album_lib.scan_checkpoint import ScanCheckpoint
+from src.family_album_lib.scan_control import CancellationToken
+from src.family_album_lib.similar_files_analyser import SimilarFilesAnalyser
+from src.family_album_lib.similar_image_analyser import SimilarImageAnalyser
+from src.family_album_lib.similar_video_analyser import SimilarVideoAnalyser
 
 
 class DuplicationChecker(QtWidgets.QWidget, Ui_Form):
+    _DB_FOLDER = 'data'
+    _HASH_CACHE_FILE = 'hash_cache.db'
+    _EXACT_DUPLICATES = 0  # indexes of search modes in cbSearchMode
+    _SIMILAR_IMAGES = 1
+    _SIMILAR_VIDEOS = 2
+    _EXACT_DUPLICATES_BY_BYTES = 3
+
     ItemSelected = pyqtSignal(str)
+    GroupFound = pyqtSignal(object, str, object)  # analyser, original file and its duplicates found by a scan job
 
     def __init__(self, parent):
         super().__init__(parent)
@@ -25,6 +41,8 @@ class DuplicationChecker(QtWidgets.QWidget, Ui_Form):
         self._selected_path: str = ""
         self.files_hash: dict = {}
         self.duplications: dict = {}
+        self.hardlinks: dict = {}
+        self.distances: dict = {}
         self.lblFName.setText("<>")
         self.lblInfo.setText("<>")
         self.lblOriginalImage.setText("<>")
@@ -33,6 +51,7 @@ class DuplicationChecker(QtWidgets.QWidget, Ui_Form):
         self.pbAnalyze.clicked.connect(self.evt_analyze_selected)
         self.pbDumpDuplications.clicked.connect(self.evt_dump_duplication)
         self.pbMove.clicked.connect(self.evt_move_duplications)
+        self.cbSearchMode.currentIndexChanged.connect(self.evt_search_mode_changed)
         self.lst_original_files.setModel(QStringListModel([]))
         self.lst_duplications.setModel(QStringListModel([]))
         self.lst_original_files.selectionModel().currentChanged.connect(self.evt_original_file_selected)
@@ -43,7 +62,17 @@ class DuplicationChecker(QtWidgets.QWidget, Ui_Form):
         self.pbCheckDuplications.setEnabled(False)
         self.pbDumpDuplications.setEnabled(False)
         self.pbMove.setEnabled(False)
-        self._duplication_checker: DuplicateFileAnalyser = None
+        self._duplication_checker: DuplicateFileAnalyser | SimilarFilesAnalyser = None
+        self._hash_cache: ScanCheckpoint = None
+        self.__open_hash_cache()
+        # checked directories by search mode, so results of background scans are shown when they are selected again
+        self.__analysers: Dict[Tuple[str, int], DuplicateFileAnalyser | SimilarFilesAnalyser] = {}
+        self.__jobs: Dict[int, DuplicateFileAnalyser | SimilarFilesAnalyser] = {}  # running scans by job id
+        self.__count_jobs: Dict[int, str] = {}  # running counts of files by job id
+        self.GroupFound.connect(self.__group_found)
+        self._parent.job_manager.JobFinished.connect(self.__job_finished)
+        self._parent.job_manager.JobCancelled.connect(self.__job_finished)
+        self._parent.job_manager.JobFailed.connect(self.__job_failed)
 
     @property
     def selected_path(self) -> str:
@@ -58,10 +87,9 @@ class DuplicationChecker(QtWidgets.QWidget, Ui_Form):
             self.pbCheckDuplications.setEnabled(True)
             self.pbDumpDuplications.setEnabled(False)
             self.pbMove.setEnabled(False)
-            self._duplication_checker = DuplicateFileAnalyser(new_path)
-            self._duplication_checker.start_analysis = self._parent.evt_start_analysis
-            self._duplication_checker.update_progress = self._parent.evt_update_progress
-            self._duplication_checker.log_event = self._parent.log_event
+            analyser = self.__analysers.get((new_path, self.cbSearchMode.currentIndex()))
+            self._duplication_checker = analyser if analyser is not None else self.__create_analyser(new_path)
+            self.pbCheckDuplications.setEnabled(not self.__is_running(self._duplication_checker))
         else:
             self._selected_path = ""
             self.lblFName.setText("<>")
@@ -73,34 +101,121 @@ class DuplicationChecker(QtWidgets.QWidget, Ui_Form):
             self._duplication_checker = None
         self.files_hash: dict = {}
         self.duplications: dict = {}
+        self.hardlinks: dict = {}
+        self.distances: dict = {}
         self.lst_original_files.setModel(QStringListModel([]))
         self.lst_duplications.setModel(QStringListModel([]))
+        if self._duplication_checker in self.__analysers.values() and not self.__is_running(self._duplication_checker):
+            self.populate_duplications()  # the directory was checked before
+
+    def __create_analyser(self, directory: str) -> DuplicateFileAnalyser | SimilarFilesAnalyser:
+        if self.cbSearchMode.currentIndex() == self._SIMILAR_IMAGES:
+            analyser = SimilarImageAnalyser(directory)
+        elif self.cbSearchMode.currentIndex() == self._SIMILAR_VIDEOS:
+            analyser = SimilarVideoAnalyser(directory)
+        else:
+            analyser = DuplicateFileAnalyser(directory)
+            analyser.checkpoint = self._hash_cache  # interrupted scan of the directory resumes where it stopped
+            if self.cbSearchMode.currentIndex() == self._EXACT_DUPLICATES_BY_BYTES:
+                analyser.matching = DuplicateFileAnalyser.BLOCK_MATCHING
+        analyser.log_event = self._parent.log_event
+        return analyser
+
+    def evt_search_mode_changed(self, index: int) -> None:
+        self.selected_path = self._selected_path  # recreate analyser and clear results of the previous mode
 
     def evt_check_duplication(self):
+        analyser = self._duplication_checker
+        if analyser is None or self.__is_running(analyser):
+            return
         self.files_hash = {}
         self.duplications = {}
-        try:
-            self.pbCheckDuplications.setEnabled(False)
-            self.update()
-            self._duplication_checker.start_analysis_thread()
+        self.hardlinks = {}
+        self.distances = {}
+        self.pbCheckDuplications.setEnabled(False)
+        self.pbDumpDuplications.setEnabled(False)
+        self.pbMove.setEnabled(False)
+        self.lst_original_files.setModel(QStringListModel([]))
+        self.lst_original_files.selectionModel().currentChanged.connect(self.evt_original_file_selected)
+        self.lst_duplications.setModel(QStringListModel([]))
+        self.__analysers[(self._selected_path, self.cbSearchMode.currentIndex())] = analyser
+        # the scan runs in the background, groups are shown as soon as they are confirmed
+        job_id = self._parent.job_manager.submit(f"search of duplicates in {self._selected_path}",
+                                                 partial(self.__check_duplication, analyser))
+        self.__jobs[job_id] = analyser
 
-        except Exception as err:
-            m = f"Error occur: {err}"
-            print(m)
-            self.__show_message(m)
-            self._parent.log_event(m)
-            self.pbDumpDuplications.setEnabled(False)
-            self.pbMove.setEnabled(False)
-        finally:
+    def __check_duplication(self, analyser: DuplicateFileAnalyser | SimilarFilesAnalyser, token: CancellationToken,
+                            report: Callable) -> None:
+        """Scan job, it runs in a thread of the job manager."""
+        analyser.update_progress = report
+        if isinstance(analyser, DuplicateFileAnalyser):
+            for original_file, duplicate_files in analyser.iter_duplicate_groups(token):
+                self.GroupFound.emit(analyser, original_file, duplicate_files)
+        else:
+            analyser.start_analysis_thread(token)
+
+    def __is_running(self, analyser: DuplicateFileAnalyser | SimilarFilesAnalyser) -> bool:
+        return any(running is analyser for running in self.__jobs.values())
+
+    def __group_found(self, analyser: DuplicateFileAnalyser | SimilarFilesAnalyser, original_file: str,
+                      duplicate_files: list) -> None:
+        if analyser is self._duplication_checker:
+            self.__append_duplications(original_file, duplicate_files)
+
+    def __job_finished(self, job_id: int, result: Any = None) -> None:
+        if job_id in self.__count_jobs:
+            if self.__count_jobs.pop(job_id) == self._selected_path and result is not None:
+                file_count, dir_count = result
+                message = f'Selected directory totally has got {file_count} files and {dir_count} sub-directories'
+                self.lblInfo.setText(message)
+            self.pbAnalyze.setEnabled(bool(self._selected_path))
+            return
+        analyser = self.__jobs.pop(job_id, None)
+        if analyser is None:
+            return
+        if analyser is self._duplication_checker:
+            self.populate_duplications()  # cancelled scan shows the groups found so far
+            self.pbCheckDuplications.setEnabled(True)
+        else:
+            self.ItemSelected.emit(f"Search of duplicates in {analyser.directory} is finished.")
+
+    def __job_failed(self, job_id: int, message: str) -> None:
+        self._parent.log_event(f"Error occur: {message}")
+        if job_id in self.__count_jobs:
+            del self.__count_jobs[job_id]
+            self.pbAnalyze.setEnabled(bool(self._selected_path))
+        elif self.__jobs.pop(job_id, None) is self._duplication_checker:
+            self.__show_message(message)
             self.pbCheckDuplications.setEnabled(True)
 
+    def apply_changes(self, changes: FileChanges) -> None:
+        """Update results of the exact search with changes of the directory found by watch mode."""
+        if (not isinstance(self._duplication_checker, DuplicateFileAnalyser) or not self.files_hash
+                or self.__is_running(self._duplication_checker)):
+            return  # the directory was not checked yet, it is being checked, or similar files are shown
+        try:
+            self._duplication_checker.update_files(changes)
+        except Exception as err:
+            self._parent.log_event(f"Error occur: {err}")
+        self.populate_duplications()
+
     def populate_duplications(self) -> None:
         self.files_hash = {}
         self.duplications = {}
+        self.hardlinks = {}
+        self.distances = {}
         try:
-            self.duplications = self._duplication_checker.duplicate_files
-            self.files_hash = self._duplication_checker.files_hashes
+            self.duplications = dict(self._duplication_checker.duplicate_files)  # edited by 'Set original'
+            if isinstance(self._duplication_checker, SimilarFilesAnalyser):
+                self.files_hash = {file_name: str(signature) for file_name, signature
+                                   in self._duplication_checker.signatures.items()}
+                self.distances = {original: dict(similar)
+                                  for original, similar in self._duplication_checker.similar_files.items()}
+            else:
+                self.files_hash = dict(self._duplication_checker.files_hashes)
+                self.hardlinks = self._duplication_checker.hardlinked_files
             self.__populate_files()
+            self.__report_hardlinks()
         except Exception as err:
             m = f"Error occur: {err}"
             print(m)
@@ -109,6 +224,25 @@ class DuplicationChecker(QtWidgets.QWidget, Ui_Form):
             self.pbDumpDuplications.setEnabled(False)
             self.pbMove.setEnabled(False)
 
+    def __append_duplications(self, original_file: str, duplicate_files: list) -> None:
+        if original_file in self.duplications:  # already shown by populate_duplications
+            return
+        self.duplications[original_file] = duplicate_files
+        model = self.lst_original_files.model()
+        row = model.rowCount()
+        model.insertRows(row, 1)
+        model.setData(model.index(row), original_file)
+        self.pbDumpDuplications.setEnabled(True)
+        self.__update_move_button()
+
+    def __can_move(self) -> bool:
+        """Only duplicates confirmed by the finished exact search are moved, similar files are not identical."""
+        return (bool(self.duplications) and isinstance(self._duplication_checker, DuplicateFileAnalyser)
+                and not self.__is_running(self._duplication_checker))
+
+    def __update_move_button(self) -> None:
+        self.pbMove.setEnabled(self.__can_move())
+
     def __populate_files(self):
         original_files = list(self.duplications.keys())
         if len(original_files) > 0:
@@ -117,7 +251,7 @@ class DuplicationChecker(QtWidgets.QWidget, Ui_Form):
             self.lst_original_files.selectionModel().currentChanged.connect(self.evt_original_file_selected)
             if len(self.duplications) > 0:
                 self.pbDumpDuplications.setEnabled(True)
-                self.pbMove.setEnabled(True)
+                self.__update_move_button()
                 duplicated_files_count = sum([len(item) for item in self.duplications.values()])
                 files_with_duplicates_count = len(self.duplications)
                 message = (f"Totally were found {files_with_duplicates_count} files with duplicates. " +
@@ -130,32 +264,43 @@ class DuplicationChecker(QtWidgets.QWidget, Ui_Form):
             self.__show_message(message)
             self._parent.log_event(message)
 
+    def __report_hardlinks(self) -> None:
+        if len(self.hardlinks) > 0:
+            links_count = sum([len(item) for item in self.hardlinks.values()])
+            message = (f"{links_count} files are hardlinks of {len(self.hardlinks)} files - they are already " +
+                       f"deduplicated and were not checked")
+            self.lblInfo.setText(message)
+            self._parent.log_event(message)
+
     @staticmethod
     def __show_message(message: str) -> None:
         pass
 
-
-    def evt_analyze_selected(self):
+    def __open_hash_cache(self) -> None:  # digests of unchanged files are reused between scans
+        database_path = os.path.join(os.path.abspath(os.getcwd()), self._DB_FOLDER)
         try:
-            self.pbAnalyze.setEnabled(False)
-            file_count = self._duplication_checker.files_count_in_directory
-            dir_count = self._duplication_checker.subdirectories_count_in_directory
-            message = f'Selected directory totally has got {file_count} files and {dir_count} sub-directories'
-            self.lblInfo.setText(message)
+            os.makedirs(database_path, exist_ok=True)
+            self._hash_cache = ScanCheckpoint(os.path.join(database_path, self._HASH_CACHE_FILE))
         except Exception as err:
-            m = f"Error occur: {err}"
+            m = f"Warning: hash cache is not available: {err}"
             print(m)
-            self.__show_message(m)
             self._parent.log_event(m)
-        finally:
-            self.pbAnalyze.setEnabled(True)
+            self._hash_cache = None
+
+
+    def evt_analyze_selected(self):
+        self.pbAnalyze.setEnabled(False)
+        analyser = self._duplication_checker
+        job_id = self._parent.job_manager.submit(f"count of files in {self._selected_path}",
+                                                 lambda token, report: analyser.files_and_subdirectories_count)
+        self.__count_jobs[job_id] = self._selected_path
 
     def evt_original_file_selected(self, current, previous) -> None:
         selected_file = current.data()
         duplication_files = self.duplications[selected_file]
         if selected_file in duplication_files:
             self.__show_message(f"Selected file {selected_file} is duplicated in list of its duplicates!")
-        self.lst_duplications.setModel(QStringListModel(duplication_files))
+        self.lst_duplications.setModel(self.__duplications_model(selected_file, duplication_files))
         self.lst_duplications.selectionModel().currentChanged.connect(self.evt_duplicated_file_selected)
         self.lblDuplicatedImage.setText("<>")
         if is_image_file(selected_file):
@@ -163,8 +308,25 @@ class DuplicationChecker(QtWidgets.QWidget, Ui_Form):
         else:
             self.lblOriginalImage.setText("<>")
 
+    def __duplications_model(self, original_file: str, duplication_files: list) -> QStandardItemModel:
+        """Model of duplicates list: item shows distance to original for similar images, path is in UserRole."""
+        model = QStandardItemModel()
+        distances = self.distances.get(original_file, {})
+        for file in duplication_files:
+            text = f"{file} (distance {distances[file]})" if file in distances else file
+            item = QStandardItem(text)
+            item.setData(file, Qt.ItemDataRole.UserRole)
+            item.setEditable(False)
+            model.appendRow(item)
+        return model
+
+    @staticmethod
+    def __file_name(index) -> str:
+        file_name = index.data(Qt.ItemDataRole.UserRole)
+        return file_name if file_name else index.data(Qt.ItemDataRole.DisplayRole)
+
     def evt_duplicated_file_selected(self, current, previous) -> None:
-        selected_file = current.data()
+        selected_file = self.__file_name(current)
         if is_image_file(selected_file):
             self.__show_image(self.lblDuplicatedImage, selected_file)
         else:
@@ -179,6 +341,7 @@ class DuplicationChecker(QtWidgets.QWidget, Ui_Form):
             data_to_store = {}
             data_to_store["hash_data"] = self.files_hash
             data_to_store["duplication_data"] = self.duplications
+            data_to_store["hardlink_data"] = self.hardlinks
             with open(dump_file, 'w') as fp:
                 json.dump(data_to_store, fp)
         except Exception as err:
@@ -191,6 +354,9 @@ class DuplicationChecker(QtWidgets.QWidget, Ui_Form):
         if not self.duplications:
             self.__show_message("Duplication files are not defined!")
             return
+        if not self.__can_move():
+            self.__show_message("Only duplicates found by a finished exact search can be moved!")
+            return
         try:
             target_dir = os.path.join(self.selected_path, "duplications")
             if not os.path.isdir(target_dir):
@@ -237,13 +403,14 @@ class DuplicationChecker(QtWidgets.QWidget, Ui_Form):
             self._parent.log_event(message)
             self.files_hash = {}
             self.duplications = {}
+            self.distances = {}
             self.pbMove.setEnabled(False)
             self.pbDumpDuplications.setEnabled(False)
 
     def evt_show_context_menu(self, pos):
         index = self.lst_duplications.indexAt(pos)
         if index.isValid():  # Check if an item is selected
-            item_text = self.lst_duplications.model().data(index, Qt.ItemDataRole.DisplayRole)  # Get the text
+            item_text = self.__file_name(index)  # Get the file name
 
             menu = QMenu(self)
             # Example actions:
@@ -292,7 +459,7 @@ class DuplicationChecker(QtWidgets.QWidget, Ui_Form):
 
         for row in range(model.rowCount()):
             index = model.index(row, 0)  # Assuming single-column list
-            item_text = model.data(index, Qt.ItemDataRole.DisplayRole)
+            item_text = self.__file_name(index)
 
             if item_text == target_text:
                 selection_model = list_widget.selectionModel()
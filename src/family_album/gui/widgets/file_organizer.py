@@ -1,23 +1,36 @@
 import os.path
 import sys
+from functools import partial
 from os import path
+from typing import Callable, Dict, List, Tuple
 from PyQt6 import QtWidgets, uic
 from PyQt6.QtCore import pyqtSignal
 from PyQt6.QtGui import QStandardItemModel
 from PyQt6.QtWidgets import QVBoxLayout, QDialog, QMessageBox
+from pandas import DataFrame
 
 from src.family_album.gui.dataframe_model import DataFrameModel
 from src.family_album.gui.widgets.py_ui.file_organizer_ui import Ui_Form
-from src.family_album.utility_functions.analyze_directory import analyze_directory
+from src.family_album.utility_functions.analyze_directory import (LAZY_COLUMNS, analyze_directory,
+                                                                  analyze_directory_lazily, evaluate_files,
+                                                                  open_metadata_catalog, update_analysis)
 from src.family_album.utility_functions.database_manager import DatabaseManager
 from src.family_album.utility_functions.database_settings import DatabaseSettings
-from src.family_album.utility_functions.get_files_and_subdirs_count import get_files_and_subdirs_count
-from src.family_album.utility_functions.organize_media import organize_directory_by_year_month
+from src.family_album.utility_functions.organize_media import OrganizeStats, organize_directory_by_year_month
+from src.family_album_lib.directory_state import FileChanges
+from src.family_album_lib.file_walker import walk_directory
+from src.family_album_lib.metadata_catalog import MetadataCatalog
+from src.family_album_lib.progress import ProgressTracker
+from src.family_album_lib.scan_control import CancellationToken
 
 
 class FileOrganizer(QtWidgets.QWidget, Ui_Form):
     _DB_FOLDER = 'data'
     _DB_FILE = 'my_album.db'
+    _WALK_WORKERS = 8  # directories listed at the same time
+    _ANALYSIS_PROCESSES = 0  # worker processes analyzing files, one per CPU
+    _PARALLEL_ANALYSIS_FILES = 2000  # smaller trees are analyzed in the job thread, starting processes costs more
+    _LAZY_ANALYSIS_FILES = 10_000  # larger trees are shown at once, metadata of files is evaluated on demand
 
     ItemSelected = pyqtSignal(str)
 
@@ -26,6 +39,7 @@ class FileOrganizer(QtWidgets.QWidget, Ui_Form):
         self.setupUi(self)
         # uic.loadUi(path.dirname(__file__) + '/py_ui/file_organizer_ui.ui', self)
         self._selected_path: str = ""
+        self._data_frame: DataFrame | None = None  # result of the last analysis, kept updated in watch mode
         self.lbl_folder_selected.setText("<>")
         self.lbl_info.setText("<>")
         self.pb_analyze.clicked.connect(self.evt_analyze_selected)
@@ -35,6 +49,14 @@ class FileOrganizer(QtWidgets.QWidget, Ui_Form):
         self.tbl_file_data.setSortingEnabled(True)
         self.tbl_file_data.horizontalHeader().setSectionsMovable(True)
         self.__connect_to_database()
+        self.__analyzed: Dict[str, Tuple[str, DataFrameModel]] = {}  # results of analyzed directories by path
+        self.__analyze_jobs: Dict[int, str] = {}  # directories being analyzed by job id
+        self.__evaluate_jobs: Dict[int, str] = {}  # directories with lazy columns being evaluated by job id
+        self.__organize_jobs: Dict[int, str] = {}  # directories being organized by job id
+        self.__job_manager = parent.job_manager
+        self.__job_manager.JobFinished.connect(self.__job_finished)
+        self.__job_manager.JobCancelled.connect(self.__job_finished)
+        self.__job_manager.JobFailed.connect(self.__job_failed)
 
     @property
     def selected_path(self) -> str:
@@ -45,8 +67,8 @@ class FileOrganizer(QtWidgets.QWidget, Ui_Form):
         if os.path.isdir(new_path):
             self._selected_path = new_path
             self.lbl_folder_selected.setText(new_path)
-            self.pb_analyze.setEnabled(True)
-            self.pb_organize.setEnabled(True)
+            self.pb_analyze.setEnabled(new_path not in self.__analyze_jobs.values())
+            self.pb_organize.setEnabled(new_path not in self.__organize_jobs.values())
         else:
             self._selected_path = ""
             self.lbl_folder_selected.setText("<>")
@@ -54,26 +76,37 @@ class FileOrganizer(QtWidgets.QWidget, Ui_Form):
             self.pb_analyze.setEnabled(False)
             self.pb_organize.setEnabled(False)
         self.lbl_info.setText("<>")
+        self._data_frame = None
         self.tbl_file_data.setModel(QStandardItemModel())
+        if self._selected_path in self.__analyzed:  # analyzed before, possibly in the background
+            self.__show_analysis(self._selected_path, *self.__analyzed[self._selected_path])
 
-    def evt_organize_files(self):
+    def apply_changes(self, changes: FileChanges) -> None:
+        """Update the table of the analyzed directory with changes found by watch mode."""
+        if self._data_frame is None:
+            return
         try:
-            if not os.path.isdir(self._selected_path):
-                self.__show_message("Select a valid folder first")
-                return
-            self.pb_organize.setEnabled(False)
-            stats = organize_directory_by_year_month(self._selected_path)
-            summary = (f"Processed: {stats.total_processed}, Moved: {stats.moved}, "
-                       f"Skipped: {stats.skipped}, Errors: {stats.errors}")
-            self.lbl_info.setText(summary)
-            self.ItemSelected.emit(summary)
-            if stats.errors:
-                self.__show_message("Some files failed to organize. Check console for details.")
+            model = self.tbl_file_data.model()
+            pending = model.pending if isinstance(model, DataFrameModel) else set()
+            data_frame = update_analysis(self._data_frame, changes)
+            pending = [file_path for file_path in data_frame["file_path"] if file_path in pending]
+            self.__set_analysis(self._selected_path, self.lbl_info.text(), data_frame, pending)
         except Exception as err:
             print(f"Error occur: {err}")
-            self.__show_message(f"Error occur: {err}")
-        finally:
-            self.pb_organize.setEnabled(True)
+
+    def evt_organize_files(self):
+        if not os.path.isdir(self._selected_path):
+            self.__show_message("Select a valid folder first")
+            return
+        self.pb_organize.setEnabled(False)
+        job_id = self.__job_manager.submit(f"organizing of {self._selected_path}",
+                                           partial(self.__organize, self._selected_path))
+        self.__organize_jobs[job_id] = self._selected_path
+
+    @staticmethod
+    def __organize(directory: str, token: CancellationToken, report: Callable) -> OrganizeStats:
+        """Organizing job, it runs in a thread of the job manager."""
+        return organize_directory_by_year_month(directory, token=token)
 
     def __show_message(self, message: str) -> None:
         msg = QMessageBox(self)
@@ -83,20 +116,105 @@ class FileOrganizer(QtWidgets.QWidget, Ui_Form):
         msg.exec()
 
     def evt_analyze_selected(self):
-        try:
-            if os.path.isdir(self._selected_path):
-                self.pb_analyze.setEnabled(False)
-                file_count, dir_count = get_files_and_subdirs_count(self._selected_path)
-                message = f'Selected directory totally has got {file_count} files and {dir_count} sub-directories'
-                self.lbl_info.setText(message)
-                data_frame = analyze_directory(self._selected_path)
-                df_model = DataFrameModel(data_frame)
-                self.tbl_file_data.setModel(df_model)
-        except Exception as err:
-            print(f"Error occur: {err}")
-            self.__show_message(f"Error occur: {err}")
-        finally:
-            self.pb_analyze.setEnabled(True)
+        if os.path.isdir(self._selected_path):
+            self.pb_analyze.setEnabled(False)
+            job_id = self.__job_manager.submit(f"analysis of {self._selected_path}",
+                                               partial(self.__analyze, self._selected_path))
+            self.__analyze_jobs[job_id] = self._selected_path
+
+    def __analyze(self, directory: str, token: CancellationToken,
+                  report: Callable) -> Tuple[str, DataFrame, List[str]]:
+        """Analysis job, it runs in a thread of the job manager."""
+        # the directory is walked once, counting and analysis share the file records
+        records = []
+        dir_count = 0
+        for _, dirnames, directory_records in walk_directory(directory, workers=self._WALK_WORKERS):
+            if token.is_cancelled:
+                break
+            records.extend(directory_records)
+            dir_count += len(dirnames)
+        message = f'Selected directory totally has got {len(records)} files and {dir_count} sub-directories'
+        progress = ProgressTracker(len(records), lambda snapshot: report(snapshot.files_done, snapshot.files_total,
+                                                                         snapshot))
+
+        def _records():
+            for record in records:
+                yield record
+                progress.advance()
+
+        pending = []  # files whose metadata is evaluated on demand
+        if len(records) >= self._LAZY_ANALYSIS_FILES:
+            data_frame, pending = analyze_directory_lazily(directory, _records(), token=token, catalog=self.__catalog)
+        else:
+            processes = self._ANALYSIS_PROCESSES if len(records) >= self._PARALLEL_ANALYSIS_FILES else 1
+            data_frame = analyze_directory(directory, _records(), token=token, processes=processes,
+                                           catalog=self.__catalog)
+        if not token.is_cancelled and records:
+            progress.finish()
+        return message, data_frame, pending
+
+    def __evaluate(self, model: DataFrameModel, token: CancellationToken, report: Callable) -> int:
+        """Job evaluating lazy columns of the analysis, it runs in a thread of the job manager."""
+        evaluated = model.evaluate_pending(partial(evaluate_files, catalog=self.__catalog), token, report)
+        if self.__catalog is not None:
+            self.__catalog.flush()
+        return evaluated
+
+    def __set_analysis(self, directory: str, message: str, data_frame: DataFrame, pending: List[str]) -> None:
+        """Keep result of the analysis of the directory, lazy columns of pending files are evaluated by a job."""
+        self.__cancel_evaluation(directory)
+        model = DataFrameModel(data_frame, lazy_columns=LAZY_COLUMNS, pending=pending)
+        self.__analyzed[directory] = (message, model)
+        self.__start_evaluation(directory, model)
+        if directory == self._selected_path:
+            self.__show_analysis(directory, message, model)
+
+    def __start_evaluation(self, directory: str, model: DataFrameModel) -> None:
+        """Submit the job evaluating pending rows of the model, e.g. again after its previous job was cancelled."""
+        if model.pending and directory not in self.__evaluate_jobs.values():
+            job_id = self.__job_manager.submit(f"metadata of {directory}", partial(self.__evaluate, model))
+            self.__evaluate_jobs[job_id] = directory
+
+    def __cancel_evaluation(self, directory: str) -> None:
+        for job_id in [job_id for job_id, path in self.__evaluate_jobs.items() if path == directory]:
+            del self.__evaluate_jobs[job_id]  # a new evaluation of the directory may start before this one returns
+            self.__job_manager.cancel(job_id)
+
+    def __show_analysis(self, directory: str, message: str, model: DataFrameModel) -> None:
+        self.lbl_info.setText(message)
+        self._data_frame = model.dataframe
+        self.tbl_file_data.setModel(model)
+        self.__start_evaluation(directory, model)  # rows left by a cancelled evaluation are evaluated again
+
+    def __job_finished(self, job_id: int, result=None) -> None:
+        if job_id in self.__analyze_jobs:
+            directory = self.__analyze_jobs.pop(job_id)
+            if result is not None:  # cancelled analysis has no result
+                self.__set_analysis(directory, *result)
+            self.pb_analyze.setEnabled(bool(self._selected_path) and
+                                       self._selected_path not in self.__analyze_jobs.values())
+        elif job_id in self.__organize_jobs:
+            directory = self.__organize_jobs.pop(job_id)
+            self.__analyzed.pop(directory, None)  # files were moved, the analysis is outdated
+            self.__cancel_evaluation(directory)
+            if result is not None:
+                summary = (f"Processed: {result.total_processed}, Moved: {result.moved}, "
+                           f"Skipped: {result.skipped}, Errors: {result.errors}")
+                if directory == self._selected_path:
+                    self.lbl_info.setText(summary)
+                self.ItemSelected.emit(summary)
+                if result.errors:
+                    self.__show_message("Some files failed to organize. Check console for details.")
+            self.pb_organize.setEnabled(bool(self._selected_path) and
+                                        self._selected_path not in self.__organize_jobs.values())
+        elif job_id in self.__evaluate_jobs:
+            self.__evaluate_jobs.pop(job_id)
+
+    def __job_failed(self, job_id: int, message: str) -> None:
+        if job_id in self.__analyze_jobs or job_id in self.__organize_jobs or job_id in self.__evaluate_jobs:
+            print(f"Error occur: {message}")
+            self.__show_message(f"Error occur: {message}")
+            self.__job_finished(job_id)
 
     def __connect_to_database(self) -> None:  # for sqlite
         working_dir = os.path.abspath(os.getcwd())
@@ -114,6 +232,11 @@ class FileOrganizer(QtWidgets.QWidget, Ui_Form):
         )
         self.database: DatabaseManager = DatabaseManager(self.__db_settings)
         self.database.connect()
+        try:  # metadata of unchanged files is reused between analyses
+            self.__catalog: MetadataCatalog | None = open_metadata_catalog(database_file)
+        except Exception as err:
+            print(f"Warning: metadata catalog is not available: {err}")
+            self.__catalog = None
 
 
 if __name__ == "__main__":
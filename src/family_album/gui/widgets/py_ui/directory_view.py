@@ -33,6 +33,9 @@ class Ui_Form(object):
         self.directory_tree.setWordWrap(True)
         self.directory_tree.setObjectName("directory_tree")
         self.verticalLayout.addWidget(self.directory_tree)
+        self.cb_watch = QtWidgets.QCheckBox(parent=Form)
+        self.cb_watch.setObjectName("cb_watch")
+        self.verticalLayout.addWidget(self.cb_watch)
         self.horizontalLayout.addLayout(self.verticalLayout)
 
         self.retranslateUi(Form)
@@ -42,3 +45,5 @@ class Ui_Form(object):
         _translate = QtCore.QCoreApplication.translate
         Form.setWindowTitle(_translate("Form", "Form"))
         self.label.setText(_translate("Form", "Directories:"))
+        self.cb_watch.setToolTip(_translate("Form", "Keep results of the selected directory updated when its files change"))
+        self.cb_watch.setText(_translate("Form", "Watch for changes"))
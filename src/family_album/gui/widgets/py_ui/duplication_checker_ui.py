@@ -31,6 +31,13 @@ class Ui_Form(object):
         self.pbAnalyze = QtWidgets.QPushButton(parent=Form)
         self.pbAnalyze.setObjectName("pbAnalyze")
         self.horizontalLayout.addWidget(self.pbAnalyze)
+        self.cbSearchMode = QtWidgets.QComboBox(parent=Form)
+        self.cbSearchMode.setObjectName("cbSearchMode")
+        self.cbSearchMode.addItem("")
+        self.cbSearchMode.addItem("")
+        self.cbSearchMode.addItem("")
+        self.cbSearchMode.addItem("")
+        self.horizontalLayout.addWidget(self.cbSearchMode)
         self.pbCheckDuplications = QtWidgets.QPushButton(parent=Form)
         sizePolicy = QtWidgets.QSizePolicy(QtWidgets.QSizePolicy.Policy.Preferred, QtWidgets.QSizePolicy.Policy.Preferred)
         sizePolicy.setHorizontalStretch(0)
@@ -97,6 +104,11 @@ class Ui_Form(object):
         self.lblFName.setText(_translate("Form", "<>"))
         self.pbAnalyze.setToolTip(_translate("Form", "Calculate how many files and subfolders are in selected folder"))
         self.pbAnalyze.setText(_translate("Form", "Analyze"))
+        self.cbSearchMode.setToolTip(_translate("Form", "Search for byte identical files or for images and videos that look the same"))
+        self.cbSearchMode.setItemText(0, _translate("Form", "Exact duplicates"))
+        self.cbSearchMode.setItemText(1, _translate("Form", "Similar images"))
+        self.cbSearchMode.setItemText(2, _translate("Form", "Similar videos"))
+        self.cbSearchMode.setItemText(3, _translate("Form", "Exact duplicates (byte comparison)"))
         self.pbCheckDuplications.setToolTip(_translate("Form", "Search for duplicate files by comparing file\'s hash between all files in selected folder and its subfolders"))
         self.pbCheckDuplications.setText(_translate("Form", "Check for duplicate"))
         self.pbDumpDuplications.setText(_translate("Form", "Save duplication results"))
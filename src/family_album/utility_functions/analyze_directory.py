@@ -1,103 +1,352 @@
 import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
 
 import pandas as pd
 
 from src.family_album.utility_functions.file_utils import get_file_size, get_file_creation_date
-from src.family_album.utility_functions.image_utils import (is_image_file, get_image_creation_date, get_image_size,
-                                                            get_image_maker)
-from src.family_album.utility_functions.video_utils import is_file_a_video, get_video_metadata, get_video_creation_date
+from src.family_album.utility_functions.image_utils import get_image_metadata
+from src.family_album.utility_functions.video_utils import get_video_metadata, get_video_creation_date
+from src.family_album_lib.directory_state import FileChanges
+from src.family_album_lib.file_walker import FileRecord, walk_files
+from src.family_album_lib.hash_cache import FileSignature, file_signature
+from src.family_album_lib.media_signature import detect_media_type
+from src.family_album_lib.metadata_catalog import MetadataCatalog
+from src.family_album_lib.scan_control import CancellationToken
 
 
+_WALK_WORKERS = 8  # directories listed at the same time
+_CHUNK_SIZE = 10_000  # rows of one DataFrame produced by 'iter_directory_analysis'
+_PROCESS_CHUNK_SIZE = 256  # files analyzed by one task of worker processes
+_WINDOW_FACTOR = 2  # chunks submitted to worker processes at most, per process
 _TEMPLATE = {"file_name": "str", "file_path": "str", "file_date_created": "datetime64[s]",
              "date_take": "datetime64[s]", "file_size": "int64", "is_image": "bool", "is_video": "bool",
              "resolution": "str", "maker": "str", "video_bitrate": "int64",
-             "video_duration": "int64"}
+             "video_duration": "float64"}
+_STAT_COLUMNS = ("file_name", "file_path", "file_date_created", "file_size")  # known from the walk at once
+# columns extracted from contents of the file, 'analyze_directory_lazily' leaves them to be evaluated on demand
+LAZY_COLUMNS = [column_name for column_name in _TEMPLATE if column_name not in _STAT_COLUMNS]
 
 
-def analyze_directory(directory: str) -> pd.DataFrame:
-    output: pd.DataFrame = _create_empty_dataframe(_TEMPLATE)
+class _ColumnarBatch:
+    """
+    Rows collected column by column in plain lists, the DataFrame is built at once with the dtypes of the
+    template, so adding a row costs the same regardless of the number of rows already collected.
+    """
+
+    def __init__(self, template: Dict[str, str]) -> None:
+        self.__template = template
+        self.__columns: Dict[str, list] = {column_name: [] for column_name in template}
+
+    def __len__(self) -> int:
+        return len(self.__columns["file_path"])
+
+    def append(self, row_data: dict) -> bool:
+        """Add the row, it is rejected if its columns differ from the template."""
+        if set(row_data.keys()) != set(self.__columns.keys()):
+            print("Column names in row_data do not match DataFrame columns.")
+            return False
+        for column_name, values in self.__columns.items():
+            values.append(row_data[column_name])
+        return True
+
+    def build(self) -> pd.DataFrame:
+        """Build DataFrame of the collected rows and start a new batch."""
+        columns, self.__columns = self.__columns, {column_name: [] for column_name in self.__template}
+        return pd.DataFrame({column_name: _typed_column(values, self.__template[column_name])
+                             for column_name, values in columns.items()})
+
+
+def _typed_column(values: list, column_type: str) -> pd.Series:
+    """Convert values to the column type, values that can not be converted become empty (NaT, 0, False)."""
+    column = pd.Series(values, dtype=object)
+    if column_type.startswith("datetime64"):
+        return pd.to_datetime(column, errors="coerce").astype(column_type)
+    if column_type in ("int64", "float64"):
+        return pd.to_numeric(column, errors="coerce").fillna(0).astype(column_type)
+    if column_type == "bool":
+        return column.fillna(False).astype(column_type)
+    return column.astype(column_type)
+
+
+def analyze_directory(directory: str, records: Optional[Iterable[FileRecord]] = None,
+                      walk_workers: int = _WALK_WORKERS, token: Optional[CancellationToken] = None,
+                      processes: int = 1, process_chunk_size: int = _PROCESS_CHUNK_SIZE,
+                      catalog: Optional[MetadataCatalog] = None) -> pd.DataFrame:
+    """
+    Collect metadata of all files in the directory tree.
+
+    :param directory: directory to analyze.
+    :param records: files of the directory if they were already walked, e.g. for counting, so the tree is not
+                    walked again and stat results of the files are reused.
+    :param walk_workers: number of directories listed at the same time when the directory is walked.
+    :param token: token to cancel or pause the analysis, cancelled analysis returns rows of analyzed files.
+    :param processes: number of worker processes analyzing files in parallel, 0 - one per CPU, 1 - files are
+                      analyzed in the calling thread.
+    :param process_chunk_size: number of files analyzed by one task of worker processes.
+    :param catalog: catalog of metadata created with '_TEMPLATE' columns, metadata is extracted only for files that
+                    are not in the catalog or were changed, rows of deleted files are removed from it.
+    :return: DataFrame with one row per file.
+    """
     if not os.path.isdir(directory):
-        return output
-
-    for root, dirs, files in os.walk(directory):
-        for filename in files:
-            full_file_name = os.path.join(root, filename)
-            row_data = {"file_name": filename, "file_path": full_file_name, "file_size": get_file_size(full_file_name),
-                        "file_date_created": get_file_creation_date(full_file_name), "video_bitrate": 0,
-                        "video_duration": 0}
-            is_video = is_file_a_video(full_file_name)
-            row_data["is_video"] = is_video
-            if is_video:  # avoid is_video = True and is_image = True (for gif)
-                is_image = False
-            else:
-                is_image = is_image_file(full_file_name)
-            row_data["is_image"] = is_image
-            if is_video:
-                date_taken = get_video_creation_date(full_file_name)
-                meta_data = get_video_metadata(full_file_name)
-                maker = "Unknown"
-
-                row_data["date_take"] = date_taken
-                row_data["maker"] = maker
-                if meta_data:
-                    row_data["resolution"] = f'{meta_data["resolution"]}'
-                    row_data["video_bitrate"] = meta_data['bitrate']
-                    row_data["video_duration"] = meta_data['duration']
-            elif is_image:
-                date_taken = get_image_creation_date(full_file_name)
-                image_size = get_image_size(full_file_name)
-                maker = get_image_maker(full_file_name)
-                row_data["resolution"] = f'{image_size[0]}x{image_size[1]}'
-                row_data["date_take"] = date_taken
-                row_data["maker"] = maker
-            else:
-                row_data["resolution"] = ''
-                row_data["date_take"] = get_file_creation_date(full_file_name)
-                row_data["maker"] = ""
-
-            temp_output = _fill_dataframe_row(output, row_data)
-            if temp_output is not None:
-                output = temp_output
-            else:
-                print(f'File {full_file_name} was skipped in analyses due to error!')
-    return output
-
-
-def _create_empty_dataframe(columns_dict: dict) -> pd.DataFrame:
+        return _ColumnarBatch(_TEMPLATE).build()
+    files = records if records is not None else walk_files(directory, workers=walk_workers)
+    if catalog is not None:
+        return _analyze_with_catalog(directory, files, token, processes, process_chunk_size, catalog)
+    return _analyze_files(files, token, processes, process_chunk_size)
+
+
+def open_metadata_catalog(database_file: str) -> MetadataCatalog:
+    """Open catalog of metadata for 'analyze_directory', it is created in the database if it does not exist."""
+    return MetadataCatalog(database_file, _TEMPLATE)
+
+
+def _analyze_files(records: Iterable[FileRecord], token: Optional[CancellationToken], processes: int,
+                   chunk_size: int) -> pd.DataFrame:
+    if processes != 1:
+        return _analyze_in_processes(records, token, processes or os.cpu_count() or 1, chunk_size)
+    batch = _ColumnarBatch(_TEMPLATE)
+    for record in records:
+        if token is not None and not token.wait_while_paused():
+            break
+        _append_file(batch, record)
+    return batch.build()
+
+
+def _analyze_with_catalog(directory: str, records: Iterable[FileRecord], token: Optional[CancellationToken],
+                          processes: int, chunk_size: int, catalog: MetadataCatalog) -> pd.DataFrame:
+    """Take rows of unchanged files from the catalog and analyze the other files, rows of the catalog go first."""
+    catalog.load(directory)
+    cached = _ColumnarBatch(_TEMPLATE)
+    signatures: Dict[str, FileSignature] = {}  # signatures of analyzed files
+    found: List[str] = []
+
+    def _changed_records() -> Iterator[FileRecord]:
+        for record in records:
+            found.append(record.path)
+            stat_result = _record_stat(record)
+            signature = file_signature(stat_result) if stat_result is not None else None
+            row = catalog.lookup(record.path, signature) if signature is not None else None
+            if row is not None and cached.append(row):
+                continue
+            if signature is not None:
+                signatures[record.path] = signature
+            yield record
+
+    data_frame = _analyze_files(_changed_records(), token, processes, chunk_size)
+    for row in data_frame.to_dict('records'):
+        if row["file_path"] in signatures:
+            catalog.store(row["file_path"], signatures[row["file_path"]], row)
+    if token is None or not token.is_cancelled:  # files not walked by cancelled analysis are not missing
+        catalog.evict_missing(directory, found)
+    catalog.flush()
+    if len(data_frame) == 0:
+        return cached.build()
+    if len(cached) == 0:
+        return data_frame
+    return pd.concat([cached.build(), data_frame], ignore_index=True)
+
+
+def _analyze_in_processes(records: Iterable[FileRecord], token: Optional[CancellationToken], processes: int,
+                          chunk_size: int) -> pd.DataFrame:
     """
-    Create an empty pandas DataFrame with specified columns.
-    Parameters:
-    columns_dict (dict): A dictionary where keys are column names and values are column types.
-    Returns:
-    pd.DataFrame: An empty DataFrame with specified columns.
+    Analyze chunks of files in worker processes. A worker returns DataFrame of its chunk, so results are passed
+    between processes as a few column arrays. Chunks are submitted in a bounded window and merged in the order
+    of files, so the result is the same as the result of the analysis in one thread.
     """
-    # Create an empty DataFrame
-    df = pd.DataFrame()
-    # Add columns to DataFrame based on the input dictionary
-    for column_name, column_type in columns_dict.items():
-        df[column_name] = pd.Series(dtype=column_type)
-    return df
+    frames: List[pd.DataFrame] = []
+    pending = deque()
+    window = _WINDOW_FACTOR * processes
+    # worker processes are spawned, forking of the process with running threads (e.g. GUI) is not safe
+    with ProcessPoolExecutor(max_workers=processes, mp_context=get_context('spawn')) as executor:
+        for chunk in _iter_chunks(records, token, max(1, chunk_size)):
+            pending.append(executor.submit(_analyze_chunk, chunk))
+            if len(pending) >= window:
+                frames.append(pending.popleft().result())
+        if token is not None and token.is_cancelled:
+            for future in pending:  # chunks being analyzed are finished, the others are dropped
+                future.cancel()
+        frames.extend(future.result() for future in pending if not future.cancelled())
+    if not frames:
+        return _ColumnarBatch(_TEMPLATE).build()
+    return pd.concat(frames, ignore_index=True)
+
+
+def _iter_chunks(records: Iterable[FileRecord], token: Optional[CancellationToken],
+                 chunk_size: int) -> Iterator[List[Tuple[str, str, Optional[os.stat_result]]]]:
+    """Split files to chunks of picklable (name, path, stat result) tuples."""
+    chunk = []
+    for record in records:
+        if token is not None and not token.wait_while_paused():
+            break
+        chunk.append((record.name, record.path, _record_stat(record)))
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
 
+def _analyze_chunk(files: List[Tuple[str, str, Optional[os.stat_result]]]) -> pd.DataFrame:
+    """Task of a worker process."""
+    batch = _ColumnarBatch(_TEMPLATE)
+    for file_name, full_file_name, stat_result in files:
+        _append_row(batch, file_name, full_file_name, stat_result)
+    return batch.build()
 
-def _fill_dataframe_row(df: pd.DataFrame, row_data: dict) -> pd.DataFrame | None:
+
+def analyze_directory_lazily(directory: str, records: Optional[Iterable[FileRecord]] = None,
+                             walk_workers: int = _WALK_WORKERS, token: Optional[CancellationToken] = None,
+                             catalog: Optional[MetadataCatalog] = None) -> Tuple[pd.DataFrame, List[str]]:
     """
-    Fill a DataFrame with row data if column names and data types match.
-    Parameters:
-    df (pd.DataFrame): DataFrame to fill.
-    row_data (dict): A dictionary where keys are column names and values are row data.
-    Returns:
-    pd.DataFrame: Updated DataFrame if successful, otherwise returns None.
+    Collect metadata known from stat results of the files only, so the table of a huge directory is shown at once.
+    Columns of 'LAZY_COLUMNS' are left empty to be evaluated on demand by 'evaluate_files'.
+
+    :param catalog: catalog of metadata, rows of unchanged files are taken from it complete and rows of deleted
+                    files are removed from it.
+    :return: DataFrame with the columns of 'analyze_directory' and paths of files whose lazy columns are empty.
     """
-    # Check if column names match
-    if not set(row_data.keys()) == set(df.columns):
-        print("Column names in row_data do not match DataFrame columns.")
-        return None
+    batch = _ColumnarBatch(_TEMPLATE)
+    pending: List[str] = []
+    if not os.path.isdir(directory):
+        return batch.build(), pending
+    if catalog is not None:
+        catalog.load(directory)
+    found: List[str] = []
+    for record in records if records is not None else walk_files(directory, workers=walk_workers):
+        if token is not None and not token.wait_while_paused():
+            break
+        found.append(record.path)
+        stat_result = _record_stat(record)
+        row = None
+        if catalog is not None and stat_result is not None:
+            row = catalog.lookup(record.path, file_signature(stat_result))
+        if row is None or not batch.append(row):
+            batch.append(_stat_row(record.name, record.path, stat_result))
+            pending.append(record.path)
+    if catalog is not None and (token is None or not token.is_cancelled):
+        catalog.evict_missing(directory, found)
+    return batch.build(), pending
+
+
+def evaluate_files(file_names: List[str], catalog: Optional[MetadataCatalog] = None) -> pd.DataFrame:
+    """
+    Extract metadata of files left by 'analyze_directory_lazily', the rows are stored in the catalog and are
+    written to its database by 'flush' of the catalog.
+
+    :return: DataFrame with the columns of 'analyze_directory', files that can not be analyzed are skipped.
+    """
+    batch = _ColumnarBatch(_TEMPLATE)
+    signatures: Dict[str, FileSignature] = {}
+    for file_name in file_names:
+        try:
+            stat_result = os.stat(file_name)
+        except OSError:
+            continue  # the file was removed
+        signatures[file_name] = file_signature(stat_result)
+        _append_row(batch, os.path.basename(file_name), file_name, stat_result)
+    data_frame = batch.build()
+    if catalog is not None and len(data_frame) > 0:
+        for row in data_frame.to_dict('records'):
+            catalog.store(row["file_path"], signatures[row["file_path"]], row)
+    return data_frame
+
+
+def iter_directory_analysis(directory: str, records: Optional[Iterable[FileRecord]] = None,
+                            walk_workers: int = _WALK_WORKERS, token: Optional[CancellationToken] = None,
+                            chunk_size: int = _CHUNK_SIZE) -> Iterator[pd.DataFrame]:
+    """
+    Collect metadata of all files in the directory tree as 'analyze_directory' does, but yield it in chunks,
+    so the consumer may show or store rows while the rest of the tree is analyzed.
+
+    :param chunk_size: number of rows in every DataFrame but the last one.
+    :return: iterator of DataFrames with the columns of 'analyze_directory'.
+    """
+    if not os.path.isdir(directory):
+        return
+    batch = _ColumnarBatch(_TEMPLATE)
+    for record in records if records is not None else walk_files(directory, workers=walk_workers):
+        if token is not None and not token.wait_while_paused():
+            break
+        _append_file(batch, record)
+        if len(batch) >= chunk_size:
+            yield batch.build()
+    if len(batch) > 0:
+        yield batch.build()
+
+
+def update_analysis(data_frame: pd.DataFrame, changes: FileChanges) -> pd.DataFrame:
+    """
+    Update result of 'analyze_directory' with changes found by watch mode, only changed files are analyzed.
+
+    :param data_frame: result of 'analyze_directory'.
+    :param changes: changes of files of the analyzed directory, e.g. from 'DirectoryState'.
+    :return: DataFrame without removed files and with rows of added and modified files.
+    """
+    changed = set(changes.removed) | set(changes.modified)
+    output = data_frame[~data_frame["file_path"].isin(changed)]
+    batch = _ColumnarBatch(_TEMPLATE)
+    for file_name in changes.added + changes.modified:
+        _append_file(batch, FileRecord(file_name))
+    if len(batch) == 0:
+        return output.reset_index(drop=True)
+    return pd.concat([output, batch.build()], ignore_index=True)
+
+
+def _record_stat(record: FileRecord) -> Optional[os.stat_result]:
     try:
-        # Inserting the new row
-        df.loc[len(df)] = row_data
-        # Reset the index
-        df = df.reset_index(drop=True)
-        return df
-    except Exception as err:
-        print(f'Error occur: {err}')
+        return record.stat
+    except OSError:
         return None
+
+
+def _append_file(batch: _ColumnarBatch, record: FileRecord) -> None:
+    _append_row(batch, record.name, record.path, _record_stat(record))
+
+
+def _stat_row(file_name: str, full_file_name: str, stat_result: Optional[os.stat_result]) -> dict:
+    """Row with columns known from the stat result, the other columns are empty."""
+    return {"file_name": file_name, "file_path": full_file_name,
+            "file_size": get_file_size(full_file_name, stat_result),
+            "file_date_created": get_file_creation_date(full_file_name, stat_result), "date_take": pd.NaT,
+            "is_image": False, "is_video": False, "resolution": "", "maker": "", "video_bitrate": 0,
+            "video_duration": 0}
+
+
+def _append_row(batch: _ColumnarBatch, file_name: str, full_file_name: str,
+                stat_result: Optional[os.stat_result]) -> None:
+    row_data = _stat_row(file_name, full_file_name, stat_result)
+    media_type = detect_media_type(full_file_name)
+    is_video = media_type is not None and media_type.is_video
+    row_data["is_video"] = is_video
+    # avoid is_video = True and is_image = True (for gif), metadata of the image is read once for all columns
+    is_image = media_type is not None and media_type.is_image and not is_video
+    image_metadata = get_image_metadata(full_file_name) if is_image else None
+    row_data["is_image"] = is_image
+    if is_video:
+        meta_data = get_video_metadata(full_file_name)
+        date_taken = get_video_creation_date(full_file_name, meta_data)
+        maker = "Unknown"
+
+        row_data["date_take"] = date_taken
+        row_data["maker"] = maker
+        if meta_data:
+            row_data["resolution"] = f'{meta_data.get("resolution", "")}'
+            row_data["video_bitrate"] = meta_data.get('bitrate', 0)
+            row_data["video_duration"] = meta_data.get('duration', 0)
+    elif image_metadata is not None:
+        width, height = image_metadata.resolution
+        date_taken = image_metadata.date_taken
+        row_data["resolution"] = f'{width}x{height}'
+        row_data["date_take"] = date_taken if date_taken is not None else row_data["file_date_created"]
+        row_data["maker"] = image_metadata.make
+    else:
+        row_data["resolution"] = ''
+        row_data["date_take"] = row_data["file_date_created"]
+        row_data["maker"] = ""
+
+    if not batch.append(row_data):
+        print(f'File {full_file_name} was skipped in analyses due to error!')
+
@@ -1,60 +1,63 @@
 import os
 import platform
-import time
+import stat
 import datetime
 from typing import Optional
 
 
-def get_file_creation_date(file_name: str) -> Optional[datetime.datetime]:
+def get_file_creation_date(file_name: str, stat_result: Optional[os.stat_result] = None
+                           ) -> Optional[datetime.datetime]:
     """
     The function returns date of the file creation
 
     :param file_name: full (absolute) name of the file.
+    :param stat_result: stat result of the file if it is already known, e.g. from 'FileRecord'.
     :return: date of the file creation i datetime format or None, in case of error.
     """
-    if not os.path.isfile(file_name):  # check if passed string represent a file
-        return False
     try:
-        return _get_creation_date(file_name)
+        if stat_result is None:
+            stat_result = os.stat(file_name)
     except OSError:
-        return None
+        return False
+    if not stat.S_ISREG(stat_result.st_mode):  # check if passed string represent a file
+        return False
+    return _get_creation_date(stat_result)
 
 
-def _get_creation_date(file_path):
+def _get_creation_date(stat_result: os.stat_result) -> datetime.datetime:
+    # all dates are taken from one stat result, so the file is not requested again for every date
     creation_date = []
     # Windows-specific approach
     if platform.system() == 'Windows':
-        creation_date.append(os.path.getctime(file_path))
-        creation_date.append(os.path.getmtime(file_path))
-        creation_date.append(os.path.getatime(file_path))
+        creation_date.extend((stat_result.st_ctime, stat_result.st_mtime, stat_result.st_atime))
     # Mac or Linux -specific approach
     elif platform.system() == 'Darwin' or platform.system() == 'Linux':
         try:
-            creation_date.append(os.stat(file_path).st_birthtime)
+            creation_date.append(stat_result.st_birthtime)
         except AttributeError:
             pass  # ignore
-        creation_date.append(os.stat(file_path).st_atime)
-        creation_date.append(os.stat(file_path).st_mtime)
-        creation_date.append(os.stat(file_path).st_ctime)
-        creation_date.append(os.path.getmtime(file_path))
+        creation_date.extend((stat_result.st_atime, stat_result.st_mtime, stat_result.st_ctime))
 
     # If none of the above approaches worked, try to get the earliest date
     if len(creation_date) == 0:
-        creation_date = [os.path.getctime(file_path), os.path.getmtime(file_path)]
+        creation_date = [stat_result.st_ctime, stat_result.st_mtime]
 
-    # Convert the timestamp to a datetime object
+    # Convert the earliest timestamp to a datetime object
     creation_date = datetime.datetime.fromtimestamp(min(creation_date))
 
     return creation_date
 
 
-def get_file_size(file_name: str) -> Optional[int]:
+def get_file_size(file_name: str, stat_result: Optional[os.stat_result] = None) -> Optional[int]:
     """
     The function returns size of the file in bytes.
 
     :param file_name: full (absolute) name of the file.
+    :param stat_result: stat result of the file if it is already known, e.g. from 'FileRecord'.
     :return: Size of the file in bytes if successful or None in case of error
     """
+    if stat_result is not None:
+        return stat_result.st_size
     try:
         return os.path.getsize(file_name)
     except OSError:
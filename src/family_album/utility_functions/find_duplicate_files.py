@@ -1,29 +1,34 @@
 import json
 import os
-import hashlib
 from time import perf_counter
 from typing import List, Dict
 
+from src.family_album_lib.file_hashing import _BLOCK_SIZE, get_file_edges_hash, get_file_hash
+from src.family_album_lib.file_walker import walk_files
+from src.family_album_lib.staged_duplicate_search import StagedDuplicateSearch, hardlink_key
 
-def find_duplicate_files(directory: str) -> Dict[str, List[str]]:
-    # create empty dicts for hash and for duplicates
-    file_hashes = {}
+_WALK_WORKERS = 8  # directories listed at the same time
+
+
+def find_duplicate_files(directory: str, walk_workers: int = _WALK_WORKERS) -> Dict[str, List[str]]:
+    # files are grouped by size, then by hash of their edges, and only then hashed completely
+    search = StagedDuplicateSearch()
+    buffer = bytearray(_BLOCK_SIZE)  # one read buffer is reused for all files
 
     # iterate though all files and subdirectories
-    for dirpath, _, file_names in os.walk(directory):
-        for filename in file_names:
-            # calculate file hash
-            full_file_name = os.path.join(dirpath, filename)
-            with open(full_file_name, 'rb') as file:
-                filehash = hashlib.blake2b(file.read()).hexdigest()
-
-            # add hash and file name to dictionary
-            if filehash in file_hashes.keys() and full_file_name not in file_hashes[filehash]:
-                file_hashes[filehash].append(full_file_name)
-            else:
-                file_hashes[filehash] = [full_file_name]
-
-    return file_hashes
+    for record in walk_files(directory, workers=walk_workers):
+        stat_result = record.stat  # stat result is taken once during the walk
+        search.add_file(record.path, stat_result.st_size, hardlink_key(stat_result))
+
+    full_hash_candidates = []
+    for full_file_name, file_size in search.edge_hash_candidates():
+        edge_hash, whole_file = get_file_edges_hash(full_file_name, file_size, buffer)
+        full_hash_candidates.extend(search.add_edge_hash(full_file_name, file_size, edge_hash, whole_file))
+
+    for full_file_name in full_hash_candidates:
+        search.add_full_hash(full_file_name, get_file_hash(full_file_name, buffer))
+
+    return dict(search.files_hashes)
 
 
 if __name__ == "__main__":
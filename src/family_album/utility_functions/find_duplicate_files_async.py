@@ -1,58 +1,95 @@
 import asyncio
-import hashlib
 import json
 import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from time import perf_counter
-from typing import List, Dict, Tuple
+from typing import Deque, List, Dict, Tuple
 
-import aiofiles
+from src.family_album_lib.file_hashing import _BLOCK_SIZE, _EDGE_SIZE, _MEMORY_LIMIT, get_file_edges_hash, get_file_hash
+from src.family_album_lib.file_walker import walk_files
+from src.family_album_lib.staged_duplicate_search import StagedDuplicateSearch, hardlink_key
 
-_BLOCK_SIZE = 65536
-_NUM_OPEN_FILES = 200
+_NUM_READERS = 32  # files read at the same time, every reader owns one buffer
+_WALK_WORKERS = 8  # directories listed at the same time
+_EDGES_STAGE = "edges"
+_FULL_STAGE = "full"
 
 
-async def _get_file_hash(file_full_name: str, semaphore: asyncio.Semaphore) -> Tuple[str, str]:
-    """
-    Calculate hash of the file asynchronously.
-    """
-    if not os.path.isfile(file_full_name):
-        return "", file_full_name
-    hasher = hashlib.blake2b()
-    try:
-        async with semaphore:
-            async with aiofiles.open(file_full_name, 'rb') as file:
-                buf = await file.read()
-                hasher.update(buf)
-    except Exception as e:
-        print(f"Error reading file {file_full_name}: {e}")
-        return "", file_full_name
-    return hasher.hexdigest(), file_full_name
+def _add_files(search: StagedDuplicateSearch, directory: str, walk_workers: int) -> None:
+    for record in walk_files(directory, workers=walk_workers):
+        if record.is_file():
+            stat_result = record.stat  # stat result is taken once during the walk
+            search.add_file(record.path, stat_result.st_size, hardlink_key(stat_result))
 
 
-async def find_duplicate_files_async(root_folder: str) -> Dict[str, List[str]]:
+async def find_duplicate_files_async(root_folder: str, memory_limit: int = _MEMORY_LIMIT,
+                                     walk_workers: int = _WALK_WORKERS,
+                                     readers: int = _NUM_READERS) -> Dict[str, List[str]]:
     """
     Asynchronously analyze files in a directory (and subdirectories) to find duplicated files.
-    Files are considered duplicates if they have the same hash code.
+    Files are grouped by size first, then by hash of their edges, and only remaining candidates are hashed
+    completely. Files are considered duplicates if they have the same hash code.
+
+    Hashing is a pipeline: a producer feeds a bounded queue with files to hash and a fixed number of readers
+    take them, read files block by block into their own buffers in a thread pool of the same size and pass
+    digests to the search at once. Files of size groups that finished the edges stage are fed before the
+    remaining edges, so memory used by the pipeline does not depend on the number of files.
     Returns a dictionary where the key is the hash code and the value is a list of file paths with that hash.
     """
-    file_dict = {}
-    tasks = []
-    semaphore = asyncio.Semaphore(_NUM_OPEN_FILES)  # Limit the number of concurrent file operations
-    for directory, _, filenames in os.walk(root_folder):
-        for filename in filenames:
-            file_path = os.path.join(os.fsdecode(directory), os.fsdecode(filename))
-            tasks.append(_get_file_hash(file_path, semaphore))
+    loop = asyncio.get_running_loop()
+    search = StagedDuplicateSearch()
+    readers = max(1, min(readers, memory_limit // _BLOCK_SIZE))
+    jobs: asyncio.Queue = asyncio.Queue(maxsize=2 * readers)
+    ready: Deque[Tuple[str, int]] = deque()  # files of finished size groups waiting for full hash
+    progressed = asyncio.Event()  # a reader finished a file
+    in_flight = 0  # files queued or being read
 
-    results = await asyncio.gather(*tasks)  # rau tasks
-    for file_hash, file_full_name in results:
-        if file_hash:
-            if file_hash in file_dict.keys():
-                if file_full_name not in file_dict[file_hash]:  # avoid duplicating same file
-                    file_dict[file_hash].append(file_full_name)
+    async def _produce(candidates: List[Tuple[str, int]]) -> None:
+        nonlocal in_flight
+        edges = iter(candidates)
+        while True:
+            if ready:
+                job = (_FULL_STAGE, *ready.popleft())
             else:
-                file_dict[file_hash] = [file_full_name]
+                candidate = next(edges, None)
+                if candidate is None:
+                    if in_flight == 0:
+                        break
+                    progressed.clear()
+                    await progressed.wait()  # readers may still hand out files for full hashing
+                    continue
+                job = (_EDGES_STAGE, *candidate)
+            in_flight += 1
+            await jobs.put(job)  # waits while all readers are busy and the queue is full
+        for _ in range(readers):
+            await jobs.put(None)
+
+    async def _read(executor: ThreadPoolExecutor) -> None:
+        nonlocal in_flight
+        buffer = bytearray(_BLOCK_SIZE)
+        while (job := await jobs.get()) is not None:
+            stage, file_name, file_size = job
+            ready_files: List[str] = []
+            try:
+                if stage == _EDGES_STAGE:
+                    edge_hash, whole_file = await loop.run_in_executor(executor, get_file_edges_hash, file_name,
+                                                                       file_size, buffer, _EDGE_SIZE)
+                    ready_files = search.add_edge_hash(file_name, file_size, edge_hash, whole_file)
+                else:
+                    search.add_full_hash(file_name, await loop.run_in_executor(executor, get_file_hash, file_name,
+                                                                               buffer))
+            except Exception as e:
+                print(f"Error reading file {file_name}: {e}")
+                ready_files = search.discard_file(file_name)
+            ready.extend((ready_file, file_size) for ready_file in ready_files)
+            in_flight -= 1
+            progressed.set()
 
-    return file_dict
+    with ThreadPoolExecutor(max_workers=readers) as executor:
+        await loop.run_in_executor(executor, _add_files, search, os.fsdecode(root_folder), walk_workers)
+        await asyncio.gather(_produce(search.edge_hash_candidates()), *[_read(executor) for _ in range(readers)])
+    return dict(search.files_hashes)
 
 
 if __name__ == "__main__":
@@ -1,52 +1,102 @@
 import json
 import os
-import hashlib
 from time import perf_counter
-from typing import List, Dict
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from collections import deque
+from typing import Deque, List, Dict, Tuple
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
 import threading
 
-_NUM_OPEN_FILES = 200
+from src.family_album_lib.file_hashing import _EDGE_SIZE, _MEMORY_LIMIT, BufferPool, get_file_edges_hash, get_file_hash
+from src.family_album_lib.file_walker import walk_files
+from src.family_album_lib.io_concurrency import ConcurrencyController
+from src.family_album_lib.staged_duplicate_search import StagedDuplicateSearch, hardlink_key
 
+_NUM_OPEN_FILES = 64  # upper bound of files read at the same time, the actual number adapts to the storage
+_WALK_WORKERS = 8  # directories listed at the same time
+_WINDOW_FACTOR = 4  # files submitted to the thread pool at most, per thread
 
-def find_duplicate_files_multithreaded(directory: str) -> Dict[str, List[str]]:
-    # create empty dicts for hash and for duplicates
-    file_hashes = {}
-    lock = threading.Lock()  # use lock to avoid simultaneous edit dictionary 'file_hashes' from several threads
+
+def find_duplicate_files_multithreaded(directory: str, memory_limit: int = _MEMORY_LIMIT,
+                                       max_open_files: int = _NUM_OPEN_FILES,
+                                       walk_workers: int = _WALK_WORKERS) -> Dict[str, List[str]]:
+    # files are grouped by size, then by hash of their edges, and only then hashed completely
+    search = StagedDuplicateSearch()
+    buffers = BufferPool(memory_limit)  # files are read block by block into buffers reused between threads
+    controller = ConcurrencyController(max_level=max_open_files)  # adapts number of readers to the storage
+    local = threading.local()
+    full_hashes: List[Dict[str, str]] = []  # full hashes found by every thread, merged when all are finished
+    full_hashes_lock = threading.Lock()  # taken once per thread, when its dictionary is registered
+
+    def _get_edges_hash(file_name: str, file_size: int) -> Tuple[str, int, str, bool]:
+        """
+        Local function that calculates hash of file's edges, the result is passed to the search by the caller,
+        edges hash is empty if the file could not be read
+        """
+        try:
+            with controller.slot(min(file_size, 2 * _EDGE_SIZE)), buffers.borrow() as buffer:
+                edge_hash, whole_file = get_file_edges_hash(file_name, file_size, buffer)
+        except Exception as e:
+            print(f"Error reading file {file_name}: {e}")
+            return file_name, file_size, "", False
+        return file_name, file_size, edge_hash, whole_file
 
     def _get_files_hash(file_name: str) -> None:
         """
-        Local function that calculates file's hash and update the resulting dictionary
+        Local function that calculates file's hash and keeps it in the dictionary of the thread,
+        hash is empty if the file could not be read
         """
-        if not os.path.isfile(file_name):
-            return
+        if not hasattr(local, "full_hashes"):
+            local.full_hashes = {}
+            with full_hashes_lock:
+                full_hashes.append(local.full_hashes)
         try:
-            with open(file_name, 'rb') as file:
-                filehash = hashlib.blake2b(file.read()).hexdigest()
+            with controller.slot(os.path.getsize(file_name)), buffers.borrow() as buffer:
+                local.full_hashes[file_name] = get_file_hash(file_name, buffer)
         except Exception as e:
             print(f"Error reading file {file_name}: {e}")
-            return
-        else:
-            with lock:  # context manager will release lock automatically even in case of an error
-                # add hash and file name to dictionary
-                if filehash in file_hashes.keys() and file_name not in file_hashes[filehash]:
-                    file_hashes[filehash].append(file_name)
-                else:
-                    file_hashes[filehash] = [file_name]
+            local.full_hashes[file_name] = ""
 
-    # create thread pool with max threads of _NUM_OPEN_FILES which limits 
-    with ThreadPoolExecutor(max_workers=_NUM_OPEN_FILES) as executor:
-        futures = []
-        # iterate through all files and subdirectories
-        for dirpath, _, file_names in os.walk(directory):
-            for filename in file_names:
-                full_file_name = os.path.join(dirpath, filename)
-                futures.append(executor.submit(_get_files_hash, full_file_name))
+    # iterate through all files and subdirectories
+    for record in walk_files(directory, workers=walk_workers):
+        if record.is_file():
+            stat_result = record.stat  # stat result is taken once during the walk
+            search.add_file(record.path, stat_result.st_size, hardlink_key(stat_result))
 
-        for future in as_completed(futures):
-            future.result()  # wait for all threads to complete
+    # create thread pool with max threads of max_open_files, the controller lets only some of them read
+    with ThreadPoolExecutor(max_workers=max_open_files) as executor:
+        window = _WINDOW_FACTOR * max_open_files  # files submitted at most, the rest waits for free threads
+        edge_candidates = iter(search.edge_hash_candidates())
+        ready: Deque[str] = deque()  # files of size groups with known edges, they are hashed first
+        futures = set()
+        while True:
+            while len(futures) < window:
+                if ready:
+                    futures.add(executor.submit(_get_files_hash, ready.popleft()))
+                    continue
+                candidate = next(edge_candidates, None)
+                if candidate is None:
+                    break
+                futures.add(executor.submit(_get_edges_hash, *candidate))
+            if not futures:
+                break
+            done, futures = wait(futures, return_when=FIRST_COMPLETED)
+            for future in done:
+                result = future.result()
+                if result is None:
+                    continue  # full hash is kept by the thread
+                file_name, file_size, edge_hash, whole_file = result
+                if edge_hash:
+                    ready.extend(search.add_edge_hash(file_name, file_size, edge_hash, whole_file))
+                else:
+                    ready.extend(search.discard_file(file_name))
 
-    return file_hashes
+    for thread_hashes in full_hashes:
+        for file_name, file_hash in thread_hashes.items():
+            if file_hash:
+                search.add_full_hash(file_name, file_hash)
+            else:
+                search.discard_file(file_name)
+    return dict(search.files_hashes)
 
 
 if __name__ == "__main__":
@@ -1,11 +1,15 @@
 import os
 from typing import Tuple
 
+from src.family_album_lib.file_walker import count_files_and_subdirectories
 
-def get_files_and_subdirs_count(directory: str) -> Tuple[int, int]:
+
+_WALK_WORKERS = 8  # directories listed at the same time
+
+
+def get_files_and_subdirs_count(directory: str, walk_workers: int = _WALK_WORKERS) -> Tuple[int, int]:
     file_counts = 0
     dir_counts = 0
     if os.path.isdir(directory):
-            file_counts = sum([len(files) for _, _, files in os.walk(directory)])
-            dir_counts = sum([len(dirs) for _, dirs, _ in os.walk(directory)])
-    return file_counts, dir_counts
\ No newline at end of file
+        file_counts, dir_counts = count_files_and_subdirectories(directory, walk_workers)
+    return file_counts, dir_counts
@@ -1,6 +1,7 @@
+from dataclasses import dataclass, field
 from datetime import datetime
 import os
-from typing import Optional
+from typing import Dict, Optional
 
 import cv2
 import exifread
@@ -8,19 +9,52 @@ import pandas as pd
 from geopy.geocoders import Nominatim
 from matplotlib import pyplot as plt
 from pandas._libs.missing import NAType
-from PIL import Image
+from PIL import Image, UnidentifiedImageError
 import requests
 
 from src.family_album.utility_functions.file_utils import get_file_creation_date
-
-
-def is_image_file(file_name: str) -> bool:
+from src.family_album_lib.media_signature import detect_media_type
+
+_BUFFER_SIZE = 64 * 1024  # header and EXIF block of JPEG (APP1 segment is 64 KB at most) are read at once
+_EXIF_DATE_FORMAT = '%Y:%m:%d %H:%M:%S'
+_EXIF_DATE_TAGS = {306: "DateTime", 36867: "DateTimeOriginal", 36868: "DateTimeDigitized",
+                   50971: "PreviewDateTime"}
+_EXIF_IFD = 0x8769  # sub-IFD with DateTimeOriginal and DateTimeDigitized
+_GPS_IFD = 0x8825
+_MAKE_TAG = 271
+_MODEL_TAG = 272
+
+
+@dataclass
+class ImageMetadata:
+    """Metadata of the image collected by 'get_image_metadata' from one read of the file."""
+    resolution: tuple[int, int]
+    image_format: str = ""
+    make: str = ""
+    model: str = ""
+    dates: Dict[str, datetime] = field(default_factory=dict)  # EXIF date tags found in the image by tag names
+    gps: Optional[tuple[float, float]] = None  # latitude and longitude in degrees
+
+    @property
+    def date_taken(self) -> Optional[datetime]:
+        """The earliest of EXIF dates of the image or None if it has no dates."""
+        return min(self.dates.values()) if self.dates else None
+
+
+def is_image_file(file_name: str, verify: bool = False) -> bool:
     """
-    Check if passed file is image by means of pillow and python-opencv libs together
+    Check if passed file is image by its signature, the file is not decoded
 
     :param file_name: full (absolute) name of the file.
+    :param verify: also open the file by means of pillow and python-opencv libs to check that the image can be read,
+                   files of unknown signature are checked by them too.
     :return: boolean flag - true if the file may assume as image, ot False otherwise.
     """
+    media_type = detect_media_type(file_name)
+    if media_type is not None and not media_type.is_image:
+        return False
+    if not verify:
+        return media_type is not None
     return _is_image_pillow(file_name) or _is_image_cv2(file_name)
 
 
@@ -48,20 +82,58 @@ def _is_image_cv2(file_name: str) -> bool:
         return False
 
 
-def __get_image_capture_date(file_name: str) -> Optional[datetime]:
+def get_image_metadata(file_name: str) -> Optional[ImageMetadata]:
     """
-    This function try to get image's take date by using metadata EXIF.
+    Collect metadata of the image: pillow reads the header and the EXIF block of the file opened once, pixel
+    data is not decoded.
 
     :param file_name: full (absolute) name of the file.
-    :return: datetime value is success or None otherwise
+    :return: metadata of the image or None if the file is not an image known to pillow.
     """
     try:
-        with open(file_name, 'rb') as f:
-            tags = exifread.process_file(f, details=False)
-            date_str = str(tags.get('EXIF DateTimeOriginal'))
-            return datetime.strptime(date_str, '%Y:%m:%d %H:%M:%S')
-    except (IOError, ValueError, AttributeError, KeyError):
+        with open(file_name, 'rb', buffering=_BUFFER_SIZE) as f, Image.open(f) as image:
+            exif = image.getexif()
+            metadata = ImageMetadata(resolution=image.size, image_format=image.format or "",
+                                     make=_exif_text(exif.get(_MAKE_TAG)), model=_exif_text(exif.get(_MODEL_TAG)))
+            tags = dict(exif)
+            tags.update(exif.get_ifd(_EXIF_IFD))
+            for tag, name in _EXIF_DATE_TAGS.items():
+                date = _exif_date(tags.get(tag))
+                if date is not None:
+                    metadata.dates[name] = date
+            metadata.gps = _gps_coordinates(exif.get_ifd(_GPS_IFD))
+            return metadata
+    except (OSError, UnidentifiedImageError, ValueError, SyntaxError):
+        return None
+
+
+def _exif_text(value) -> str:
+    if isinstance(value, bytes):
+        value = value.decode(errors='ignore')
+    return str(value).strip('\x00 ') if value is not None else ""
+
+
+def _exif_date(value) -> Optional[datetime]:
+    try:
+        return datetime.strptime(_exif_text(value), _EXIF_DATE_FORMAT)
+    except ValueError:
+        return None
+
+
+def _gps_coordinates(gps_info: dict) -> Optional[tuple[float, float]]:
+    """Convert GPS IFD (1, 2 - latitude reference and degrees/minutes/seconds, 3, 4 - longitude) to degrees."""
+    try:
+        latitude = _gps_degrees(gps_info[2], gps_info.get(1))
+        longitude = _gps_degrees(gps_info[4], gps_info.get(3))
+    except (KeyError, TypeError, ValueError, ZeroDivisionError):
         return None
+    return latitude, longitude
+
+
+def _gps_degrees(value, reference) -> float:
+    degrees, minutes, seconds = (float(part) for part in value)
+    result = degrees + minutes / 60 + seconds / 3600
+    return -result if _exif_text(reference) in ('S', 'W') else result
 
 
 def get_image_exif(file_name: str, combine: bool = False) -> dict:
@@ -97,35 +169,17 @@ def _get_image_info(file_name: str) -> dict:
 
 def get_image_creation_date(file_name: str) -> datetime|NAType:
     """
-    This function try to get image's creation date by using pillow lib
+    This function try to get image's creation date - the earliest of its EXIF dates or date of the file
 
     :param file_name: full (absolute) name of the file.
-    :return: datetime value is success or None otherwise
+    :return: datetime value is success or NaT otherwise
     """
-    output = pd.NaT
     if not os.path.isfile(file_name):
-        return output
-
-    with Image.open(file_name) as image:
-        exif = image.getexif()
-        creation_date = []
-        if exif:
-            if 306 in exif.keys():  # The date and time of image creation
-                creation_date.append(datetime.strptime(exif[306], '%Y:%m:%d %H:%M:%S'))
-            if 36867 in exif.keys():  # DateTimeOriginal
-                creation_date.append(datetime.strptime(exif[36867], '%Y:%m:%d %H:%M:%S'))
-            if 36868 in exif.keys():  # DateTimeDigitized
-                creation_date.append(datetime.strptime(exif[36868], '%Y:%m:%d %H:%M:%S'))
-            if 50971 in exif.keys():  # PreviewDateTime
-                creation_date.append(datetime.strptime(exif[50971], '%Y:%m:%d %H:%M:%S'))
-        capture_date = __get_image_capture_date(file_name)
-        if isinstance(capture_date, datetime):
-            creation_date.append(capture_date)
-        if len(creation_date) > 0:
-            output = min(creation_date)
-        if output is pd.NaT:
-            output = get_file_creation_date(file_name)
-        return output
+        return pd.NaT
+    metadata = get_image_metadata(file_name)
+    if metadata is not None and metadata.date_taken is not None:
+        return metadata.date_taken
+    return get_file_creation_date(file_name)
 
 
 def get_image_size(file_path: str) -> Optional[tuple[int, int]]:
@@ -135,43 +189,32 @@ def get_image_size(file_path: str) -> Optional[tuple[int, int]]:
     :param file_name: full (absolute) name of the file.
     :return: size of the image in pixels in cas of success or None otherwise
     """
-    try:
-        with Image.open(file_path) as img:
-            return img.size
-    except Exception:
-        return None
+    metadata = get_image_metadata(file_path)
+    return metadata.resolution if metadata is not None else None
 
 
 def get_image_gps_coordinates(file_name: str) -> Optional[tuple]:
     """
-   This function try to get image's geolocation by means of exifread lib
+   This function try to get image's geolocation from EXIF
 
    :param file_name: full (absolute) name of the file.
-   :return: size of the image in pixels in case of success or None otherwise
+   :return: latitude and longitude in degrees in case of success or (None, None) otherwise
    """
-    try:
-        with open(file_name, 'rb') as f:
-            tags = exifread.process_file(f)
-
-        return None, None
-    except Exception:
+    metadata = get_image_metadata(file_name)
+    if metadata is None or metadata.gps is None:
         return None, None
+    return metadata.gps
 
 
 def get_image_maker(file_name: str) -> str:
     """
-    This function try to get image's geolocation by means of exifread lib
+    This function try to get maker of the camera from EXIF
 
     :param file_name: full (absolute) name of the file.
-    :return: size of the image in pixels in case of success or None otherwise
+    :return: maker of the camera or empty string if it is unknown
     """
-    with open(file_name, 'rb') as f:
-        tags = exifread.process_file(f, details=False)
-        make = tags.get('Image Make', None)
-        if make:
-            return str(make)
-        else:
-            return ""  # return empty string instead of None
+    metadata = get_image_metadata(file_name)
+    return metadata.make if metadata is not None else ""
 
 
 def _get_region_from_coords(latitude: float, longitude: float) -> str:
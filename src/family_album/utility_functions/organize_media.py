@@ -2,11 +2,14 @@ import os
 import shutil
 from dataclasses import dataclass
 from datetime import datetime
-from typing import Callable, Dict, List, Tuple
+from typing import Callable, Dict, List, Optional, Tuple
 
-from src.family_album.utility_functions.image_utils import is_image_file, get_image_creation_date
-from src.family_album.utility_functions.video_utils import is_file_a_video, get_video_creation_date
+from src.family_album.utility_functions.image_utils import get_image_creation_date
+from src.family_album.utility_functions.video_utils import get_video_creation_date
 from src.family_album.utility_functions.file_utils import get_file_creation_date
+from src.family_album_lib.file_walker import walk_directory
+from src.family_album_lib.media_signature import detect_media_type
+from src.family_album_lib.scan_control import CancellationToken
 
 
 @dataclass
@@ -46,23 +49,26 @@ def safe_move(src: str, dst_dir: str) -> Tuple[bool, str]:
     return True, dst
 
 
-def get_media_datetime(file_path: str) -> datetime:
-    if is_file_a_video(file_path):
+def get_media_datetime(file_path: str, stat_result: Optional[os.stat_result] = None) -> datetime:
+    media_type = detect_media_type(file_path)
+    if media_type is not None and media_type.is_video:
         dt = get_video_creation_date(file_path)
         return dt
-    if is_image_file(file_path):
+    if media_type is not None and media_type.is_image:
         dt = get_image_creation_date(file_path)
         return dt
-    return get_file_creation_date(file_path)
+    return get_file_creation_date(file_path, stat_result)
 
 
 def organize_directory_by_year_month(source_dir: str, target_root: str | None = None,
-                                     progress_cb: Callable[[str], None] | None = None) -> OrganizeStats:
+                                     progress_cb: Callable[[str], None] | None = None,
+                                     token: CancellationToken | None = None) -> OrganizeStats:
     """
     Organize media files from source_dir into target_root/YYYY/MM folders based on creation/taken datetime.
 
     - If target_root is None, files are reorganized within source_dir into subfolders.
     - Keeps name collisions safe by adding _copyN suffix.
+    - Stops after the current file when the token is cancelled and waits while it is paused.
     - Returns stats including moved/skipped/errors and textual details.
     """
     stats = OrganizeStats()
@@ -71,9 +77,11 @@ def organize_directory_by_year_month(source_dir: str, target_root: str | None =
         return stats
 
     root = target_root or source_dir
-    for dirpath, _, filenames in os.walk(source_dir):
-        for filename in filenames:
-            full_path = os.path.join(dirpath, filename)
+    for dirpath, _, records in walk_directory(source_dir):
+        for record in records:
+            if token is not None and not token.wait_while_paused():
+                return stats
+            full_path = record.path
             stats.total_processed += 1
             try:
                 # Skip our own destination folders to avoid moving already organized media again
@@ -84,7 +92,11 @@ def organize_directory_by_year_month(source_dir: str, target_root: str | None =
                         stats.skipped += 1
                         continue
 
-                dt = get_media_datetime(full_path)
+                try:
+                    stat_result = record.stat
+                except OSError:
+                    stat_result = None  # e.g. broken symlink, it has no date and is skipped
+                dt = get_media_datetime(full_path, stat_result)
                 if not isinstance(dt, datetime):
                     stats.skipped += 1
                     continue
@@ -1,5 +1,6 @@
 from datetime import datetime
 import os.path
+from typing import Optional
 
 import cv2
 from moviepy.video.io.VideoFileClip import VideoFileClip, AudioFileClip
@@ -7,67 +8,79 @@ import pandas as pd
 from pandas._libs.missing import NAType
 
 from src.family_album.utility_functions.file_utils import get_file_creation_date
+from src.family_album_lib.media_signature import detect_media_type
+from src.family_album_lib.video_container import read_video_info
 
 
-def is_file_a_video(file_name):
-    # list of supporting file extensions
-    video_extensions = ['.mp4', '.avi', '.mov', '.mkv', '.wmv', '.flv', '.mpeg', '.mpg', '.3gp', '.3g2', '.webm',
-                        '.mts']
+def is_file_a_video(file_name: str, verify: bool = False) -> bool:
+    """
+    Check if passed file is video by its signature (container header), the file is not decoded
 
-    # check extension
-    if file_name.lower().endswith(tuple(video_extensions)):
+    :param file_name: full (absolute) name of the file.
+    :param verify: also open the file by means of python-opencv lib to check that the video can be read, files of
+                   unknown signature are checked by moviepy (it starts ffmpeg).
+    :return: boolean flag - true if the file may assume as video, ot False otherwise.
+    """
+    media_type = detect_media_type(file_name)
+    if media_type is not None and not media_type.is_video:
+        return False
+    if not verify:
+        return media_type is not None
+    if media_type is not None:
         try:
             # try to open it in OpenCV as video
             cap = cv2.VideoCapture(file_name)
-            if cap.isOpened():
-                return True
-            else:
-                return False
+            return cap.isOpened()
         except Exception:
             return False
-
-    # if extension is not fit - check by getting inner video data info
-    else:
-        try:
-            clip = VideoFileClip(file_name)
-            if clip.n_frames > 1:
-                return True
-            else:
-                return False
-        except (IOError, OSError):
-            return False
+    # if signature is unknown - check by getting inner video data info
+    try:
+        clip = VideoFileClip(file_name)
+        return clip.n_frames > 1
+    except (IOError, OSError):
+        return False
 
 
 def get_video_metadata(file_name: str) -> dict:
     """
-     This function try to get video metadata by means of python-opencv lib
+     This function try to get video metadata from headers of its container (MP4/MOV/3GP, MTS/TS), python-opencv and
+     moviepy libs are used only if the container does not give resolution, frame rate or duration of the video
 
      :param file_name: full (absolute) name of the file.
      :return: dictionary with metadata or empty dictionary
      """
-    output = {}
+    info = read_video_info(file_name)
+    output = info.as_metadata() if info is not None else {}
+    if all(key in output for key in ('resolution', 'bitrate', 'duration')):
+        return output
+    fallback = {}
     try:
-        output.update(_get_video_meta_data_from_moviepy(file_name))
+        fallback.update(_get_video_meta_data_from_moviepy(file_name))
     except Exception:
         try:
-            output.update(_get_video_meta_data_from_cv2(file_name))
+            fallback.update(_get_video_meta_data_from_cv2(file_name))
         except Exception:
             pass
-    return output
+    fallback.update(output)
+    return fallback
 
 
-def get_video_creation_date(file_name: str) -> datetime|NAType:
+def get_video_creation_date(file_name: str, metadata: Optional[dict] = None) -> datetime|NAType:
     """
-    This function try to get image's creation date by using pillow lib
+    This function try to get video's creation date from its metadata
 
     :param file_name: full (absolute) name of the file.
+    :param metadata: result of 'get_video_metadata' if it was already called for the file.
     :return: datetime value is success or None otherwise
     """
     output = pd.NaT
     if not os.path.isfile(file_name):
         return output
 
-    metadata = get_video_metadata(file_name)
+    if metadata is None:
+        metadata = get_video_metadata(file_name)
+    if isinstance(metadata.get('creation_time'), datetime):
+        return metadata['creation_time']
     if metadata and 'infos' in metadata.keys():
         infos = metadata['infos']
         if infos and 'metadata' in infos.keys():
@@ -89,13 +102,16 @@ def get_video_creation_date(file_name: str) -> datetime|NAType:
 def _get_video_meta_data_from_cv2(file_name: str) -> dict:
     output = {}
     if is_file_a_video(file_name):
-            cap = cv2.VideoCapture(file_name)
+        cap = cv2.VideoCapture(file_name)
+        try:
             output['resolution'] = [cap.get(cv2.CAP_PROP_FRAME_WIDTH), cap.get(cv2.CAP_PROP_FRAME_HEIGHT)]
             output['bitrate'] = int(cap.get(cv2.CAP_PROP_FPS))
             output['codec'] = cap.get(cv2.CAP_PROP_FOURCC)
             frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
             output['n_frames'] = frame_count
             output['duration'] = frame_count / output['bitrate']
+        finally:
+            cap.release()
     return output
 
 
@@ -103,19 +119,22 @@ def _get_video_meta_data_from_moviepy(file_name: str) -> dict:
     output = {}
     if is_file_a_video(file_name):
         clip = VideoFileClip(file_name)
-        output['resolution'] = [clip.w, clip.h]
-        output['bitrate'] = int(clip.fps)
-        output['duration'] = float(clip.duration)
-        output['aspect_ratio'] = clip.aspect_ratio
-        output['n_frames_moviepy'] = int(clip.n_frames)
-        output['infos'] = clip.reader.infos
-        audio: AudioFileClip = clip.audio
-        if audio is not None:
-            output['audio_duration'] = f"{audio.duration}"
-            output['audio_bitrate'] = f"{audio.reader.bitrate}"
-            output['audio_codec'] = f"{audio.reader.codec}"
-        else:
-            output['audio_moviepy'] = "No audio"
+        try:
+            output['resolution'] = [clip.w, clip.h]
+            output['bitrate'] = int(clip.fps)
+            output['duration'] = float(clip.duration)
+            output['aspect_ratio'] = clip.aspect_ratio
+            output['n_frames_moviepy'] = int(clip.n_frames)
+            output['infos'] = clip.reader.infos
+            audio: AudioFileClip = clip.audio
+            if audio is not None:
+                output['audio_duration'] = f"{audio.duration}"
+                output['audio_bitrate'] = f"{audio.reader.bitrate}"
+                output['audio_codec'] = f"{audio.reader.codec}"
+            else:
+                output['audio_moviepy'] = "No audio"
+        finally:
+            clip.close()
     return output
 
 
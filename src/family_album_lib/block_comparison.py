@@ -0,0 +1,165 @@
+from dataclasses import dataclass, field
+from typing import BinaryIO, Dict, List, Optional
+
+from src.family_album_lib.file_hashing import _BLOCK_SIZE  # the largest block read from every file at once
+
+_MIN_BLOCK_SIZE = 64 * 1024
+_ALIGNMENT = 4096
+_COMPARISON_MEMORY_LIMIT = 64 * 1024 * 1024  # read buffers of one comparison together, not of the whole search
+_MAX_OPEN_FILES = 64  # larger groups reopen files for every block instead of keeping them open
+
+
+@dataclass
+class BlockComparison:
+    groups: List[List[str]]  # byte-identical files, every file is in exactly one group, order is kept
+    failed: Dict[str, Exception] = field(default_factory=dict)  # files that could not be read
+    bytes_read: int = 0
+
+
+class _BlockReader:
+    def __init__(self, file_name: str, keep_open: bool) -> None:
+        self.file_name = file_name
+        self.__keep_open = keep_open
+        self.__file: Optional[BinaryIO] = None
+
+    def read(self, offset: int, view: memoryview) -> int:
+        """Fill the view with bytes of the file starting at offset, fewer bytes are read only at the end."""
+        file = self.__file if self.__file is not None else open(self.file_name, 'rb', buffering=0)
+        try:
+            if file.tell() != offset:
+                file.seek(offset)
+            filled = 0
+            while filled < len(view):
+                read_bytes = file.readinto(view[filled:])
+                if not read_bytes:
+                    break
+                filled += read_bytes
+        except Exception:
+            file.close()
+            self.__file = None
+            raise
+        if self.__keep_open:
+            self.__file = file
+        else:
+            file.close()
+        return filled
+
+    def close(self) -> None:
+        if self.__file is not None:
+            self.__file.close()
+            self.__file = None
+
+
+def _batch_size(memory_limit: int) -> int:
+    """Number of files compared at once, so that each of them and the scratch buffer get the smallest block."""
+    return max(2, memory_limit // _MIN_BLOCK_SIZE - 1)
+
+
+def _block_size(files_count: int, memory_limit: int) -> int:
+    block_size = min(_BLOCK_SIZE, memory_limit // (files_count + 1))
+    return max(_ALIGNMENT, block_size - block_size % _ALIGNMENT)
+
+
+def compare_files(file_names: List[str], file_size: int, memory_limit: int = _COMPARISON_MEMORY_LIMIT,
+                  max_open_files: int = _MAX_OPEN_FILES) -> BlockComparison:
+    """
+    Split files of the same size into groups of byte-identical files.
+
+    All files are read in lockstep by aligned blocks. A group splits as soon as blocks of its files differ,
+    and a file that became unique is not read anymore, so files differing at the beginning cost one block.
+    Groups too large for the memory limit are compared by batches: new files of every batch are compared
+    with the first file of each group found before, a part of the groups at a time.
+
+    :param file_names: full (absolute) names of files, all of them should have 'file_size' bytes.
+    :param file_size: size of the files in bytes.
+    :param memory_limit: bytes of read buffers allowed for the comparison, defines the block size.
+    :param max_open_files: groups with more files do not keep files open between blocks.
+    :return: groups of identical files, files that could not be read and number of bytes read.
+    """
+    batch_size = _batch_size(memory_limit)
+    if len(file_names) <= batch_size:
+        return _compare_batch(file_names, file_size, _block_size(len(file_names), memory_limit), max_open_files)
+    block_size = _block_size(batch_size, memory_limit)
+    result = BlockComparison([])
+    groups: List[List[str]] = []  # found groups, their first files represent them in later comparisons
+    new_files_count = batch_size // 2
+    for start in range(0, len(file_names), new_files_count):
+        new_groups = [[file_name] for file_name in file_names[start:start + new_files_count]]
+        chunk_size = batch_size - len(new_groups)
+        for chunk_start in range(0, max(len(groups), 1), chunk_size):
+            chunk = {group[0]: group for group in groups[chunk_start:chunk_start + chunk_size] if group}
+            new_by_file = {group[0]: group for group in new_groups}
+            comparison = _compare_batch(list(chunk) + list(new_by_file), file_size, block_size, max_open_files)
+            result.failed.update(comparison.failed)
+            result.bytes_read += comparison.bytes_read
+            new_groups = []
+            for names in comparison.groups:
+                found = [name for name in names if name in chunk]
+                members = [file_name for name in names if name in new_by_file for file_name in new_by_file[name]]
+                if found:  # at most one group of the chunk, groups found before differ from each other
+                    chunk[found[0]].extend(members)
+                else:
+                    new_groups.append(members)
+            for name in comparison.failed:  # the file is left out, other files of its group keep the group
+                if name in chunk:
+                    chunk[name].remove(name)
+                elif len(new_by_file[name]) > 1:
+                    new_groups.append(new_by_file[name][1:])
+            if not new_groups:
+                break
+        groups = [group for group in groups if group] + new_groups
+    order = {file_name: i for i, file_name in enumerate(file_names)}
+    result.groups = sorted(groups, key=lambda names: order[names[0]])
+    return result
+
+
+def _compare_batch(file_names: List[str], file_size: int, block_size: int, max_open_files: int) -> BlockComparison:
+    result = BlockComparison([])
+    readers = [_BlockReader(file_name, len(file_names) <= max_open_files) for file_name in file_names]
+    active = [readers] if len(readers) > 1 else []
+    finished = [readers] if len(readers) == 1 else []
+    scratch = bytearray(block_size)
+    try:
+        offset = 0
+        while active and offset < file_size:
+            view_size = min(block_size, file_size - offset)
+            still_active = []
+            for group in active:
+                # every subgroup keeps the block of its first file, other files are compared with it
+                subgroups: List[List[_BlockReader]] = []
+                blocks: List[memoryview] = []
+                for reader in group:
+                    view = memoryview(scratch)[:view_size]
+                    try:
+                        read_bytes = reader.read(offset, view)
+                    except Exception as e:
+                        result.failed[reader.file_name] = e
+                        reader.close()
+                        continue
+                    result.bytes_read += read_bytes
+                    view = view[:read_bytes]
+                    for subgroup, block in zip(subgroups, blocks):
+                        if block == view:
+                            subgroup.append(reader)
+                            break
+                    else:
+                        subgroups.append([reader])
+                        blocks.append(view)
+                        scratch = bytearray(block_size)  # the block is kept, next file is read into a new one
+                for subgroup in subgroups:
+                    if len(subgroup) > 1 and offset + view_size < file_size:
+                        still_active.append(subgroup)
+                    else:
+                        finished.append(subgroup)
+                        for reader in subgroup:
+                            reader.close()
+            active = still_active
+            offset += view_size
+        finished.extend(active)
+    finally:
+        for reader in readers:
+            reader.close()
+    order = {file_name: i for i, file_name in enumerate(file_names)}
+    result.groups = sorted(([reader.file_name for reader in group] for group in finished),
+                           key=lambda names: order[names[0]])
+    return result
@@ -1,10 +1,16 @@
 import os
 from abc import ABC
+from typing import Iterator, List, Tuple
+
+from src.family_album_lib.file_walker import FileRecord, count_files_and_subdirectories, walk_directory
 
 
 class DirectoryAnalyser(ABC):
 
+    _WALK_WORKERS = 8  # directories listed at the same time, hides latency of network file systems
+
     def __init__(self, directory: str) -> None:
+        self.__walk_workers: int = self._WALK_WORKERS
         if os.path.isdir(directory):
             self.__current_directory = directory
         else:
@@ -13,13 +19,29 @@ class DirectoryAnalyser(ABC):
 
     @property
     def files_count_in_directory(self) -> int:
-        file_counts = sum([len(files) for _, _, files in os.walk(self.directory)])
-        return file_counts
+        return self.files_and_subdirectories_count[0]
 
     @property
     def subdirectories_count_in_directory(self) -> int:
-        dir_counts = sum([len(dirs) for _, dirs, _ in os.walk(self.directory)])
-        return dir_counts
+        return self.files_and_subdirectories_count[1]
+
+    @property
+    def files_and_subdirectories_count(self) -> Tuple[int, int]:
+        """Numbers of files and sub-directories counted in one walk of the directory."""
+        return count_files_and_subdirectories(self.directory, self.__walk_workers)
+
+    @property
+    def walk_workers(self) -> int:
+        """Number of directories listed at the same time, 1 walks the tree sequentially."""
+        return self.__walk_workers
+
+    @walk_workers.setter
+    def walk_workers(self, new_workers: int) -> None:
+        self.__walk_workers = max(1, new_workers)
+
+    def walk(self) -> Iterator[Tuple[str, List[str], List[FileRecord]]]:
+        """Walk the directory tree in the order of os.walk, see 'walk_directory'."""
+        return walk_directory(self.directory, workers=self.__walk_workers)
 
     @property
     def directory(self) -> str:
@@ -0,0 +1,132 @@
+import os
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Set, Tuple
+
+from src.family_album_lib.file_walker import FileRecord, walk_directory
+
+_WALK_WORKERS = 8  # directories listed at the same time by the initial walk
+
+
+@dataclass
+class FileChanges:
+    added: List[str] = field(default_factory=list)
+    removed: List[str] = field(default_factory=list)
+    modified: List[str] = field(default_factory=list)  # size or modification time of the file changed
+
+    def __bool__(self) -> bool:
+        return bool(self.added or self.removed or self.modified)
+
+
+class DirectoryState:
+    """
+    Last known state of the directory tree for watch mode: modification time of every directory and size and
+    modification time of every file.
+
+    After the initial walk only changed directories are listed again: 'refresh' takes directories reported by
+    file system notifications and 'poll' finds them by modification time, which needs one stat per directory
+    and none per file. Files modified in place do not change their directory, so they are found when anything
+    else in the directory changes.
+    """
+
+    def __init__(self, directory: str) -> None:
+        self.__directory = directory
+        self.__directories: Dict[str, int] = {}  # modification time of every walked directory
+        self.__files: Dict[str, Dict[str, Tuple[int, int]]] = {}  # size and modification time of files by directory
+        self.__subdirectories: Dict[str, Set[str]] = {}
+        self.__walk(directory, FileChanges())
+
+    @property
+    def directory(self) -> str:
+        return self.__directory
+
+    @property
+    def directories(self) -> List[str]:
+        """All directories of the tree, they should be watched for changes."""
+        return list(self.__directories)
+
+    @property
+    def files(self) -> List[str]:
+        return [os.path.join(dirpath, name) for dirpath, files in self.__files.items() for name in files]
+
+    def refresh(self, directories: Iterable[str]) -> FileChanges:
+        """
+        List the changed directories again.
+
+        :param directories: directories reported as changed, unknown and removed directories are accepted.
+        :return: files added, removed and modified since the previous state.
+        """
+        changes = FileChanges()
+        for dirpath in sorted(set(directories)):
+            if dirpath not in self.__directories:
+                continue  # reported by a notification for a directory that was removed meanwhile
+            try:
+                mtime_ns = os.stat(dirpath).st_mtime_ns
+                with os.scandir(dirpath) as entries:
+                    listed = list(entries)
+            except OSError:
+                self.__forget(dirpath, changes)
+                continue
+            self.__directories[dirpath] = mtime_ns
+            self.__update_files(dirpath, [FileRecord(entry.path, entry) for entry in listed
+                                          if not self.__is_directory(entry)], changes)
+            subdirectories = {entry.path for entry in listed if self.__is_directory(entry) and not entry.is_symlink()}
+            for removed in self.__subdirectories[dirpath] - subdirectories:
+                self.__forget(removed, changes)
+            for added in subdirectories - self.__subdirectories[dirpath]:
+                self.__walk(added, changes)
+            self.__subdirectories[dirpath] = subdirectories
+        return changes
+
+    def poll(self) -> FileChanges:
+        """Find changed directories by their modification time and list them again."""
+        changed = []
+        for dirpath, mtime_ns in self.__directories.items():
+            try:
+                if os.stat(dirpath).st_mtime_ns != mtime_ns:
+                    changed.append(dirpath)
+            except OSError:
+                changed.append(dirpath)
+        return self.refresh(changed)
+
+    def __walk(self, directory: str, changes: FileChanges) -> None:
+        for dirpath, dirnames, records in walk_directory(directory, workers=_WALK_WORKERS):
+            try:
+                self.__directories[dirpath] = os.stat(dirpath).st_mtime_ns
+            except OSError:
+                continue
+            self.__files[dirpath] = {}
+            self.__update_files(dirpath, records, changes)
+            self.__subdirectories[dirpath] = {os.path.join(dirpath, dirname) for dirname in dirnames
+                                              if not os.path.islink(os.path.join(dirpath, dirname))}
+
+    def __update_files(self, dirpath: str, records: List[FileRecord], changes: FileChanges) -> None:
+        known = self.__files.setdefault(dirpath, {})
+        files: Dict[str, Tuple[int, int]] = {}
+        for record in records:
+            try:
+                if not record.is_file():
+                    continue
+                files[record.name] = (record.size, record.mtime_ns)
+            except OSError:
+                continue
+            if record.name not in known:
+                changes.added.append(record.path)
+            elif known[record.name] != files[record.name]:
+                changes.modified.append(record.path)
+        changes.removed.extend(os.path.join(dirpath, name) for name in known if name not in files)
+        self.__files[dirpath] = files
+
+    def __forget(self, dirpath: str, changes: FileChanges) -> None:
+        """Remove the directory and its sub-directories from the state, their files are reported as removed."""
+        self.__directories.pop(dirpath, None)
+        files = self.__files.pop(dirpath, {})
+        changes.removed.extend(os.path.join(dirpath, name) for name in files)
+        for subdirectory in self.__subdirectories.pop(dirpath, set()):
+            self.__forget(subdirectory, changes)
+
+    @staticmethod
+    def __is_directory(entry: os.DirEntry) -> bool:
+        try:
+            return entry.is_dir()
+        except OSError:
+            return False
@@ -1,30 +1,63 @@
+import asyncio
 import json
 import os
-import hashlib
-from typing import List, Dict, Callable
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from threading import Thread, Lock
+import stat
+from collections import deque
+from collections.abc import Mapping
+from functools import partial
+from time import monotonic
+from typing import List, Dict, Callable, Deque, Iterator, Tuple, AsyncIterator, Optional
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from threading import Thread
 
+from src.family_album_lib.block_comparison import BlockComparison, compare_files
 from src.family_album_lib.directory_analyser import DirectoryAnalyser
+from src.family_album_lib.directory_state import FileChanges
+from src.family_album_lib.file_hashing import _EDGE_SIZE, _MEMORY_LIMIT, BufferPool, get_file_edges_hash, get_file_hash
+from src.family_album_lib.file_walker import FileRecord
+from src.family_album_lib.io_concurrency import ConcurrencyController, ConcurrencyStats
+from src.family_album_lib.progress import ProgressSnapshot, ProgressTracker
+from src.family_album_lib.hash_cache import FileSignature, HashCache, file_signature
+from src.family_album_lib.scan_checkpoint import ScanCheckpoint, WalkedDirectory, WalkedFile
+from src.family_album_lib.scan_control import CancellationToken
+from src.family_album_lib.staged_duplicate_search import StagedDuplicateSearch, hardlink_key
 
 
 class DuplicateFileAnalyser():
 
-    _NUM_OPEN_FILES = 200
+    _NUM_OPEN_FILES = 64  # upper bound of files read at the same time, the actual number adapts to the storage
+    _MEMORY_LIMIT = _MEMORY_LIMIT  # bytes of read buffers allowed for all threads together
+    _CHECKPOINT_INTERVAL = 60  # seconds between writes of the scan checkpoint
+    _WINDOW_FACTOR = 4  # files submitted to the thread pool at most, per thread
+    HASH_MATCHING = "hash"  # candidates are hashed completely and matched by digests
+    BLOCK_MATCHING = "blocks"  # candidates are compared byte by byte, reading stops where files differ
 
-    def __init__(self, directory: str, instantly_opened_files: int = 0) -> None:
+    def __init__(self, directory: str, instantly_opened_files: int = 0, memory_limit: int = 0,
+                 min_opened_files: int = 1) -> None:
         super().__init__()
         self._directory_analyser: DirectoryAnalyser = DirectoryAnalyser(directory)
-        self.__files_hashes: Dict[str, List[str]] = {}
+        self.__files_hashes: Mapping = {}
+        self.__duplicate_files: Mapping = {}
+        self.__hardlinked_files: Dict[str, List[str]] = {}
+        self.__search: Optional[StagedDuplicateSearch] = None  # search of the last finished scan, for watch mode
         self.__files_analysed: int = 0
-        self.__progress: int = 0
+        self.__progress: ProgressTracker = ProgressTracker()
+        self.__cancelled: bool = False
+        self.__checkpoint_time: float = 0
         if instantly_opened_files <= 0:
             self.__num_of_threads = self._NUM_OPEN_FILES
         else:
             self.__num_of_threads = instantly_opened_files
+        self.__min_opened_files: int = max(1, min(min_opened_files, self.__num_of_threads))
+        self.__concurrency: ConcurrencyStats = ConcurrencyStats(0)
+        self.__memory_limit: int = memory_limit if memory_limit > 0 else self._MEMORY_LIMIT
+        self.__matching: str = self.HASH_MATCHING
         self.start_analysis: Callable = None
         self.update_progress: Callable = None
         self.log_event: Callable = None
+        self.hash_cache: HashCache = None  # optional persistent cache of digests for incremental rescans
+        self.checkpoint: ScanCheckpoint = None  # optional checkpoint to resume interrupted scans, replaces hash_cache
+        self.checkpoint_interval: float = self._CHECKPOINT_INTERVAL
 
     @property
     def directory(self) -> str:
@@ -34,6 +67,9 @@ class DuplicateFileAnalyser():
     def directory(self, new_directory: str) -> None:
         self._directory_analyser.directory = new_directory
         self.__files_hashes = {}
+        self.__duplicate_files = {}
+        self.__hardlinked_files = {}
+        self.__search = None
         self.__files_analysed = 0
 
     @property
@@ -45,68 +81,390 @@ class DuplicateFileAnalyser():
         return self._directory_analyser.subdirectories_count_in_directory
 
     @property
-    def files_hashes(self) -> Dict[str, List[str]]:
+    def files_and_subdirectories_count(self) -> Tuple[int, int]:
+        return self._directory_analyser.files_and_subdirectories_count
+
+    @property
+    def walk_workers(self) -> int:
+        return self._directory_analyser.walk_workers
+
+    @walk_workers.setter
+    def walk_workers(self, new_workers: int) -> None:
+        self._directory_analyser.walk_workers = new_workers
+
+    @property
+    def memory_limit(self) -> int:
+        return self.__memory_limit
+
+    @memory_limit.setter
+    def memory_limit(self, new_limit: int) -> None:
+        self.__memory_limit = new_limit if new_limit > 0 else self._MEMORY_LIMIT
+
+    @property
+    def matching(self) -> str:
+        """How files with the same size and edges are matched: HASH_MATCHING or BLOCK_MATCHING."""
+        return self.__matching
+
+    @matching.setter
+    def matching(self, new_matching: str) -> None:
+        if new_matching not in (self.HASH_MATCHING, self.BLOCK_MATCHING):
+            raise ValueError(f"Unknown matching '{new_matching}', use one of "
+                             f"{[self.HASH_MATCHING, self.BLOCK_MATCHING]}.")
+        self.__matching = new_matching
+
+    @property
+    def files_hashes(self) -> Mapping:
+        """Read-only mapping of key and files with the key, files are kept in compact index of the search."""
         return self.__files_hashes
 
     @property
-    def duplicate_files(self) -> Dict[str, List[str]]:
-        if len(self.__files_hashes) > 0:
-            return {file[0]: file[1:] for _, file in self.__files_hashes.items() if len(file) > 1}
-        else:
-            return {}
+    def hardlinked_files(self) -> Dict[str, List[str]]:
+        """Files that are hardlinks of the same inode, they are already deduplicated and are not hashed."""
+        return self.__hardlinked_files
+
+    @property
+    def concurrency(self) -> ConcurrencyStats:
+        """Number of files read at the same time and measured throughput of the current or the last scan."""
+        return self.__concurrency
 
-    def start_analysis_thread(self):
-        self._find_duplicate_files_multithreaded()
+    @property
+    def progress(self) -> ProgressSnapshot:
+        """Counters, throughput and estimated time left of the current or the last scan."""
+        return self.__progress.snapshot
+
+    @property
+    def cancelled(self) -> bool:
+        """True if the last scan was cancelled, its results are incomplete."""
+        return self.__cancelled
+
+    @property
+    def duplicate_files(self) -> Mapping:
+        """Read-only mapping of original file and list of its duplicates, groups are produced on demand."""
+        return self.__duplicate_files
+
+    def start_analysis_thread(self, token: Optional[CancellationToken] = None):
+        self._find_duplicate_files_multithreaded(token)
+
+    def _find_duplicate_files_multithreaded(self, token: Optional[CancellationToken] = None) -> None:
+        for _ in self.iter_duplicate_groups(token):
+            pass
 
+    def iter_duplicate_groups(self, token: Optional[CancellationToken] = None) -> Iterator[Tuple[str, List[str]]]:
+        """
+        Search for duplicate files and yield each group of duplicates as soon as it is confirmed, i.e. all files
+        of its size are hashed, while the rest of the directory is still being analysed. Results are also
+        collected in 'files_hashes' and 'duplicate_files' as by 'start_analysis_thread'.
 
-    def _find_duplicate_files_multithreaded(self) -> None:
-        # create empty dicts for hash and for duplicates
+        :param token: token to cancel or pause the scan. When 'checkpoint' is set, cancelled or crashed scan
+                      resumes from the last checkpoint.
+        :return: iterator of (original file, list of its duplicates).
+        """
+        # files are grouped by size, then by hash of their edges, and only then hashed completely
         self.__files_hashes = {}
+        self.__duplicate_files = {}
+        self.__search = None
         self.__files_analysed = 0
-        self.__progress = 0
-        total_files = self._directory_analyser.files_count_in_directory
+        self.__progress = ProgressTracker(on_update=self.__report_progress)
+        self.__cancelled = False
+        self.__checkpoint_time = monotonic()
+        token = token if token is not None else CancellationToken()
         if isinstance(self.start_analysis, Callable):
             self.start_analysis("Start analysis.")
-        lock = Lock()  # use lock to avoid simultaneous edit dictionary 'file_hashes' from several threads
+        search = StagedDuplicateSearch()
+        self.__files_hashes = search.files_hashes  # views of the search index, filled while the stages proceed
+        self.__duplicate_files = search.duplicate_files
+        self.__hardlinked_files = search.hardlinked_files
+        cache = self.checkpoint if self.checkpoint is not None else self.hash_cache
+        try:
+            yield from self.__search_duplicates(search, cache, token)
+        finally:
+            if cache is not None:
+                cache.flush()
+        if token.is_cancelled:
+            self.__cancelled = True
+            if isinstance(self.log_event, Callable):
+                self.log_event(f"Analysis of {self.directory} was cancelled.")
+            return
+        if self.checkpoint is not None:
+            self.checkpoint.clear_walk(self.directory)
+        self.__search = search
+        total_files = search.files_count
+        self.__files_analysed = total_files - search.pending_count
+        if 0 < total_files:
+            self.__progress.finish()
 
-        def _get_files_hash(file_name: str) -> None:
-            """
-            Local function that calculates file's hash and update the resulting dictionary
-            """
-            if not os.path.isfile(file_name):
+    def update_files(self, changes: FileChanges) -> None:
+        """
+        Apply changes found by watch mode to the results of the last finished scan without walking the directory
+        again. Removed and modified files leave their groups, added and modified files join them. Only changed
+        files and files of their sizes that were resolved without full hash are read.
+
+        :param changes: changes of files of the directory, e.g. from 'DirectoryState'.
+        """
+        search = self.__search
+        if search is None:
+            return
+        cache = self.checkpoint if self.checkpoint is not None else self.hash_cache
+        for file_name in changes.removed + changes.modified:
+            search.remove_resolved_file(file_name)
+        for file_name in changes.added + changes.modified:
+            try:
+                stat_result = os.stat(file_name)
+                if not stat.S_ISREG(stat_result.st_mode):
+                    continue
+                groups = search.resolved_groups_of_size(stat_result.st_size)
+                if groups:
+                    for key, file_names in groups.items():
+                        if ":" in key:  # resolved by size, edges or block comparison, full hash is needed now
+                            search.replace_key(file_names, self.__full_hash(file_names[0], cache))
+                    key = self.__full_hash(file_name, cache, stat_result)
+                else:
+                    key = f"size:{stat_result.st_size}"
+            except OSError as e:
+                self.__log_error(f"Error reading file {file_name}: {e}")
+                continue
+            search.add_resolved_file(file_name, stat_result.st_size, key, hardlink_key(stat_result))
+        if cache is not None:
+            cache.flush()
+
+    @staticmethod
+    def __full_hash(file_name: str, cache: Optional[HashCache], stat_result: Optional[os.stat_result] = None) -> str:
+        signature = file_signature(stat_result if stat_result is not None else os.stat(file_name))
+        cached = cache.lookup(file_name, signature) if cache is not None else None
+        if cached is not None and cached.full_hash:
+            return cached.full_hash
+        full_hash = get_file_hash(file_name)
+        if cache is not None:
+            cache.store_full_hash(file_name, signature, full_hash)
+        return full_hash
+
+    def __search_duplicates(self, search: StagedDuplicateSearch, cache: Optional[HashCache],
+                            token: CancellationToken) -> Iterator[Tuple[str, List[str]]]:
+        signatures: Dict[str, FileSignature] = {}
+        walked = self.checkpoint.load_walk(self.directory) if self.checkpoint is not None else {}
+        for dirpath, _, records in self._directory_analyser.walk():
+            if not token.wait_while_paused():
                 return
+            for walked_file in self.__walk_directory(dirpath, records, walked).files:
+                full_file_name = os.path.join(dirpath, walked_file.name)
+                signatures[full_file_name] = walked_file.signature
+                search.add_file(full_file_name, walked_file.size, walked_file.inode)
+            self.__save_checkpoint()
+        total_files = search.files_count
+        if cache is not None:
+            cache.load(self.directory)
+            cache.evict_missing(self.directory, signatures.keys())
+        buffers = BufferPool(self.__memory_limit)  # bounds memory used for reading regardless of file sizes
+        # number of files read at the same time follows throughput of the storage between the bounds
+        controller = ConcurrencyController(self.__min_opened_files, self.__num_of_threads)
+        self.__progress.set_total(total_files)
+
+        def _update_progress(bytes_read: int = 0) -> None:
+            self.__files_analysed = total_files - search.pending_count
+            self.__concurrency = controller.stats
+            self.__progress.update(self.__files_analysed, bytes_read, controller.level)
+
+        # workers only read files, their results are applied to the search by the scanning thread, so the search
+        # needs no lock; every worker returns a function that applies its result and returns files ready to match
+        def _get_edges_hash(file_name: str, file_size: int) -> Callable[[], List[str]]:
+            """Local function that calculates hash of file's edges"""
+            if not token.wait_while_paused():
+                return list
             try:
-                with open(file_name, 'rb') as file:
-                    filehash = hashlib.blake2b(file.read()).hexdigest()
+                with controller.slot(min(file_size, 2 * _EDGE_SIZE)) as reading, buffers.borrow() as buffer:
+                    edge_hash, whole_file = get_file_edges_hash(file_name, file_size, buffer)
             except Exception as e:
-                m = f"Error reading file {file_name}: {e}"
-                if isinstance(self.log_event, Callable):
-                    self.log_event(m)
-                print(m)
-                return
-            else:
-                with lock:  # context manager will release lock automatically even in case of an error
-                    # add hash and file name to dictionary
-                    if filehash in self.__files_hashes.keys() and file_name not in self.__files_hashes[filehash]:
-                        self.__files_hashes[filehash].append(file_name)
+                self.__log_error(f"Error reading file {file_name}: {e}")
+                return partial(_discard_file, file_name)
+            if cache is not None:
+                cache.store_edge_hash(file_name, signatures[file_name], edge_hash, whole_file)
+            return partial(_add_edge_hash, file_name, file_size, edge_hash, whole_file, reading.bytes_read)
+
+        def _get_files_hash(file_name: str) -> Callable[[], List[str]]:
+            """Local function that calculates file's hash"""
+            if not token.wait_while_paused():
+                return list
+            try:
+                file_size = signatures[file_name][2]  # signature is (device, inode, size, mtime_ns)
+                with controller.slot(file_size) as reading, buffers.borrow() as buffer:
+                    filehash = get_file_hash(file_name, buffer)
+            except Exception as e:
+                self.__log_error(f"Error reading file {file_name}: {e}")
+                return partial(_discard_file, file_name)
+            if cache is not None:
+                cache.store_full_hash(file_name, signatures[file_name], filehash)
+            return partial(_add_full_hash, file_name, filehash, reading.bytes_read)
+
+        def _compare_files(file_names: List[str]) -> Callable[[], List[str]]:
+            """Local function that compares files with the same size and edges block by block"""
+            if not token.wait_while_paused():
+                return list
+            file_size = signatures[file_names[0]][2]
+            with controller.slot(file_size * len(file_names)) as reading:
+                comparison = compare_files(file_names, file_size, self.__memory_limit // self.__num_of_threads)
+                reading.bytes_read = comparison.bytes_read
+            for file_name, e in comparison.failed.items():
+                self.__log_error(f"Error reading file {file_name}: {e}")
+            return partial(_add_comparison, comparison)
+
+        def _add_edge_hash(file_name: str, file_size: int, edge_hash: str, whole_file: bool,
+                           bytes_read: int = 0) -> List[str]:
+            ready_files = search.add_edge_hash(file_name, file_size, edge_hash, whole_file)
+            _update_progress(bytes_read)
+            return ready_files
+
+        def _add_full_hash(file_name: str, filehash: str, bytes_read: int = 0) -> List[str]:
+            search.add_full_hash(file_name, filehash)
+            _update_progress(bytes_read)
+            return []
+
+        def _add_comparison(comparison: BlockComparison) -> List[str]:
+            for file_name in comparison.failed:
+                search.discard_file(file_name)
+            for group in comparison.groups:
+                search.add_identical_files(group)
+            _update_progress(comparison.bytes_read)
+            return []
+
+        def _discard_file(file_name: str) -> List[str]:
+            ready_files = search.discard_file(file_name)
+            _update_progress()
+            return ready_files
+
+        def _confirmed_groups() -> List[Tuple[str, List[str]]]:
+            return [(group[0], group[1:]) for group in search.pop_confirmed_groups()]
+
+        # create thread pool with max threads of __num_of_threads, the controller lets only some of them read
+        executor = ThreadPoolExecutor(max_workers=self.__num_of_threads)
+        try:
+            futures = set()
+            ready: Deque[Tuple] = deque()  # work of size groups that finished the edges stage, it goes first
+            window = self._WINDOW_FACTOR * self.__num_of_threads
+
+            def _match_files(file_names: List[str]) -> None:
+                if self.__matching == self.BLOCK_MATCHING:
+                    ready.extend((_compare_files, group) for group in search.group_candidates(file_names))
+                    return
+                for file_name in file_names:
+                    cached = cache.lookup(file_name, signatures[file_name]) if cache is not None else None
+                    if cached is not None and cached.full_hash:  # file is unchanged since the previous scan
+                        _add_full_hash(file_name, cached.full_hash)
                     else:
-                        self.__files_hashes[filehash] = [file_name]
-                self.__files_analysed += 1
-                current_progress = int(self.__files_analysed / total_files * 100)
-                if current_progress > self.__progress:
-                    self.__progress = current_progress
-                    if isinstance(self.update_progress, Callable):
-                        self.update_progress(self.__files_analysed, total_files)
-
-        # create thread pool with max threads of _NUM_OPEN_FILES which limits
-        with ThreadPoolExecutor(max_workers=self._NUM_OPEN_FILES) as executor:
-            futures = []
-            # iterate through all files and subdirectories
-            for dirpath, _, file_names in os.walk(self.directory):
-                for filename in file_names:
-                    full_file_name = os.path.join(dirpath, filename)
-                    futures.append(executor.submit(_get_files_hash, full_file_name))
-
-            for future in as_completed(futures):
-                future.result()  # wait for all threads to complete
-        return
+                        ready.append((_get_files_hash, file_name))
+
+            def _fill_window() -> None:
+                """Submit work until the window of files in flight is full, so memory does not grow with files."""
+                while len(futures) < window:
+                    if ready:
+                        futures.add(executor.submit(*ready.popleft()))
+                        continue
+                    candidate = next(edge_candidates, None)
+                    if candidate is None or not token.wait_while_paused():
+                        return
+                    file_name, file_size = candidate
+                    cached = cache.lookup(file_name, signatures[file_name]) if cache is not None else None
+                    if cached is not None and cached.edge_hash:
+                        _match_files(_add_edge_hash(file_name, file_size, cached.edge_hash, cached.whole_file))
+                    else:
+                        futures.add(executor.submit(_get_edges_hash, file_name, file_size))
+
+            # each size group proceeds to full hashing as soon as edges of all its files are known
+            edge_candidates = iter(search.edge_hash_candidates())
+            _update_progress()
+            _fill_window()
+            yield from _confirmed_groups()
+            while futures:
+                # wake up periodically to write the checkpoint even while big files are being hashed
+                done, futures = wait(futures, timeout=self.checkpoint_interval, return_when=FIRST_COMPLETED)
+                if token.is_cancelled:
+                    return  # threads that are already running finish current files and hash no more
+                for future in done:
+                    _match_files(future.result()())
+                _fill_window()
+                yield from _confirmed_groups()
+                self.__save_checkpoint()
+        finally:
+            executor.shutdown(cancel_futures=True)  # files not started yet are skipped when the scan stops early
+
+    def __walk_directory(self, dirpath: str, records: List[FileRecord],
+                         walked: Dict[str, WalkedDirectory]) -> WalkedDirectory:
+        """
+        Collect regular files of the directory. Directory unchanged since the checkpoint is not listed again, but
+        its files are, since files edited in place do not change modification time of the directory.
+        """
+        mtime_ns = 0
+        if self.checkpoint is not None:
+            try:
+                mtime_ns = os.stat(dirpath).st_mtime_ns
+            except OSError:
+                pass
+            walked_directory = walked.get(os.path.abspath(dirpath))
+            if walked_directory is not None and walked_directory.mtime_ns == mtime_ns:
+                return WalkedDirectory(mtime_ns, self.__stat_walked_files(dirpath, walked_directory.files))
+        files = []
+        for record in records:
+            try:
+                if not record.is_file():
+                    continue
+                stat_result = record.stat  # stat result of the walk, the file is not requested again
+            except OSError as e:
+                self.__log_error(f"Error reading file {record.path}: {e}")
+                continue
+            if stat.S_ISREG(stat_result.st_mode):
+                files.append(WalkedFile(record.name, file_signature(stat_result), stat_result.st_nlink))
+        walked_directory = WalkedDirectory(mtime_ns, files)
+        if self.checkpoint is not None:
+            self.checkpoint.store_directory(self.directory, dirpath, walked_directory)
+        return walked_directory
+
+    def __stat_walked_files(self, dirpath: str, walked_files: List[WalkedFile]) -> List[WalkedFile]:
+        """Signatures of files listed in the checkpoint taken from their current stat results."""
+        files = []
+        for walked_file in walked_files:
+            try:
+                stat_result = os.stat(os.path.join(dirpath, walked_file.name), follow_symlinks=False)
+            except OSError:
+                continue  # removed since the checkpoint
+            if stat.S_ISREG(stat_result.st_mode):
+                files.append(WalkedFile(walked_file.name, file_signature(stat_result), stat_result.st_nlink))
+        return files
+
+    def __save_checkpoint(self) -> None:
+        if self.checkpoint is not None and monotonic() - self.__checkpoint_time >= self.checkpoint_interval:
+            self.checkpoint.flush()
+            self.__checkpoint_time = monotonic()
+
+    async def aiter_duplicate_groups(self, token: Optional[CancellationToken] = None
+                                     ) -> AsyncIterator[Tuple[str, List[str]]]:
+        """
+        Asynchronous version of 'iter_duplicate_groups'. The search runs in a worker thread, so the event loop
+        is not blocked while files are hashed.
+
+        :param token: token to cancel or pause the scan.
+
+        :return: asynchronous iterator of (original file, list of its duplicates).
+        """
+        loop = asyncio.get_running_loop()
+        groups: asyncio.Queue = asyncio.Queue()
+        finished = object()
+
+        def _search() -> None:
+            try:
+                for group in self.iter_duplicate_groups(token):
+                    loop.call_soon_threadsafe(groups.put_nowait, group)
+            finally:
+                loop.call_soon_threadsafe(groups.put_nowait, finished)
+
+        search = loop.run_in_executor(None, _search)
+        while (group := await groups.get()) is not finished:
+            yield group
+        await search  # raise an error of the search, if any
+
+    def __report_progress(self, snapshot: ProgressSnapshot) -> None:
+        if isinstance(self.update_progress, Callable):
+            self.update_progress(snapshot.files_done, snapshot.files_total, snapshot)
+
+    def __log_error(self, message: str) -> None:
+        if isinstance(self.log_event, Callable):
+            self.log_event(message)
+        print(message)
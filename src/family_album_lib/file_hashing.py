@@ -0,0 +1,105 @@
+import hashlib
+import os
+import queue
+from contextlib import contextmanager
+from threading import Lock
+from typing import Iterator, Optional, Tuple
+
+_BLOCK_SIZE = 1024 * 1024  # size of one read buffer
+_EDGE_SIZE = 4096  # number of bytes hashed at the beginning and at the end of the file on the edges stage
+_MEMORY_LIMIT = 256 * 1024 * 1024  # default limit for all read buffers of one search together
+
+
+class BufferPool:
+    """
+    Pool of reusable read buffers shared by all workers of one search.
+
+    Buffers are created lazily, but never more than 'memory_limit // block_size' of them, so the memory used
+    for reading stays bounded regardless of the number of workers and of the size of the files. A worker that
+    asks for a buffer while all of them are in use waits until another worker releases one.
+    """
+
+    def __init__(self, memory_limit: int = _MEMORY_LIMIT, block_size: int = _BLOCK_SIZE) -> None:
+        if block_size <= 0:
+            raise ValueError(f"Block size should be positive, got {block_size}.")
+        self.__block_size = block_size
+        self.__max_buffers = max(1, memory_limit // block_size)
+        self.__created = 0
+        self.__free: queue.LifoQueue = queue.LifoQueue()
+        self.__lock = Lock()
+
+    @property
+    def block_size(self) -> int:
+        return self.__block_size
+
+    @property
+    def max_buffers(self) -> int:
+        return self.__max_buffers
+
+    def acquire(self) -> bytearray:
+        try:
+            return self.__free.get_nowait()
+        except queue.Empty:
+            pass
+        with self.__lock:
+            if self.__created < self.__max_buffers:
+                self.__created += 1
+                return bytearray(self.__block_size)
+        return self.__free.get()  # all buffers are in use - wait for one to be released
+
+    def release(self, buffer: bytearray) -> None:
+        self.__free.put(buffer)
+
+    @contextmanager
+    def borrow(self) -> Iterator[bytearray]:
+        buffer = self.acquire()
+        try:
+            yield buffer
+        finally:
+            self.release(buffer)
+
+
+def get_file_hash(file_name: str, buffer: Optional[bytearray] = None) -> str:
+    """
+    Calculate hash of the whole file content reading it block by block into the buffer.
+
+    :param file_name: full (absolute) name of the file.
+    :param buffer: reusable buffer to read the file into, a new one of default size is created if omitted.
+    :return: hex digest of the file content.
+    """
+    if buffer is None:
+        buffer = bytearray(_BLOCK_SIZE)
+    view = memoryview(buffer)
+    hasher = hashlib.blake2b()
+    with open(file_name, 'rb', buffering=0) as file:
+        while True:
+            read_bytes = file.readinto(view)
+            if not read_bytes:
+                break
+            hasher.update(view[:read_bytes])
+    return hasher.hexdigest()
+
+
+def get_file_edges_hash(file_name: str, file_size: int, buffer: Optional[bytearray] = None,
+                        edge_size: int = _EDGE_SIZE) -> Tuple[str, bool]:
+    """
+    Calculate hash of the first and the last 'edge_size' bytes of the file.
+    Files that are not longer than two edges are hashed completely.
+
+    :param file_name: full (absolute) name of the file.
+    :param file_size: size of the file in bytes.
+    :param buffer: reusable buffer to read the file into, should not be shorter than 'edge_size'.
+    :param edge_size: number of bytes to read at the beginning and at the end of the file.
+    :return: hex digest and flag that is True if the digest covers the whole file content.
+    """
+    if file_size <= 2 * edge_size:
+        return get_file_hash(file_name, buffer), True
+    if buffer is None or len(buffer) < edge_size:
+        buffer = bytearray(edge_size)
+    view = memoryview(buffer)[:edge_size]
+    hasher = hashlib.blake2b()
+    with open(file_name, 'rb', buffering=0) as file:
+        hasher.update(view[:file.readinto(view)])
+        file.seek(-edge_size, os.SEEK_END)
+        hasher.update(view[:file.readinto(view)])
+    return hasher.hexdigest(), False
@@ -0,0 +1,204 @@
+import os
+import platform
+import stat
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from queue import Queue
+from typing import Callable, Iterator, List, Optional, Tuple
+
+# scandir of Windows does not fill device, inode and number of links, complete stat is requested there
+_FULL_STAT = platform.system() == 'Windows'
+_WORKERS = 8  # directories listed at the same time by the parallel walk
+
+
+class FileRecord:
+    """
+    File found by the walk. The directory entry is kept, so type checks need no system call and the stat
+    result is requested once and shared by everything that processes the file.
+    """
+    __slots__ = ('path', 'name', '__entry', '__stat')
+
+    def __init__(self, path: str, entry: Optional[os.DirEntry] = None) -> None:
+        self.path: str = path
+        self.name: str = entry.name if entry is not None else os.path.basename(path)
+        self.__entry = entry
+        self.__stat: Optional[os.stat_result] = None
+
+    def __repr__(self) -> str:
+        return f"FileRecord('{self.path}')"
+
+    @property
+    def stat(self) -> os.stat_result:
+        """Stat result of the file (symlinks are followed), it is requested at the first access only."""
+        if self.__stat is None:
+            self.__stat = os.stat(self.path) if _FULL_STAT or self.__entry is None else self.__entry.stat()
+        return self.__stat
+
+    @property
+    def size(self) -> int:
+        return self.stat.st_size
+
+    @property
+    def mtime_ns(self) -> int:
+        return self.stat.st_mtime_ns
+
+    def is_file(self) -> bool:
+        """True for regular file or symlink to it, the type is known from the walk in most cases."""
+        if self.__entry is None:
+            return stat.S_ISREG(self.stat.st_mode)
+        return self.__entry.is_file()
+
+
+@dataclass
+class _Listing:
+    dirpath: str
+    dirnames: List[str] = field(default_factory=list)
+    walked_dirnames: List[str] = field(default_factory=list)
+    records: List[FileRecord] = field(default_factory=list)
+    children: List[Future] = field(default_factory=list)  # listings of walked sub-directories
+    error: Optional[OSError] = None
+
+
+def _list_directory(dirpath: str) -> Tuple[List[str], List[str], List[FileRecord]]:
+    """
+    List the directory with os.scandir.
+
+    :return: names of sub-directories, names of the sub-directories that should be walked (symlinks to directories
+             are listed as os.walk does, but not walked) and records of other entries.
+    """
+    dirnames: List[str] = []
+    walked_dirnames: List[str] = []
+    records: List[FileRecord] = []
+    with os.scandir(dirpath) as entries:
+        for entry in entries:
+            try:
+                is_directory = entry.is_dir()
+            except OSError:
+                is_directory = False
+            if not is_directory:
+                records.append(FileRecord(entry.path, entry))
+                continue
+            dirnames.append(entry.name)
+            if not entry.is_symlink():
+                walked_dirnames.append(entry.name)
+    return dirnames, walked_dirnames, records
+
+
+def walk_directory(directory: str, on_error: Optional[Callable[[OSError], None]] = None, workers: int = 1,
+                   ordered: bool = True) -> Iterator[Tuple[str, List[str], List[FileRecord]]]:
+    """
+    Walk the directory tree top-down with os.scandir, in the same order as os.walk.
+
+    :param directory: directory to walk.
+    :param on_error: called with the error of a directory that could not be listed, as 'onerror' of os.walk.
+    :param workers: number of directories listed at the same time, several workers hide latency of network
+                    file systems, see 'walk_directory_parallel'.
+    :param ordered: keep the order of os.walk when several workers are used.
+    :return: iterator of (directory path, names of sub-directories, records of other entries). Sub-directories
+             removed from the list by the caller are not walked.
+    """
+    if workers > 1:
+        yield from walk_directory_parallel(directory, on_error, workers, ordered)
+        return
+    stack = [directory]
+    while stack:
+        dirpath = stack.pop()
+        try:
+            dirnames, walked_dirnames, records = _list_directory(dirpath)
+        except OSError as e:
+            if on_error is not None:
+                on_error(e)
+            continue
+        yield dirpath, dirnames, records
+        walked = set(walked_dirnames)
+        stack.extend(os.path.join(dirpath, dirname) for dirname in reversed(dirnames) if dirname in walked)
+
+
+def walk_directory_parallel(directory: str, on_error: Optional[Callable[[OSError], None]] = None,
+                            workers: int = _WORKERS, ordered: bool = True
+                            ) -> Iterator[Tuple[str, List[str], List[FileRecord]]]:
+    """
+    Walk the directory tree listing up to 'workers' directories at the same time.
+
+    Every worker lists a directory and queues its sub-directories at once, so idle workers take them while
+    the caller processes results. Results are reported in the order of os.walk when 'ordered' is set,
+    otherwise as soon as directories are listed.
+
+    :param directory: directory to walk.
+    :param on_error: called with the error of a directory that could not be listed, as 'onerror' of os.walk.
+    :param workers: number of directories listed at the same time.
+    :param ordered: report directories in the order of os.walk.
+    :return: iterator of (directory path, names of sub-directories, records of other entries). Sub-directories
+             removed from the list by the caller are not reported, they may be listed already.
+    """
+    executor = ThreadPoolExecutor(max_workers=max(1, workers))
+    finished: Queue = Queue()  # listings in the order of completion, for unordered walk
+
+    def _submit(dirpath: str) -> Future:
+        future = executor.submit(_list, dirpath)
+        if not ordered:
+            future.add_done_callback(finished.put)
+        return future
+
+    def _list(dirpath: str) -> _Listing:
+        try:
+            dirnames, walked_dirnames, records = _list_directory(dirpath)
+        except OSError as e:
+            return _Listing(dirpath, error=e)
+        try:
+            children = [_submit(os.path.join(dirpath, dirname)) for dirname in walked_dirnames]
+        except RuntimeError:  # the walk was stopped by the caller
+            children = []
+        return _Listing(dirpath, dirnames, walked_dirnames, records, children)
+
+    try:
+        pending = [_submit(directory)]  # stack of pre-order for ordered walk
+        expected = set(pending)  # listings still to be reported
+        arrived = set()  # listings finished before their parent was reported, or pruned by the caller
+        while expected:
+            if ordered or pending:
+                future = pending.pop()
+            else:
+                future = finished.get()
+                if future not in expected:
+                    arrived.add(future)
+                    continue
+            expected.remove(future)
+            listing: _Listing = future.result()
+            if listing.error is not None:
+                if on_error is not None:
+                    on_error(listing.error)
+                continue
+            yield listing.dirpath, listing.dirnames, listing.records
+            kept = set(listing.dirnames)
+            children = []
+            for dirname, child in zip(listing.walked_dirnames, listing.children):
+                if dirname in kept:
+                    children.append(child)
+                else:
+                    child.cancel()  # pruned by the caller
+            expected.update(children)
+            if ordered:
+                pending.extend(reversed(children))
+            else:
+                pending.extend(child for child in children if child in arrived)
+                arrived.difference_update(children)
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def walk_files(directory: str, on_error: Optional[Callable[[OSError], None]] = None, workers: int = 1,
+               ordered: bool = True) -> Iterator[FileRecord]:
+    """Records of all files in the directory tree, see 'walk_directory'."""
+    for _, _, records in walk_directory(directory, on_error, workers, ordered):
+        yield from records
+
+
+def count_files_and_subdirectories(directory: str, workers: int = 1) -> Tuple[int, int]:
+    """Count files and sub-directories of the directory tree in one walk."""
+    files_count = 0
+    subdirectories_count = 0
+    for _, dirnames, records in walk_directory(directory, workers=workers, ordered=False):
+        files_count += len(records)
+        subdirectories_count += len(dirnames)
+    return files_count, subdirectories_count
@@ -0,0 +1,128 @@
+import os
+import sqlite3
+from dataclasses import dataclass
+from threading import RLock
+from typing import Dict, Iterable, Optional, Tuple
+
+FileSignature = Tuple[int, int, int, int]  # (device, inode, size, mtime_ns)
+
+
+def file_signature(stat_result: os.stat_result) -> FileSignature:
+    """Signature of the file state, cached digests are valid while the signature does not change."""
+    return stat_result.st_dev, stat_result.st_ino, stat_result.st_size, stat_result.st_mtime_ns
+
+
+@dataclass
+class CachedHashes:
+    signature: FileSignature
+    edge_hash: str = ""
+    whole_file: bool = False
+    full_hash: str = ""
+
+
+class HashCache:
+    """
+    Persistent cache of file digests stored in SQLite database.
+
+    Entries of the analysed directory are loaded into memory once, looked up by path and are valid only while
+    the stat signature of the file is unchanged. New digests are kept in memory and written to the database by
+    'flush', entries of files that disappeared are removed by 'evict_missing'.
+    """
+
+    _TABLE = "file_hashes"
+
+    def __init__(self, database_file: str) -> None:
+        self.__database_file = database_file
+        self.__connection = sqlite3.connect(database_file, check_same_thread=False)
+        self.__connection.execute(f"CREATE TABLE IF NOT EXISTS {self._TABLE} (path TEXT PRIMARY KEY, "
+                                  "device INTEGER, inode INTEGER, size INTEGER, mtime_ns INTEGER, "
+                                  "edge_hash TEXT, whole_file INTEGER, full_hash TEXT)")
+        self.__connection.commit()
+        self.__entries: Dict[str, CachedHashes] = {}
+        self.__changed: Dict[str, CachedHashes] = {}
+        self.__lock = RLock()  # guards the connection too, scans of several directories may share the cache
+
+    @property
+    def database_file(self) -> str:
+        return self.__database_file
+
+    @property
+    def _connection(self) -> sqlite3.Connection:
+        return self.__connection
+
+    @property
+    def _lock(self) -> RLock:
+        return self.__lock
+
+    def load(self, directory: str) -> None:
+        """
+        Load cached entries of all files located in the directory and its subdirectories. Entries of other
+        directories loaded before are kept, so scans of several directories may share the cache.
+        """
+        prefix = os.path.join(os.path.abspath(directory), "")
+        with self.__lock:
+            for path in [path for path in self.__entries if path.startswith(prefix)]:
+                del self.__entries[path]
+            rows = self.__connection.execute(
+                f"SELECT path, device, inode, size, mtime_ns, edge_hash, whole_file, full_hash FROM {self._TABLE} "
+                "WHERE substr(path, 1, ?) = ?", (len(prefix), prefix))
+            for path, device, inode, size, mtime_ns, edge_hash, whole_file, full_hash in rows:
+                self.__entries[path] = CachedHashes((device, inode, size, mtime_ns), edge_hash or "",
+                                                    bool(whole_file), full_hash or "")
+
+    def lookup(self, file_name: str, signature: FileSignature) -> Optional[CachedHashes]:
+        entry = self.__entries.get(os.path.abspath(file_name))
+        if entry is None or entry.signature != signature:
+            return None
+        return entry
+
+    def store_edge_hash(self, file_name: str, signature: FileSignature, edge_hash: str, whole_file: bool) -> None:
+        entry = self.__entry_to_update(file_name, signature)
+        entry.edge_hash = edge_hash
+        entry.whole_file = whole_file
+        if whole_file:
+            entry.full_hash = edge_hash
+
+    def store_full_hash(self, file_name: str, signature: FileSignature, full_hash: str) -> None:
+        self.__entry_to_update(file_name, signature).full_hash = full_hash
+
+    def evict_missing(self, directory: str, existing_files: Iterable[str]) -> int:
+        """
+        Remove entries of files located in the directory that are not among existing files.
+
+        :return: number of removed entries.
+        """
+        existing = {os.path.abspath(file_name) for file_name in existing_files}
+        prefix = os.path.join(os.path.abspath(directory), "")
+        with self.__lock:
+            missing = [path for path in self.__entries if path.startswith(prefix) and path not in existing]
+            for path in missing:
+                self.__entries.pop(path)
+                self.__changed.pop(path, None)
+            self.__connection.executemany(f"DELETE FROM {self._TABLE} WHERE path = ?", [(p,) for p in missing])
+            self.__connection.commit()
+        return len(missing)
+
+    def flush(self) -> None:
+        """Write all new digests to the database."""
+        with self.__lock:
+            rows = [(path, *entry.signature, entry.edge_hash, int(entry.whole_file), entry.full_hash)
+                    for path, entry in self.__changed.items()]
+            self.__connection.executemany(f"INSERT OR REPLACE INTO {self._TABLE} VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                                          rows)
+            self.__connection.commit()
+            self.__changed = {}
+
+    def close(self) -> None:
+        self.flush()
+        self.__connection.close()
+
+    def __entry_to_update(self, file_name: str, signature: FileSignature) -> CachedHashes:
+        path = os.path.abspath(file_name)
+        with self.__lock:
+            entry = self.__entries.get(path)
+            if entry is None or entry.signature != signature:
+                entry = CachedHashes(signature)
+                self.__entries[path] = entry
+            self.__changed[path] = entry
+            return entry
@@ -0,0 +1,273 @@
+import os
+from array import array
+from collections.abc import Mapping
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+_DIGEST_SIZE = 64  # bytes of blake2b digest
+_WORDS = _DIGEST_SIZE // 8
+
+# kinds of keys of files
+_UNRESOLVED = 0
+_DIGEST = 1  # full hash, key is the hex digest
+_SIZE = 2  # unique size, key is 'size:<size>'
+_EDGES = 3  # unique edges, key is 'edges:<size>:<hex digest>'
+_BLOCKS = 4  # byte-identical files found by block comparison, key is 'blocks:<size>:<id of the first file>'
+
+
+class HashIndex:
+    """
+    Compact index of files and their keys for scans of millions of files.
+
+    Paths are interned as id of the directory and basename, sizes, kinds of keys and raw binary digests are
+    kept in flat arrays indexed by file id (the discovery order of the file). Files are grouped by their keys
+    with a sort of the arrays when the groups are requested, 'files_hashes' and 'duplicate_files' are
+    read-only mappings over the groups, so no dictionary of all files is kept.
+    """
+
+    def __init__(self) -> None:
+        self.__directories: List[str] = []
+        self.__directory_ids: Dict[str, int] = {}
+        self.__file_directories = array('I')
+        self.__basenames: List[str] = []
+        self.__sizes = array('Q')
+        self.__kinds = bytearray()
+        self.__digests = bytearray()
+        self.__groups: Optional[Tuple[np.ndarray, np.ndarray]] = None  # sorted file ids and group bounds
+        self.__keys: Optional[Dict[str, int]] = None
+        self.__duplicates: Optional[Dict[str, int]] = None
+        self.__file_ids: Optional[Dict[str, int]] = None  # ids of paths, built by the first 'find'
+
+    def __len__(self) -> int:
+        return len(self.__basenames)
+
+    @property
+    def files_hashes(self) -> Mapping:
+        """Read-only mapping of the key and list of files with the key, as 'StagedDuplicateSearch.files_hashes'."""
+        return FilesHashesView(self)
+
+    @property
+    def duplicate_files(self) -> Mapping:
+        """Read-only mapping of the first file of every group with several files and list of the others."""
+        return DuplicateFilesView(self)
+
+    def add_file(self, file_name: str, file_size: int) -> int:
+        """
+        Add unresolved file to the index.
+
+        :return: id of the file.
+        """
+        directory, basename = os.path.split(file_name)
+        directory_id = self.__directory_ids.get(directory)
+        if directory_id is None:
+            directory_id = len(self.__directories)
+            self.__directory_ids[directory] = directory_id
+            self.__directories.append(directory)
+        self.__file_directories.append(directory_id)
+        self.__basenames.append(basename)
+        self.__sizes.append(file_size)
+        self.__kinds.append(_UNRESOLVED)
+        self.__digests.extend(bytes(_DIGEST_SIZE))
+        file_id = len(self.__basenames) - 1
+        if self.__file_ids is not None:
+            self.__file_ids[file_name] = file_id
+        return file_id
+
+    def path(self, file_id: int) -> str:
+        return os.path.join(self.__directories[self.__file_directories[file_id]], self.__basenames[file_id])
+
+    def size(self, file_id: int) -> int:
+        return self.__sizes[file_id]
+
+    def resolve(self, file_id: int, key: str) -> None:
+        """Set key of the file: hex digest, 'size:<size>', 'edges:<size>:<hex digest>' or 'blocks:<size>:<id>'."""
+        if key.startswith("size:"):
+            kind, digest = _SIZE, bytes(_DIGEST_SIZE)
+        elif key.startswith("blocks:"):
+            kind, digest = _BLOCKS, int(key.split(":", 2)[2]).to_bytes(_DIGEST_SIZE, 'little')
+        elif key.startswith("edges:"):
+            kind, digest = _EDGES, self.__digest(key.split(":", 2)[2])
+        else:
+            kind, digest = _DIGEST, self.__digest(key)
+        self.__kinds[file_id] = kind
+        self.__digests[file_id * _DIGEST_SIZE:(file_id + 1) * _DIGEST_SIZE] = digest
+        self.__groups = None
+
+    def resolve_unique_sizes(self, file_ids: np.ndarray) -> None:
+        """Set 'size:<size>' keys of many files at once."""
+        kinds = np.frombuffer(self.__kinds, dtype=np.uint8)
+        kinds[file_ids] = _SIZE
+        del kinds  # release the buffer, so the array can grow again
+        self.__groups = None
+
+    def remove(self, file_id: int) -> None:
+        """Exclude the file from groups, e.g. when it was deleted. Its id is not reused."""
+        self.__kinds[file_id] = _UNRESOLVED
+        if self.__file_ids is not None:
+            self.__file_ids.pop(self.path(file_id), None)
+        self.__groups = None
+
+    def find(self, file_name: str) -> Optional[int]:
+        """Id of the file that is resolved and not removed, the lookup is built on the first call."""
+        if self.__file_ids is None:
+            self.__file_ids = {self.path(file_id): file_id for file_id in range(len(self))
+                               if self.__kinds[file_id] != _UNRESOLVED}
+        file_id = self.__file_ids.get(file_name)
+        return file_id if file_id is not None and self.__kinds[file_id] != _UNRESOLVED else None
+
+    def resolved_of_size(self, file_size: int) -> List[int]:
+        """Ids of resolved files with the size."""
+        kinds = np.frombuffer(self.__kinds, dtype=np.uint8)
+        sizes = np.frombuffer(self.__sizes, dtype=np.uint64)
+        file_ids = np.flatnonzero((sizes == file_size) & (kinds != _UNRESOLVED)).tolist()
+        del kinds, sizes  # release buffers, so the arrays can grow again
+        return file_ids
+
+    def key(self, file_id: int) -> Optional[str]:
+        kind = self.__kinds[file_id]
+        digest = self.__digests[file_id * _DIGEST_SIZE:(file_id + 1) * _DIGEST_SIZE].hex()
+        if kind == _DIGEST:
+            return digest
+        if kind == _SIZE:
+            return f"size:{self.__sizes[file_id]}"
+        if kind == _EDGES:
+            return f"edges:{self.__sizes[file_id]}:{digest}"
+        if kind == _BLOCKS:
+            group_id = int.from_bytes(self.__digests[file_id * _DIGEST_SIZE:(file_id + 1) * _DIGEST_SIZE], 'little')
+            return f"blocks:{self.__sizes[file_id]}:{group_id}"
+        return None
+
+    def group_by_size(self) -> Tuple[np.ndarray, List[np.ndarray]]:
+        """
+        Group all files by size.
+
+        :return: ids of files with unique size and groups of ids of files that share a size, groups are ordered
+                 by their first file and files by id.
+        """
+        file_ids = np.arange(len(self), dtype=np.int64)
+        sorted_ids, bounds = self.__group_by(file_ids, [np.frombuffer(self.__sizes, dtype=np.uint64)])
+        starts, ends = bounds[:-1], bounds[1:]
+        shared = ends - starts > 1
+        return (sorted_ids[starts[~shared]],
+                [sorted_ids[start:end] for start, end in zip(starts[shared], ends[shared])])
+
+    def group(self, key: str) -> List[str]:
+        if self.__keys is None or self.__groups is None:
+            sorted_ids, bounds = self.__sorted_groups()
+            self.__keys = {self.key(int(sorted_ids[start])): i for i, start in enumerate(bounds[:-1])}
+        sorted_ids, bounds = self.__sorted_groups()
+        i = self.__keys[key]
+        return [self.path(int(file_id)) for file_id in sorted_ids[bounds[i]:bounds[i + 1]]]
+
+    def duplicates_of(self, file_name: str) -> List[str]:
+        if self.__duplicates is None or self.__groups is None:
+            sorted_ids, bounds = self.__sorted_groups()
+            self.__duplicates = {self.path(int(sorted_ids[start])): i for i, start in enumerate(bounds[:-1])
+                                 if bounds[i + 1] - start > 1}
+        sorted_ids, bounds = self.__sorted_groups()
+        i = self.__duplicates[file_name]
+        return [self.path(int(file_id)) for file_id in sorted_ids[bounds[i] + 1:bounds[i + 1]]]
+
+    def iter_groups(self, min_files: int = 1) -> Iterator[Tuple[str, List[str]]]:
+        """Iterate over (key, files) of groups with at least min_files files."""
+        sorted_ids, bounds = self.__sorted_groups()
+        for start, end in zip(bounds[:-1], bounds[1:]):
+            if end - start >= min_files:
+                files = [self.path(int(file_id)) for file_id in sorted_ids[start:end]]
+                yield self.key(int(sorted_ids[start])), files
+
+    def groups_count(self, min_files: int = 1) -> int:
+        _, bounds = self.__sorted_groups()
+        return int(np.count_nonzero(np.diff(bounds) >= min_files))
+
+    @staticmethod
+    def __digest(hex_digest: str) -> bytes:
+        digest = bytes.fromhex(hex_digest)
+        if len(digest) != _DIGEST_SIZE:
+            raise ValueError(f"Digest of {_DIGEST_SIZE} bytes is expected, got '{hex_digest}'.")
+        return digest
+
+    def __sorted_groups(self) -> Tuple[np.ndarray, np.ndarray]:
+        if self.__groups is None:
+            kinds = np.frombuffer(self.__kinds, dtype=np.uint8)
+            file_ids = np.flatnonzero(kinds != _UNRESOLVED)
+            words = np.frombuffer(self.__digests, dtype=np.uint64).reshape(-1, _WORDS)
+            sizes = np.frombuffer(self.__sizes, dtype=np.uint64)
+            self.__groups = self.__group_by(file_ids, [kinds, sizes], words)
+            self.__keys = None
+            self.__duplicates = None
+            del kinds, sizes, words  # release buffers, so the arrays can grow again
+        return self.__groups
+
+    @staticmethod
+    def __group_by(file_ids: np.ndarray, columns: List[np.ndarray],
+                   words: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Sort-based group-by: files are sorted by the key columns and groups are runs of equal keys.
+
+        :return: file ids sorted by group and by id within the group, bounds of the groups (with the end).
+        """
+        keys = [column[file_ids] for column in columns]
+        if words is not None:
+            selected_words = words[file_ids]
+            keys.extend(selected_words[:, i] for i in range(selected_words.shape[1]))
+        if len(file_ids) == 0:
+            return file_ids, np.zeros(1, dtype=np.int64)
+        order = np.lexsort([file_ids] + keys[::-1])  # the last key is the primary one
+        sorted_ids = file_ids[order]
+        changed = np.zeros(len(file_ids), dtype=bool)
+        changed[0] = True
+        for key in keys:
+            sorted_key = key[order]
+            changed[1:] |= sorted_key[1:] != sorted_key[:-1]
+        # order groups by their first file, so results follow the discovery order
+        first_ids = sorted_ids[changed][np.cumsum(changed) - 1]
+        sorted_ids = sorted_ids[np.lexsort((sorted_ids, first_ids))]
+        first_ids.sort()
+        starts = np.flatnonzero(np.diff(first_ids, prepend=-1))
+        return sorted_ids, np.append(starts, len(sorted_ids))
+
+
+class FilesHashesView(Mapping):
+    """Read-only mapping of key and files of 'HashIndex', groups are produced on demand."""
+
+    def __init__(self, index: HashIndex) -> None:
+        self.__index = index
+
+    def __getitem__(self, key: str) -> List[str]:
+        return self.__index.group(key)
+
+    def __iter__(self) -> Iterator[str]:
+        return (key for key, _ in self.__index.iter_groups())
+
+    def __len__(self) -> int:
+        return self.__index.groups_count()
+
+    def items(self):
+        return self.__index.iter_groups()
+
+    def values(self):
+        return (files for _, files in self.__index.iter_groups())
+
+
+class DuplicateFilesView(Mapping):
+    """Read-only mapping of original file and its duplicates of 'HashIndex', groups are produced on demand."""
+
+    def __init__(self, index: HashIndex) -> None:
+        self.__index = index
+
+    def __getitem__(self, file_name: str) -> List[str]:
+        return self.__index.duplicates_of(file_name)
+
+    def __iter__(self) -> Iterator[str]:
+        return (files[0] for _, files in self.__index.iter_groups(2))
+
+    def __len__(self) -> int:
+        return self.__index.groups_count(2)
+
+    def items(self):
+        return ((files[0], files[1:]) for _, files in self.__index.iter_groups(2))
+
+    def values(self):
+        return (files[1:] for _, files in self.__index.iter_groups(2))
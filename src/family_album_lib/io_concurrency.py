@@ -0,0 +1,152 @@
+from concurrent.futures import Executor, Future, FIRST_COMPLETED, wait
+from contextlib import contextmanager
+from dataclasses import dataclass
+from threading import Condition
+from time import monotonic
+from typing import Callable, Iterable, Iterator, Tuple, TypeVar
+
+_MIN_LEVEL = 1
+_MAX_LEVEL = 64
+_INITIAL_LEVEL = 4
+_INTERVAL = 1.0  # seconds of one measurement window
+_TOLERANCE = 0.05  # relative change of throughput that is considered as noise
+
+_Item = TypeVar('_Item')
+
+
+@dataclass
+class ConcurrencyStats:
+    level: int  # number of files read at the same time
+    bytes_per_second: float = 0
+    files_per_second: float = 0
+    latency: float = 0  # average seconds of reading one file
+
+
+@dataclass
+class Reading:
+    bytes_read: int  # reader may correct the expected number of bytes when it knows the actual one
+
+
+class ConcurrencyController:
+    """
+    Adaptive limit of files read at the same time.
+
+    Readers take a slot for every file. Throughput and latency are measured in windows of 'interval' seconds
+    and after every window the limit climbs in the direction that improved throughput: it goes on while
+    throughput grows, turns back when throughput drops and goes down when more readers give nothing, so
+    a spinning disk settles on few readers while SSD or network storage gets many.
+    """
+
+    def __init__(self, min_level: int = _MIN_LEVEL, max_level: int = _MAX_LEVEL, initial_level: int = 0,
+                 interval: float = _INTERVAL, clock: Callable[[], float] = monotonic) -> None:
+        if min_level < 1 or max_level < min_level:
+            raise ValueError(f"Invalid bounds of concurrency {min_level}..{max_level}.")
+        self.__min_level = min_level
+        self.__max_level = max_level
+        self.__level = self.__clamp(initial_level if initial_level > 0 else _INITIAL_LEVEL)
+        self.__interval = interval
+        self.__clock = clock
+        self.__condition = Condition()
+        self.__active = 0
+        self.__direction = 1
+        self.__previous_throughput = 0.0
+        self.__window_start = clock()
+        self.__window_bytes = 0
+        self.__window_files = 0
+        self.__window_latency = 0.0
+        self.__stats = ConcurrencyStats(self.__level)
+
+    @property
+    def level(self) -> int:
+        return self.__level
+
+    @property
+    def max_level(self) -> int:
+        return self.__max_level
+
+    @property
+    def stats(self) -> ConcurrencyStats:
+        """Level and measurements of the last finished window."""
+        return self.__stats
+
+    @contextmanager
+    def slot(self, bytes_to_read: int) -> Iterator[Reading]:
+        """
+        Wait until a reader may start and measure the reading done inside the context.
+
+        :param bytes_to_read: number of bytes the reader is going to read.
+        :return: reading record, its 'bytes_read' is accounted when the context exits.
+        """
+        with self.__condition:
+            while self.__active >= self.__level:
+                self.__condition.wait()
+            self.__active += 1
+        reading = Reading(bytes_to_read)
+        start = self.__clock()
+        try:
+            yield reading
+        finally:
+            seconds = self.__clock() - start
+            with self.__condition:
+                self.__active -= 1
+                self.__record(reading.bytes_read, seconds)
+                self.__condition.notify_all()
+
+    def record(self, bytes_read: int, seconds: float) -> None:
+        """Account file read outside of 'slot'."""
+        with self.__condition:
+            self.__record(bytes_read, seconds)
+            self.__condition.notify_all()
+
+    def __record(self, bytes_read: int, seconds: float) -> None:
+        self.__window_bytes += bytes_read
+        self.__window_files += 1
+        self.__window_latency += seconds
+        elapsed = self.__clock() - self.__window_start
+        if elapsed < self.__interval or elapsed <= 0:
+            return
+        files_per_second = self.__window_files / elapsed
+        bytes_per_second = self.__window_bytes / elapsed
+        self.__stats = ConcurrencyStats(self.__level, bytes_per_second, files_per_second,
+                                        self.__window_latency / self.__window_files)
+        throughput = bytes_per_second if self.__window_bytes > 0 else files_per_second
+        if throughput < self.__previous_throughput * (1 - _TOLERANCE):
+            self.__direction = -self.__direction  # the last step made it worse
+        elif throughput <= self.__previous_throughput * (1 + _TOLERANCE):
+            self.__direction = -1  # more readers give nothing, save resources
+        self.__previous_throughput = throughput
+        self.__level = self.__clamp(self.__level + self.__direction * max(1, self.__level // 4))
+        self.__window_start = self.__clock()
+        self.__window_bytes = 0
+        self.__window_files = 0
+        self.__window_latency = 0.0
+
+    def __clamp(self, level: int) -> int:
+        return min(self.__max_level, max(self.__min_level, level))
+
+
+def iter_completed(executor: Executor, function: Callable[[_Item], object], items: Iterable[_Item],
+                   window: int) -> Iterator[Tuple[_Item, Future]]:
+    """
+    Submit the function for every item keeping at most 'window' futures in flight, so memory of futures does not
+    grow with the number of items; the next item is submitted when a future completes. Futures not started yet
+    are cancelled when the iterator is closed early.
+
+    :return: iterator of (item, its completed future) in the order of completion.
+    """
+    items = iter(items)
+    in_flight = {}
+    try:
+        while True:
+            for item in items:
+                in_flight[executor.submit(function, item)] = item
+                if len(in_flight) >= max(1, window):
+                    break
+            if not in_flight:
+                return
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield in_flight.pop(future), future
+    finally:
+        for future in in_flight:
+            future.cancel()
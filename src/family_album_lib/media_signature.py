@@ -0,0 +1,87 @@
+import os
+from dataclasses import dataclass
+from typing import Optional
+
+_HEADER_SIZE = 1024  # covers signatures of all formats and GIF header with the largest global color table
+_TS_PACKET_SIZE = 188  # MPEG transport stream packet, MTS (BDAV) packet has 4 bytes of timestamp before it
+_TS_SYNC_BYTE = 0x47
+
+# ISO base media (MP4, MOV, 3GP, HEIF, CR3) files start with 'ftyp' box, its major brand names the format
+_HEIF_BRANDS = {b'heic', b'heix', b'heim', b'heis', b'hevc', b'hevx', b'mif1', b'msf1', b'avif', b'avis'}
+_ISO_IMAGE_BRANDS = {b'crx ': "cr3"}
+_ISO_VIDEO_FORMATS = {b'qt  ': "mov", b'3g2': "3g2", b'3gp': "3gp", b'M4V': "m4v"}
+# QuickTime files written without 'ftyp' box start with one of these atoms
+_QUICKTIME_ATOMS = {b'moov', b'mdat', b'wide', b'free', b'skip', b'pnot'}
+# RAW formats based on TIFF are told apart by bytes after TIFF header
+_TIFF_RAW = {b'CR': "cr2"}
+
+_IMAGE_SIGNATURES = [(b'\xff\xd8\xff', "jpeg"), (b'\x89PNG\r\n\x1a\n', "png"), (b'BM', "bmp"),
+                     (b'IIRO', "orf"), (b'IIRS', "orf"), (b'IIU\x00', "rw2"), (b'FUJIFILMCCD-RAW', "raf"),
+                     (b'II*\x00', "tiff"), (b'MM\x00*', "tiff")]
+_VIDEO_SIGNATURES = [(b'\x1a\x45\xdf\xa3', "mkv"), (b'FLV\x01', "flv"), (b'\x00\x00\x01\xba', "mpeg"),
+                     (b'\x00\x00\x01\xb3', "mpeg"), (b'\x30\x26\xb2\x75\x8e\x66\xcf\x11', "wmv")]
+
+
+@dataclass(frozen=True)
+class MediaType:
+    """Format of the media file found by its signature, animated GIF is both image and video."""
+    format: str
+    is_image: bool
+    is_video: bool
+
+
+def detect_media_type(file_name: str, header: Optional[bytes] = None) -> Optional[MediaType]:
+    """
+    Identify image or video file by the signature (magic number or container header) in its first bytes, the
+    file is not decoded.
+
+    :param file_name: full (absolute) name of the file.
+    :param header: first bytes of the file if they were already read.
+    :return: type of the media or None if the file is not a known image or video (or can not be read).
+    """
+    if header is None:
+        try:
+            with open(file_name, 'rb') as f:
+                header = f.read(_HEADER_SIZE)
+        except OSError:
+            return None
+    return _detect_media_type(header, os.path.splitext(file_name)[1].lower())
+
+
+def _detect_media_type(header: bytes, extension: str = "") -> Optional[MediaType]:
+    for signature, media_format in _IMAGE_SIGNATURES:
+        if header.startswith(signature):
+            if media_format == "tiff":
+                media_format = _TIFF_RAW.get(header[8:10], extension.lstrip('.') or media_format)
+            return MediaType(media_format, True, False)
+    if header.startswith((b'GIF87a', b'GIF89a')):
+        return MediaType("gif", True, b'NETSCAPE2.0' in header)  # looping extension is written by animated GIF
+    if header.startswith(b'RIFF') and header[8:12] in (b'WEBP', b'AVI '):
+        return MediaType("webp", True, False) if header[8:12] == b'WEBP' else MediaType("avi", False, True)
+    if header[4:8] == b'ftyp':
+        return _iso_media_type(header[8:12])
+    if header[4:8] in _QUICKTIME_ATOMS:
+        return MediaType("mov", False, True)
+    for signature, media_format in _VIDEO_SIGNATURES:
+        if header.startswith(signature):
+            return MediaType(media_format, False, True)
+    if _is_transport_stream(header, 0):
+        return MediaType("ts", False, True)
+    if _is_transport_stream(header, 4):
+        return MediaType("mts", False, True)
+    return None
+
+
+def _iso_media_type(brand: bytes) -> MediaType:
+    if brand in _HEIF_BRANDS:
+        return MediaType("heic", True, False)
+    if brand in _ISO_IMAGE_BRANDS:
+        return MediaType(_ISO_IMAGE_BRANDS[brand], True, False)
+    return MediaType(_ISO_VIDEO_FORMATS.get(brand, _ISO_VIDEO_FORMATS.get(brand[:3], "mp4")), False, True)
+
+
+def _is_transport_stream(header: bytes, offset: int) -> bool:
+    """Check sync bytes of the first packets, packets of MTS are 4 bytes longer than packets of TS."""
+    packet_size = _TS_PACKET_SIZE + offset
+    positions = range(offset, min(len(header), 4 * packet_size), packet_size)
+    return len(positions) >= 2 and all(header[position] == _TS_SYNC_BYTE for position in positions)
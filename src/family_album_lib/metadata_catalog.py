@@ -0,0 +1,116 @@
+import os
+import sqlite3
+from threading import RLock
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from src.family_album_lib.hash_cache import FileSignature
+
+_SQL_TYPES = {"int64": "INTEGER", "bool": "INTEGER", "float64": "REAL"}  # other column types are stored as text
+
+
+def _database_value(value: Any) -> Any:
+    if value is None or value != value:  # None, NaN and NaT are stored as NULL
+        return None
+    if hasattr(value, 'isoformat'):
+        return value.isoformat(sep=' ')
+    if hasattr(value, 'item'):  # numpy scalar
+        return value.item()
+    return value
+
+
+class MetadataCatalog:
+    """
+    Persistent catalog of metadata rows of analysed files stored in SQLite database.
+
+    Rows have the columns passed as a template (column name and its type) and are keyed by path, so an analysis
+    extracts metadata of new and changed files only. As in 'HashCache', rows of the analysed directory are loaded
+    into memory once, are valid only while the stat signature of the file is unchanged, new rows are written by
+    'flush' and rows of files that disappeared are removed by 'evict_missing'.
+    """
+
+    _TABLE = "media_metadata"
+
+    def __init__(self, database_file: str, columns: Dict[str, str]) -> None:
+        self.__database_file = database_file
+        self.__columns = list(columns)
+        self.__connection = sqlite3.connect(database_file, check_same_thread=False)
+        definition = ", ".join(f"{name} {_SQL_TYPES.get(column_type, 'TEXT')}" for name, column_type in columns.items())
+        existing = [row[1] for row in self.__connection.execute(f"PRAGMA table_info({self._TABLE})")]
+        if existing and existing[5:] != self.__columns:  # the catalog of other columns is outdated
+            self.__connection.execute(f"DROP TABLE {self._TABLE}")
+        self.__connection.execute(f"CREATE TABLE IF NOT EXISTS {self._TABLE} (path TEXT PRIMARY KEY, "
+                                  f"device INTEGER, inode INTEGER, size INTEGER, mtime_ns INTEGER, {definition})")
+        self.__connection.commit()
+        self.__entries: Dict[str, Tuple[FileSignature, dict]] = {}
+        self.__changed: Dict[str, Tuple[FileSignature, dict]] = {}
+        self.__lock = RLock()  # guards the connection too, analyses of several directories may share the catalog
+
+    @property
+    def database_file(self) -> str:
+        return self.__database_file
+
+    @property
+    def columns(self) -> list:
+        return list(self.__columns)
+
+    def load(self, directory: str) -> None:
+        """
+        Load rows of all files located in the directory and its subdirectories. Rows of other directories loaded
+        before are kept.
+        """
+        prefix = os.path.join(os.path.abspath(directory), "")
+        with self.__lock:
+            for path in [path for path in self.__entries if path.startswith(prefix)]:
+                del self.__entries[path]
+            rows = self.__connection.execute(
+                f"SELECT path, device, inode, size, mtime_ns, {', '.join(self.__columns)} FROM {self._TABLE} "
+                "WHERE substr(path, 1, ?) = ?", (len(prefix), prefix))
+            for path, device, inode, size, mtime_ns, *values in rows:
+                self.__entries[path] = ((device, inode, size, mtime_ns), dict(zip(self.__columns, values)))
+
+    def lookup(self, file_name: str, signature: FileSignature) -> Optional[dict]:
+        """
+        :return: row of the file (values of date columns are text) or None if the file is unknown or was changed.
+        """
+        entry = self.__entries.get(os.path.abspath(file_name))
+        if entry is None or entry[0] != signature:
+            return None
+        return dict(entry[1])
+
+    def store(self, file_name: str, signature: FileSignature, row: dict) -> None:
+        path = os.path.abspath(file_name)
+        entry = (signature, {name: _database_value(row.get(name)) for name in self.__columns})
+        with self.__lock:
+            self.__entries[path] = entry
+            self.__changed[path] = entry
+
+    def evict_missing(self, directory: str, existing_files: Iterable[str]) -> int:
+        """
+        Remove rows of files located in the directory that are not among existing files.
+
+        :return: number of removed rows.
+        """
+        existing = {os.path.abspath(file_name) for file_name in existing_files}
+        prefix = os.path.join(os.path.abspath(directory), "")
+        with self.__lock:
+            missing = [path for path in self.__entries if path.startswith(prefix) and path not in existing]
+            for path in missing:
+                self.__entries.pop(path)
+                self.__changed.pop(path, None)
+            self.__connection.executemany(f"DELETE FROM {self._TABLE} WHERE path = ?", [(p,) for p in missing])
+            self.__connection.commit()
+        return len(missing)
+
+    def flush(self) -> None:
+        """Write all new rows to the database."""
+        with self.__lock:
+            rows = [(path, *signature, *(values[name] for name in self.__columns))
+                    for path, (signature, values) in self.__changed.items()]
+            placeholders = ", ".join("?" * (5 + len(self.__columns)))
+            self.__connection.executemany(f"INSERT OR REPLACE INTO {self._TABLE} VALUES ({placeholders})", rows)
+            self.__connection.commit()
+            self.__changed = {}
+
+    def close(self) -> None:
+        self.flush()
+        self.__connection.close()
@@ -0,0 +1,105 @@
+from dataclasses import dataclass
+from threading import Lock
+from time import monotonic
+from typing import Callable, Optional
+
+_RATE = 10.0  # updates per second delivered to the listener at most
+
+
+@dataclass
+class ProgressSnapshot:
+    files_done: int
+    files_total: int
+    bytes_done: int = 0
+    files_per_second: float = 0
+    bytes_per_second: float = 0
+    eta: Optional[float] = None  # seconds left, None until the rate is known
+    level: int = 0  # number of files read at the same time, 0 if unknown
+
+    @property
+    def finished(self) -> bool:
+        return self.files_done >= self.files_total
+
+
+class ProgressTracker:
+    """
+    Thread-safe counters of a scan. Workers add their results under the lock of the tracker and the listener
+    is called with a snapshot of the counters at most 'rate' times per second, so reporting costs nothing per
+    file. The final snapshot passed by 'finish' is always delivered.
+    """
+
+    def __init__(self, files_total: int = 0, on_update: Optional[Callable[[ProgressSnapshot], None]] = None,
+                 rate: float = _RATE, clock: Callable[[], float] = monotonic) -> None:
+        self.__files_total = files_total
+        self.__on_update = on_update
+        self.__interval = 1 / rate if rate > 0 else 0
+        self.__clock = clock
+        self.__lock = Lock()
+        self.__files_done = 0
+        self.__bytes_done = 0
+        self.__level = 0
+        self.__start = clock()
+        self.__reported = float('-inf')
+
+    @property
+    def snapshot(self) -> ProgressSnapshot:
+        with self.__lock:
+            return self.__snapshot()
+
+    def set_total(self, files_total: int) -> None:
+        with self.__lock:
+            self.__files_total = files_total
+
+    def advance(self, files: int = 1, bytes_read: int = 0) -> None:
+        """Account finished files and bytes read."""
+        with self.__lock:
+            self.__files_done += files
+            self.__bytes_done += bytes_read
+            snapshot = self.__due_snapshot()
+        self.__report(snapshot)
+
+    def update(self, files_done: int, bytes_read: int = 0, level: Optional[int] = None) -> None:
+        """
+        Set the number of finished files, e.g. when the caller counts them itself.
+
+        :param files_done: number of files finished since the start.
+        :param bytes_read: bytes read since the previous call.
+        :param level: number of files read at the same time.
+        """
+        with self.__lock:
+            self.__files_done = files_done
+            self.__bytes_done += bytes_read
+            if level is not None:
+                self.__level = level
+            snapshot = self.__due_snapshot()
+        self.__report(snapshot)
+
+    def finish(self) -> None:
+        """Report completion even if some files were skipped."""
+        with self.__lock:
+            self.__files_done = self.__files_total
+            snapshot = self.__snapshot()
+            self.__reported = self.__clock()
+        self.__report(snapshot)
+
+    def __due_snapshot(self) -> Optional[ProgressSnapshot]:
+        if self.__files_total == 0 or self.__files_done >= self.__files_total:
+            return None  # completion is reported by 'finish' only, so it is reported once
+        now = self.__clock()
+        if now - self.__reported < self.__interval:
+            return None
+        self.__reported = now
+        return self.__snapshot()
+
+    def __snapshot(self) -> ProgressSnapshot:
+        elapsed = self.__clock() - self.__start
+        files_per_second = self.__files_done / elapsed if elapsed > 0 else 0
+        bytes_per_second = self.__bytes_done / elapsed if elapsed > 0 else 0
+        left = max(0, self.__files_total - self.__files_done)
+        eta = left / files_per_second if files_per_second > 0 else None
+        return ProgressSnapshot(self.__files_done, self.__files_total, self.__bytes_done, files_per_second,
+                                bytes_per_second, eta, self.__level)
+
+    def __report(self, snapshot: Optional[ProgressSnapshot]) -> None:
+        if snapshot is not None and isinstance(self.__on_update, Callable):
+            self.__on_update(snapshot)
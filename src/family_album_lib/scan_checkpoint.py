@@ -0,0 +1,92 @@
+import os
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from src.family_album_lib.hash_cache import FileSignature, HashCache
+
+
+@dataclass
+class WalkedFile:
+    name: str  # name of the file without directory
+    signature: FileSignature
+    links: int  # number of hardlinks of the inode
+
+    @property
+    def size(self) -> int:
+        return self.signature[2]
+
+    @property
+    def inode(self) -> Optional[Tuple[int, int]]:
+        """(device, inode) pair if the file has several hardlinks, as returned by 'hardlink_key'."""
+        return (self.signature[0], self.signature[1]) if self.links > 1 else None
+
+
+@dataclass
+class WalkedDirectory:
+    mtime_ns: int  # directory is walked again if files were added or removed since the checkpoint
+    files: List[WalkedFile]
+
+
+class ScanCheckpoint(HashCache):
+    """
+    Checkpoint of an interrupted scan: digests of already hashed files are kept as in 'HashCache' and
+    regular files found in every completely walked directory are recorded, so a restarted scan neither
+    walks nor hashes again what was done before the interruption. Walk records are written by 'flush' with
+    the digests and are removed by 'clear_walk' when the scan is finished.
+    """
+
+    def __init__(self, database_file: str) -> None:
+        super().__init__(database_file)
+        self.__connection = self._connection
+        self.__connection.execute("CREATE TABLE IF NOT EXISTS walked_directories (root TEXT, path TEXT, "
+                                  "mtime_ns INTEGER, PRIMARY KEY (root, path))")
+        self.__connection.execute("CREATE TABLE IF NOT EXISTS walked_files (root TEXT, directory TEXT, "
+                                  "name TEXT, device INTEGER, inode INTEGER, size INTEGER, mtime_ns INTEGER, "
+                                  "links INTEGER)")
+        self.__connection.execute("CREATE INDEX IF NOT EXISTS walked_files_directory ON walked_files (root, directory)")
+        self.__connection.commit()
+        self.__walked: List[Tuple[str, str, WalkedDirectory]] = []
+        self.__lock = self._lock  # the connection is shared with the digests of 'HashCache'
+
+    def load_walk(self, directory: str) -> Dict[str, WalkedDirectory]:
+        """
+        Load directories walked by the interrupted scan of the directory.
+
+        :return: dictionary of absolute path of walked directory and its state.
+        """
+        root = os.path.abspath(directory)
+        with self.__lock:
+            walked = {path: WalkedDirectory(mtime_ns, []) for path, mtime_ns in self.__connection.execute(
+                "SELECT path, mtime_ns FROM walked_directories WHERE root = ?", (root,))}
+            rows = self.__connection.execute("SELECT directory, name, device, inode, size, mtime_ns, links "
+                                             "FROM walked_files WHERE root = ?", (root,)).fetchall()
+        for path, name, device, inode, size, mtime_ns, links in rows:
+            if path in walked:
+                walked[path].files.append(WalkedFile(name, (device, inode, size, mtime_ns), links))
+        return walked
+
+    def store_directory(self, directory: str, path: str, walked_directory: WalkedDirectory) -> None:
+        """Record completely walked directory 'path' of the scanned directory, it is written by 'flush'."""
+        with self.__lock:
+            self.__walked.append((os.path.abspath(directory), os.path.abspath(path), walked_directory))
+
+    def flush(self) -> None:
+        with self.__lock:
+            walked, self.__walked = self.__walked, []
+            self.__connection.executemany("DELETE FROM walked_files WHERE root = ? AND directory = ?",
+                                          [(root, path) for root, path, _ in walked])  # directory walked again
+            self.__connection.executemany("INSERT OR REPLACE INTO walked_directories VALUES (?, ?, ?)",
+                                          [(root, path, state.mtime_ns) for root, path, state in walked])
+            self.__connection.executemany("INSERT INTO walked_files VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                                          [(root, path, file.name, *file.signature, file.links)
+                                           for root, path, state in walked for file in state.files])
+            super().flush()  # commits walk records together with digests
+
+    def clear_walk(self, directory: str) -> None:
+        """Remove walk records of the directory when its scan is finished, digests are kept."""
+        root = os.path.abspath(directory)
+        with self.__lock:
+            self.__walked = [item for item in self.__walked if item[0] != root]
+            self.__connection.execute("DELETE FROM walked_directories WHERE root = ?", (root,))
+            self.__connection.execute("DELETE FROM walked_files WHERE root = ?", (root,))
+            self.__connection.commit()
@@ -0,0 +1,42 @@
+from threading import Event
+from typing import Optional
+
+
+class CancellationToken:
+    """
+    Token shared between the scan and the code that controls it. The scan checks the token between files, so
+    it stops or pauses after the files being read at the moment are finished.
+    """
+
+    def __init__(self) -> None:
+        self.__cancelled = Event()
+        self.__running = Event()
+        self.__running.set()
+
+    @property
+    def is_cancelled(self) -> bool:
+        return self.__cancelled.is_set()
+
+    @property
+    def is_paused(self) -> bool:
+        return not self.__running.is_set()
+
+    def cancel(self) -> None:
+        self.__cancelled.set()
+        self.__running.set()  # wake up paused scan, so it can stop
+
+    def pause(self) -> None:
+        if not self.is_cancelled:
+            self.__running.clear()
+
+    def resume(self) -> None:
+        self.__running.set()
+
+    def wait_while_paused(self, timeout: Optional[float] = None) -> bool:
+        """
+        Block while the scan is paused.
+
+        :param timeout: maximum time to wait in seconds, None waits until resumed or cancelled.
+        :return: True if the scan may continue, False if it was cancelled or is still paused after timeout.
+        """
+        return self.__running.wait(timeout) and not self.is_cancelled
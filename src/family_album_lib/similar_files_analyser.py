@@ -0,0 +1,153 @@
+import os
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
+from functools import partial
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from src.family_album_lib.directory_analyser import DirectoryAnalyser
+from src.family_album_lib.io_concurrency import iter_completed
+from src.family_album_lib.progress import ProgressSnapshot, ProgressTracker
+from src.family_album_lib.scan_control import CancellationToken
+
+
+class SimilarFilesAnalyser(ABC):
+    """
+    Base class of searches for media files that look the same although their bytes differ.
+
+    Subclass defines which files take part in the search, how the signature of a file is calculated and how
+    the signatures are grouped. Results have the same shape as 'DuplicateFileAnalyser.duplicate_files'.
+    """
+
+    _EXTENSIONS: Tuple[str, ...] = ()
+    _MAX_DISTANCE: float = 0
+    _FILE_KIND = "file"
+    _WINDOW_FACTOR = 4  # files submitted to the thread pool at most, per thread
+
+    def __init__(self, directory: str, max_distance: float = 0, workers: int = 0) -> None:
+        self._directory_analyser: DirectoryAnalyser = DirectoryAnalyser(directory)
+        self.__max_distance = max_distance if max_distance > 0 else self._MAX_DISTANCE
+        self.__num_of_threads = workers if workers > 0 else (os.cpu_count() or 4)
+        self.__signatures: Dict[str, Any] = {}
+        self.__similar_files: Dict[str, List[Tuple[str, float]]] = {}
+        self.__cancelled: bool = False
+        self.start_analysis: Callable = None
+        self.update_progress: Callable = None
+        self.log_event: Callable = None
+
+    @property
+    def directory(self) -> str:
+        return self._directory_analyser.directory
+
+    @directory.setter
+    def directory(self, new_directory: str) -> None:
+        self._directory_analyser.directory = new_directory
+        self.__signatures = {}
+        self.__similar_files = {}
+
+    @property
+    def files_count_in_directory(self) -> int:
+        return self._directory_analyser.files_count_in_directory
+
+    @property
+    def subdirectories_count_in_directory(self) -> int:
+        return self._directory_analyser.subdirectories_count_in_directory
+
+    @property
+    def files_and_subdirectories_count(self) -> Tuple[int, int]:
+        return self._directory_analyser.files_and_subdirectories_count
+
+    @property
+    def walk_workers(self) -> int:
+        return self._directory_analyser.walk_workers
+
+    @walk_workers.setter
+    def walk_workers(self, new_workers: int) -> None:
+        self._directory_analyser.walk_workers = new_workers
+
+    @property
+    def max_distance(self) -> float:
+        return self.__max_distance
+
+    @max_distance.setter
+    def max_distance(self, new_distance: float) -> None:
+        self.__max_distance = new_distance
+
+    @property
+    def cancelled(self) -> bool:
+        """True if the last search was cancelled, its results are incomplete."""
+        return self.__cancelled
+
+    @property
+    def signatures(self) -> Dict[str, Any]:
+        return self.__signatures
+
+    @property
+    def similar_files(self) -> Dict[str, List[Tuple[str, float]]]:
+        """Dictionary of original file and list of similar files with their distance to the original."""
+        return self.__similar_files
+
+    @property
+    def duplicate_files(self) -> Dict[str, List[str]]:
+        return {original: [file for file, _ in similar] for original, similar in self.__similar_files.items()}
+
+    def start_analysis_thread(self, token: Optional[CancellationToken] = None) -> None:
+        self._find_similar_files(token)
+
+    @abstractmethod
+    def _signature(self, file_name: str) -> Any:
+        """Calculate signature of the file, None means that file can not take part in the search."""
+
+    @abstractmethod
+    def _group_similar(self, signatures: Dict[str, Any]) -> Dict[str, List[Tuple[str, float]]]:
+        """Group files which signatures are not farther than max_distance from each other."""
+
+    def _find_similar_files(self, token: Optional[CancellationToken] = None) -> None:
+        self.__signatures = {}
+        self.__similar_files = {}
+        self.__cancelled = False
+        token = token if token is not None else CancellationToken()
+        if isinstance(self.start_analysis, Callable):
+            self.start_analysis(f"Start search of similar {self._FILE_KIND}s.")
+        file_names = [record.path for _, _, records in self._directory_analyser.walk()
+                      for record in records if record.name.lower().endswith(self._EXTENSIONS)]
+        total_files = len(file_names)
+        signatures: Dict[str, Any] = {}
+        progress = ProgressTracker(total_files, self.__report_progress)
+        window = self._WINDOW_FACTOR * self.__num_of_threads
+        with ThreadPoolExecutor(max_workers=self.__num_of_threads) as executor, \
+                closing(iter_completed(executor, partial(self.__signature, token=token), file_names,
+                                       window)) as completed:
+            for finished, (file_name, future) in enumerate(completed, start=1):
+                if token.is_cancelled:
+                    break  # files not started yet are dropped when the iterator is closed
+                try:
+                    signature = future.result()
+                    if signature is not None:
+                        signatures[file_name] = signature
+                except Exception as e:
+                    self._log_error(f"Error reading {self._FILE_KIND} {file_name}: {e}")
+                progress.update(finished)
+        # keep discovery order of the files, so the results do not depend on threads timing
+        self.__signatures = {file_name: signatures[file_name] for file_name in file_names if file_name in signatures}
+        self.__similar_files = self._group_similar(self.__signatures)
+        if token.is_cancelled:
+            self.__cancelled = True
+            if isinstance(self.log_event, Callable):
+                self.log_event(f"Search of similar {self._FILE_KIND}s in {self.directory} was cancelled.")
+        elif total_files > 0:
+            progress.finish()
+
+    def __signature(self, file_name: str, token: CancellationToken) -> Any:
+        if not token.wait_while_paused():
+            return None
+        return self._signature(file_name)
+
+    def __report_progress(self, snapshot: ProgressSnapshot) -> None:
+        if isinstance(self.update_progress, Callable):
+            self.update_progress(snapshot.files_done, snapshot.files_total, snapshot)
+
+    def _log_error(self, message: str) -> None:
+        if isinstance(self.log_event, Callable):
+            self.log_event(message)
+        print(message)
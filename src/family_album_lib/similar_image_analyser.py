@@ -0,0 +1,169 @@
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+from src.family_album_lib.similar_files_analyser import SimilarFilesAnalyser
+
+_IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.gif', '.tif', '.tiff', '.webp')
+_HASH_SIZE = 8  # hashes are _HASH_SIZE x _HASH_SIZE = 64 bits long
+_DCT_SIZE = 32  # images are downscaled to this size before DCT for perceptual hash
+
+_dct_matrices: Dict[int, np.ndarray] = {}
+
+
+def hamming_distance(first_hash: int, second_hash: int) -> int:
+    return (first_hash ^ second_hash).bit_count()
+
+
+def _bits_to_int(bits: np.ndarray) -> int:
+    return int.from_bytes(np.packbits(bits.flatten()).tobytes(), 'big')
+
+
+def _load_gray_image(file_name: str, width: int, height: int) -> np.ndarray:
+    """
+    Load image as gray scale array of given size. JPEG files are decoded in draft mode directly at reduced
+    scale, which is several times faster than decoding the full image.
+    """
+    with Image.open(file_name) as image:
+        image.draft('L', (width * 4, height * 4))
+        gray = image.convert('L').resize((width, height), Image.Resampling.LANCZOS)
+        return np.asarray(gray, dtype=np.float32)
+
+
+def _dct_matrix(size: int) -> np.ndarray:
+    matrix = _dct_matrices.get(size)
+    if matrix is None:
+        n = np.arange(size)
+        matrix = np.cos(np.pi * (2 * n[np.newaxis, :] + 1) * n[:, np.newaxis] / (2 * size))
+        _dct_matrices[size] = matrix
+    return matrix
+
+
+def pixels_dhash(pixels: np.ndarray) -> int:
+    """
+    Calculate difference hash of downscaled gray image: each bit tells whether the pixel is brighter than its
+    right neighbour. Array of N rows and N + 1 columns gives N * N bits hash.
+    """
+    return _bits_to_int(pixels[:, 1:] > pixels[:, :-1])
+
+
+def image_dhash(file_name: str, hash_size: int = _HASH_SIZE) -> int:
+    """
+    Calculate difference hash of the image: each bit tells whether the pixel is brighter than its right
+    neighbour in the downscaled gray image.
+
+    :param file_name: full (absolute) name of the file.
+    :param hash_size: size of the hash side, the hash has hash_size * hash_size bits.
+    :return: hash as integer.
+    """
+    return pixels_dhash(_load_gray_image(file_name, hash_size + 1, hash_size))
+
+
+def image_phash(file_name: str, hash_size: int = _HASH_SIZE) -> int:
+    """
+    Calculate perceptual hash of the image: each bit tells whether the low frequency DCT coefficient of the
+    downscaled gray image is above the median.
+
+    :param file_name: full (absolute) name of the file.
+    :param hash_size: size of the hash side, the hash has hash_size * hash_size bits.
+    :return: hash as integer.
+    """
+    pixels = _load_gray_image(file_name, _DCT_SIZE, _DCT_SIZE)
+    matrix = _dct_matrix(_DCT_SIZE)
+    low_frequencies = (matrix @ pixels @ matrix.T)[:hash_size, :hash_size]
+    return _bits_to_int(low_frequencies > np.median(low_frequencies))
+
+
+class BKTree:
+    """
+    Burkhard-Keller tree of hashes in Hamming space. Search of all hashes within small distance visits only
+    a small part of the tree, so clustering of many hashes is sub-quadratic.
+    """
+
+    def __init__(self) -> None:
+        self.__root: Optional[list] = None  # node is [hash, items, {distance: child node}]
+        self.__count = 0
+
+    def __len__(self) -> int:
+        return self.__count
+
+    def add(self, value: int, item: str) -> None:
+        self.__count += 1
+        if self.__root is None:
+            self.__root = [value, [item], {}]
+            return
+        node = self.__root
+        while True:
+            distance = hamming_distance(value, node[0])
+            if distance == 0:
+                node[1].append(item)
+                return
+            child = node[2].get(distance)
+            if child is None:
+                node[2][distance] = [value, [item], {}]
+                return
+            node = child
+
+    def search(self, value: int, max_distance: int) -> List[Tuple[int, str]]:
+        """
+        Find all items which hash is not farther than max_distance from the value.
+
+        :return: list of (distance, item) sorted by distance.
+        """
+        found = []
+        nodes = [self.__root] if self.__root is not None else []
+        while nodes:
+            node = nodes.pop()
+            distance = hamming_distance(value, node[0])
+            if distance <= max_distance:
+                found.extend((distance, item) for item in node[1])
+            for child_distance, child in node[2].items():
+                if distance - max_distance <= child_distance <= distance + max_distance:
+                    nodes.append(child)
+        found.sort()
+        return found
+
+
+class SimilarImageAnalyser(SimilarFilesAnalyser):
+    """
+    Search for images that look the same although their files differ, e.g. after resize, recompression or
+    EXIF strip. Images are compared by perceptual hashes and grouped when hashes differ in no more than
+    'max_distance' bits.
+    """
+
+    _EXTENSIONS = _IMAGE_EXTENSIONS
+    _MAX_DISTANCE = 10
+    _FILE_KIND = "image"
+    _HASH_METHODS: Dict[str, Callable[[str], int]] = {'dhash': image_dhash, 'phash': image_phash}
+
+    def __init__(self, directory: str, max_distance: int = _MAX_DISTANCE, hash_method: str = 'dhash',
+                 workers: int = 0) -> None:
+        if hash_method not in self._HASH_METHODS:
+            raise ValueError(f"Unknown hash method '{hash_method}', use one of {list(self._HASH_METHODS)}.")
+        super().__init__(directory, max_distance, workers)
+        self.__hash_function = self._HASH_METHODS[hash_method]
+
+    @property
+    def image_hashes(self) -> Dict[str, int]:
+        return self.signatures
+
+    def _signature(self, file_name: str) -> int:
+        return self.__hash_function(file_name)
+
+    def _group_similar(self, signatures: Dict[str, int]) -> Dict[str, List[Tuple[str, float]]]:
+        tree = BKTree()
+        for file_name, image_hash in signatures.items():
+            tree.add(image_hash, file_name)
+        grouped = set()
+        groups = {}
+        for file_name, image_hash in signatures.items():
+            if file_name in grouped:
+                continue
+            similar = [(other, distance) for distance, other in tree.search(image_hash, int(self.max_distance))
+                       if other != file_name and other not in grouped]
+            if similar:
+                groups[file_name] = similar
+                grouped.add(file_name)
+                grouped.update(other for other, _ in similar)
+        return groups
@@ -0,0 +1,120 @@
+import math
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from src.family_album_lib.similar_files_analyser import SimilarFilesAnalyser
+from src.family_album_lib.similar_image_analyser import hamming_distance, pixels_dhash
+
+_VIDEO_EXTENSIONS = ('.mp4', '.avi', '.mov', '.mkv', '.wmv', '.flv', '.mpeg', '.mpg', '.3gp', '.3g2', '.webm',
+                     '.mts')
+_SAMPLE_POSITIONS = (0.05, 0.15, 0.25, 0.35, 0.45, 0.55, 0.65, 0.75, 0.85, 0.95)  # relative timestamps of frames
+_HASH_SIZE = 8
+
+
+@dataclass
+class VideoSignature:
+    duration: float  # seconds
+    frame_hashes: List[int]
+
+
+def video_signature(file_name: str, positions: Tuple[float, ...] = _SAMPLE_POSITIONS) -> Optional[VideoSignature]:
+    """
+    Calculate compact signature of the video: its duration and difference hashes of frames at given relative
+    positions. Only the sampled frames are decoded.
+
+    :param file_name: full (absolute) name of the file.
+    :param positions: relative positions (0..1) of sampled frames.
+    :return: signature of the video or None if the video could not be read.
+    """
+    capture = cv2.VideoCapture(file_name)
+    try:
+        if not capture.isOpened():
+            return None
+        fps = capture.get(cv2.CAP_PROP_FPS)
+        frames_count = capture.get(cv2.CAP_PROP_FRAME_COUNT)
+        if fps <= 0 or frames_count <= 0:
+            return None
+        duration = frames_count / fps
+        frame_hashes = []
+        for position in positions:
+            capture.set(cv2.CAP_PROP_POS_MSEC, duration * position * 1000)
+            success, frame = capture.read()
+            if not success:
+                continue
+            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+            pixels = cv2.resize(gray, (_HASH_SIZE + 1, _HASH_SIZE), interpolation=cv2.INTER_AREA)
+            frame_hashes.append(pixels_dhash(pixels.astype(np.int16)))
+        if not frame_hashes:
+            return None
+        return VideoSignature(duration, frame_hashes)
+    finally:
+        capture.release()
+
+
+def signature_distance(first: VideoSignature, second: VideoSignature) -> float:
+    """
+    Distance between two video signatures: average number of different bits between each sampled frame and
+    the closest sampled frame of the other video. Matching to the closest frame tolerates trimmed copies
+    where sampled timestamps do not fall on the same scenes.
+    """
+    def _one_way(hashes: List[int], other_hashes: List[int]) -> float:
+        return sum(min(hamming_distance(frame_hash, other) for other in other_hashes)
+                   for frame_hash in hashes) / len(hashes)
+
+    return max(_one_way(first.frame_hashes, second.frame_hashes),
+               _one_way(second.frame_hashes, first.frame_hashes))
+
+
+class SimilarVideoAnalyser(SimilarFilesAnalyser):
+    """
+    Search for videos that show the same clip although their files differ, e.g. after re-encoding or trimming.
+    Clips are indexed by duration buckets, so only clips of plausible matching length are compared.
+    """
+
+    _EXTENSIONS = _VIDEO_EXTENSIONS
+    _MAX_DISTANCE = 8
+    _FILE_KIND = "video"
+    _DURATION_TOLERANCE = 0.2  # relative difference of duration allowed for similar clips
+
+    def __init__(self, directory: str, max_distance: float = _MAX_DISTANCE,
+                 duration_tolerance: float = _DURATION_TOLERANCE, workers: int = 0) -> None:
+        super().__init__(directory, max_distance, workers)
+        self.__duration_tolerance = duration_tolerance
+
+    def _signature(self, file_name: str) -> Optional[VideoSignature]:
+        return video_signature(file_name)
+
+    def __bucket(self, duration: float) -> int:
+        # logarithmic buckets: width of a bucket is proportional to the duration
+        return math.floor(math.log(max(duration, 0.1)) / math.log(1 + self.__duration_tolerance))
+
+    def _group_similar(self, signatures: Dict[str, VideoSignature]) -> Dict[str, List[Tuple[str, float]]]:
+        buckets: Dict[int, List[str]] = {}
+        for file_name, signature in signatures.items():
+            buckets.setdefault(self.__bucket(signature.duration), []).append(file_name)
+        grouped = set()
+        groups = {}
+        for file_name, signature in signatures.items():
+            if file_name in grouped:
+                continue
+            bucket = self.__bucket(signature.duration)
+            similar = []
+            for other in [name for b in (bucket - 1, bucket, bucket + 1) for name in buckets.get(b, [])]:
+                if other == file_name or other in grouped:
+                    continue
+                other_signature = signatures[other]
+                longest = max(signature.duration, other_signature.duration)
+                if abs(signature.duration - other_signature.duration) > self.__duration_tolerance * longest:
+                    continue
+                distance = signature_distance(signature, other_signature)
+                if distance <= self.max_distance:
+                    similar.append((other, round(distance, 1)))
+            if similar:
+                similar.sort(key=lambda item: item[1])
+                groups[file_name] = similar
+                grouped.add(file_name)
+                grouped.update(other for other, _ in similar)
+        return groups
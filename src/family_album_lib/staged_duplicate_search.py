@@ -0,0 +1,261 @@
+import os
+from collections.abc import Mapping
+from typing import List, Dict, Optional, Tuple
+
+from src.family_album_lib.hash_index import HashIndex
+
+
+def hardlink_key(stat_result: os.stat_result) -> Optional[Tuple[int, int]]:
+    """Return (device, inode) pair of the file if it has several hardlinks, otherwise None."""
+    if stat_result.st_nlink > 1:
+        return stat_result.st_dev, stat_result.st_ino
+    return None
+
+class StagedDuplicateSearch:
+    """
+    Bookkeeping of the staged search for duplicate files.
+
+    Files are grouped by size first, files that share a size are compared by hash of their edges and only
+    files that still have a match are hashed completely. Hashing itself is done by the caller, so the same
+    bookkeeping serves synchronous, multithreaded and asynchronous finders.
+
+    Each size group moves through the stages on its own: as soon as edges of all files of the size are known,
+    the remaining files are handed out for full hashing, and as soon as all files of the size are resolved,
+    their duplicate groups are confirmed and can be taken by 'pop_confirmed_groups'.
+
+    Resolved files are kept in a compact 'HashIndex', only files of size groups that are still in progress
+    are tracked by name.
+
+    Hardlinks to an inode that was already added are not searched at all - they occupy no extra space, so
+    they are reported separately as already deduplicated files.
+    """
+
+    def __init__(self) -> None:
+        self.__index = HashIndex()  # file id is the discovery order of the file, keeps results stable
+        self.__file_ids: Dict[str, int] = {}  # ids of files waiting for edges or full hash
+        self.__full_hash_pending: Dict[int, str] = {}  # edges hash of files waiting for full hash
+        self.__edges_pending: Dict[int, int] = {}  # number of files of the size waiting for edges hash
+        self.__size_pending: Dict[int, int] = {}  # number of files of the size that are not resolved yet
+        self.__edge_groups: Dict[int, Dict[Tuple[str, bool], List[int]]] = {}
+        self.__size_groups: Dict[int, Dict[str, List[int]]] = {}  # resolved files of sizes in progress by key
+        self.__confirmed: List[List[str]] = []
+        self.__inodes: Dict[Tuple[int, int], str] = {}
+        self.__hardlinks: Dict[str, List[str]] = {}
+        self.__pending: int = 0
+
+    @property
+    def files_count(self) -> int:
+        return len(self.__index)
+
+    @property
+    def pending_count(self) -> int:
+        """Number of files that are not resolved yet by any of the stages."""
+        return self.__pending
+
+    @property
+    def files_hashes(self) -> Mapping:
+        """
+        Read-only mapping of all resolved files grouped by key. Key is a full hash of the file for files that
+        were hashed completely, 'size:<size>' for files with unique size and 'edges:<size>:<hash>' for files
+        with unique edges. Files in each group are kept in discovery order.
+        """
+        return self.__index.files_hashes
+
+    @property
+    def duplicate_files(self) -> Mapping:
+        return self.__index.duplicate_files
+
+    @property
+    def hardlinked_files(self) -> Dict[str, List[str]]:
+        """Dictionary of the first found path of the inode and its other hardlinks."""
+        return self.__hardlinks
+
+    def add_file(self, file_name: str, file_size: int, inode: Optional[Tuple[int, int]] = None) -> None:
+        """
+        Add file to the search, every file is expected to be added once.
+
+        :param file_name: full (absolute) name of the file.
+        :param file_size: size of the file in bytes.
+        :param inode: (device, inode) pair of the file if it may have several hardlinks.
+        """
+        if inode is not None and inode[1] != 0:  # some file systems do not provide inode numbers
+            first_link = self.__inodes.setdefault(inode, file_name)
+            if first_link != file_name:
+                self.__hardlinks.setdefault(first_link, []).append(file_name)
+                return
+        self.__index.add_file(file_name, file_size)
+        self.__pending += 1
+
+    def edge_hash_candidates(self) -> List[Tuple[str, int]]:
+        """
+        Finish the size stage: files with unique size are resolved.
+
+        :return: list of files (with their sizes) which edges should be hashed.
+        """
+        unique_files, shared_sizes = self.__index.group_by_size()
+        self.__index.resolve_unique_sizes(unique_files)
+        self.__pending -= len(unique_files)
+        candidates = []
+        for file_ids in shared_sizes:
+            file_size = self.__index.size(int(file_ids[0]))
+            self.__edges_pending[file_size] = len(file_ids)
+            self.__size_pending[file_size] = len(file_ids)
+            for file_id in file_ids.tolist():
+                file_name = self.__index.path(file_id)
+                self.__file_ids[file_name] = file_id
+                candidates.append((file_name, file_size))
+        return candidates
+
+    def add_edge_hash(self, file_name: str, file_size: int, edge_hash: str, whole_file: bool) -> List[str]:
+        """
+        Add hash of the file's edges. When it was the last file of its size waiting for edges, the size group
+        finishes the edges stage: files with unique edges and completely hashed small files are resolved.
+
+        :return: list of files which should be hashed completely, empty until the size group is finished.
+        """
+        file_id = self.__file_ids[file_name]
+        self.__edge_groups.setdefault(file_size, {}).setdefault((edge_hash, whole_file), []).append(file_id)
+        return self.__edge_done(file_size)
+
+    def add_full_hash(self, file_name: str, file_hash: str) -> None:
+        file_id = self.__file_ids[file_name]
+        self.__full_hash_pending.pop(file_id, None)
+        self.__resolve(file_hash, [file_id], self.__index.size(file_id))
+
+    def group_candidates(self, file_names: List[str]) -> List[List[str]]:
+        """Split files waiting for full hash into groups of files with the same size and edges."""
+        groups: Dict[Tuple[int, str], List[str]] = {}
+        for file_name in file_names:
+            file_id = self.__file_ids[file_name]
+            groups.setdefault((self.__index.size(file_id), self.__full_hash_pending[file_id]), []).append(file_name)
+        return list(groups.values())
+
+    def add_identical_files(self, file_names: List[str]) -> None:
+        """
+        Resolve files waiting for full hash that were found byte-identical by other means than hashing, e.g. by
+        block comparison. Every group of identical files, even of one file, should be added separately.
+        """
+        file_ids = [self.__file_ids[file_name] for file_name in file_names]
+        for file_id in file_ids:
+            self.__full_hash_pending.pop(file_id, None)
+        file_size = self.__index.size(file_ids[0])
+        self.__resolve(f"blocks:{file_size}:{min(file_ids)}", file_ids, file_size)
+
+    def discard_file(self, file_name: str) -> List[str]:
+        """
+        Mark file as resolved without adding it to results, e.g. when the file could not be read.
+
+        :return: list of files which should be hashed completely, as for 'add_edge_hash'.
+        """
+        self.__pending -= 1
+        file_id = self.__file_ids.pop(file_name, None)
+        if file_id is None:
+            return []
+        file_size = self.__index.size(file_id)
+        if file_id in self.__full_hash_pending:
+            del self.__full_hash_pending[file_id]
+            ready = []
+        else:
+            ready = self.__edge_done(file_size)
+        self.__size_pending[file_size] -= 1
+        self.__confirm_if_done(file_size)
+        return ready
+
+    def remove_resolved_file(self, file_name: str) -> bool:
+        """
+        Remove file of the finished search, e.g. when it was deleted or modified. When the file was the first
+        found hardlink of its inode, the next hardlink takes its place in the results.
+
+        :return: True if the file was known to the search.
+        """
+        for first_link, links in list(self.__hardlinks.items()):
+            if file_name in links:
+                links.remove(file_name)
+                if not links:
+                    del self.__hardlinks[first_link]
+                return True
+        file_id = self.__index.find(file_name)
+        if file_id is None:
+            return False
+        key = self.__index.key(file_id)
+        self.__index.remove(file_id)
+        inode = next((inode for inode, name in self.__inodes.items() if name == file_name), None)
+        if inode is not None:
+            links = self.__hardlinks.pop(file_name, [])
+            if links:
+                self.__inodes[inode] = links[0]
+                if len(links) > 1:
+                    self.__hardlinks[links[0]] = links[1:]
+                self.__index.resolve(self.__index.add_file(links[0], self.__index.size(file_id)), key)
+            else:
+                del self.__inodes[inode]
+        return True
+
+    def add_resolved_file(self, file_name: str, file_size: int, key: str,
+                          inode: Optional[Tuple[int, int]] = None) -> bool:
+        """
+        Add file to the finished search with already known key, e.g. when it was added or modified.
+
+        :param key: full hash of the file or 'size:<size>' if no other file has the size.
+        :return: False if the file is a hardlink of a known inode, it is not added to the groups then.
+        """
+        if inode is not None and inode[1] != 0:
+            first_link = self.__inodes.setdefault(inode, file_name)
+            if first_link != file_name:
+                self.__hardlinks.setdefault(first_link, []).append(file_name)
+                return False
+        self.__index.resolve(self.__index.add_file(file_name, file_size), key)
+        return True
+
+    def resolved_groups_of_size(self, file_size: int) -> Dict[str, List[str]]:
+        """Files of the finished search with the size grouped by their keys."""
+        groups: Dict[str, List[str]] = {}
+        for file_id in self.__index.resolved_of_size(file_size):
+            groups.setdefault(self.__index.key(file_id), []).append(self.__index.path(file_id))
+        return groups
+
+    def replace_key(self, file_names: List[str], key: str) -> None:
+        """Set new key of resolved files, e.g. full hash of files that were resolved by size or edges."""
+        for file_name in file_names:
+            self.__index.resolve(self.__index.find(file_name), key)
+
+    def pop_confirmed_groups(self) -> List[List[str]]:
+        """
+        Take duplicate groups confirmed since the previous call. Group is confirmed when all files of its size
+        are resolved, so it will not change anymore. Files in each group are kept in discovery order.
+        """
+        confirmed, self.__confirmed = self.__confirmed, []
+        return confirmed
+
+    def __edge_done(self, file_size: int) -> List[str]:
+        self.__edges_pending[file_size] -= 1
+        if self.__edges_pending[file_size] > 0:
+            return []
+        del self.__edges_pending[file_size]
+        candidates = []
+        for (edge_hash, whole_file), file_ids in self.__edge_groups.pop(file_size, {}).items():
+            if whole_file:
+                self.__resolve(edge_hash, file_ids, file_size)
+            elif len(file_ids) == 1:
+                self.__resolve(f"edges:{file_size}:{edge_hash}", file_ids, file_size)
+            else:
+                candidates.extend(file_ids)
+                self.__full_hash_pending.update((file_id, edge_hash) for file_id in file_ids)
+        return [self.__index.path(file_id) for file_id in sorted(candidates)]
+
+    def __resolve(self, key: str, file_ids: List[int], file_size: int) -> None:
+        for file_id in file_ids:
+            self.__index.resolve(file_id, key)
+            self.__file_ids.pop(self.__index.path(file_id), None)
+        self.__pending -= len(file_ids)
+        self.__size_groups.setdefault(file_size, {}).setdefault(key, []).extend(file_ids)
+        self.__size_pending[file_size] -= len(file_ids)
+        self.__confirm_if_done(file_size)
+
+    def __confirm_if_done(self, file_size: int) -> None:
+        if self.__size_pending[file_size] > 0:
+            return
+        del self.__size_pending[file_size]
+        groups = sorted(sorted(file_ids) for file_ids in self.__size_groups.pop(file_size, {}).values()
+                        if len(file_ids) > 1)
+        self.__confirmed.extend([self.__index.path(file_id) for file_id in file_ids] for file_ids in groups)
@@ -0,0 +1,355 @@
+import os
+import struct
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import BinaryIO, Dict, Iterator, Optional, Tuple
+
+from src.family_album_lib.media_signature import detect_media_type
+
+_ISO_FORMATS = {"mp4", "mov", "3gp", "3g2", "m4v"}  # formats based on ISO base media file format (QuickTime)
+_TS_FORMATS = {"ts": 0, "mts": 4}  # MPEG transport streams by the size of timestamp before every packet
+_ISO_EPOCH = datetime(1904, 1, 1, tzinfo=timezone.utc)  # times of 'mvhd' are seconds since this date
+_MAX_BOX_SIZE = 1024 * 1024  # boxes with metadata are small, larger ones are not read
+_TS_PACKET_SIZE = 188
+_TS_SCAN_SIZE = 64 * 1024  # bytes read at the beginning and at the end of transport stream to find its PCRs
+_PCR_CLOCK = 90000  # PCR base ticks per second
+_PCR_WRAP = 1 << 33
+_TS_CODECS = {0x01: "mpeg1", 0x02: "mpeg2", 0x10: "mpeg4", 0x1b: "h264", 0x24: "hevc", 0xea: "vc1"}
+_START_CODE = b'\x00\x00\x01'  # prefix of NAL units of H.264 and of headers of MPEG-1/2 video
+_MPEG_FRAME_RATES = {1: 24000 / 1001, 2: 24.0, 3: 25.0, 4: 30000 / 1001, 5: 30.0, 6: 50.0, 7: 60000 / 1001, 8: 60.0}
+# H.264 profiles whose sequence parameter set has chroma format, bit depths and scaling matrices
+_H264_HIGH_PROFILES = {100, 110, 122, 244, 44, 83, 86, 118, 128, 138, 139, 134, 135}
+
+
+@dataclass
+class VideoInfo:
+    """Metadata of the video read from its container, values which are not stored in the container are empty."""
+    container: str
+    creation_time: Optional[datetime] = None  # local time
+    duration: float = 0
+    resolution: Optional[Tuple[int, int]] = None
+    fps: float = 0
+    codec: str = ""
+
+    def as_metadata(self) -> dict:
+        """Known values with keys of 'get_video_metadata' ('bitrate' is frame rate there)."""
+        output = {'container': self.container}
+        if self.creation_time is not None:
+            output['creation_time'] = self.creation_time
+        if self.duration > 0:
+            output['duration'] = self.duration
+        if self.resolution is not None:
+            output['resolution'] = list(self.resolution)
+        if self.fps > 0:
+            output['fps'] = self.fps
+            output['bitrate'] = int(self.fps)
+        if self.codec:
+            output['codec'] = self.codec
+        return output
+
+
+def read_video_info(file_name: str) -> Optional[VideoInfo]:
+    """
+    Read metadata of MP4/MOV/3GP or MTS/TS video from headers of its container without decoding of the video. Only
+    atoms with metadata are read from ISO media files ('moov' may be at the end of the file, 'mdat' is skipped),
+    transport streams are read at the beginning and at the end.
+
+    :param file_name: full (absolute) name of the file.
+    :return: metadata of the video or None if the container is not supported or can not be parsed.
+    """
+    media_type = detect_media_type(file_name)
+    if media_type is None or not media_type.is_video:
+        return None
+    try:
+        with open(file_name, 'rb') as f:
+            file_size = os.fstat(f.fileno()).st_size
+            if media_type.format in _ISO_FORMATS:
+                return _read_iso_media(f, file_size, media_type.format)
+            if media_type.format in _TS_FORMATS:
+                return _read_transport_stream(f, file_size, media_type.format)
+    except (OSError, struct.error, IndexError, ValueError, OverflowError, RecursionError):
+        pass  # malformed container, the caller falls back to decoding of the video
+    return None
+
+
+def _iter_boxes(f: BinaryIO, start: int, end: int) -> Iterator[Tuple[bytes, int, int]]:
+    """Iterate boxes between start and end positions: type of the box, start and end position of its payload."""
+    position = start
+    while position + 8 <= end:
+        f.seek(position)
+        size, box_type = struct.unpack('>I4s', f.read(8))
+        header_size = 8
+        if size == 1:  # 64-bit size follows the type
+            size = struct.unpack('>Q', f.read(8))[0]
+            header_size = 16
+        elif size == 0:  # the box lasts to the end of the file
+            size = end - position
+        if size < header_size:
+            return
+        yield box_type, position + header_size, min(position + size, end)
+        position += size
+
+
+def _read_box(f: BinaryIO, start: int, end: int) -> bytes:
+    f.seek(start)
+    return f.read(min(end - start, _MAX_BOX_SIZE))
+
+
+def _read_iso_media(f: BinaryIO, file_size: int, container: str) -> Optional[VideoInfo]:
+    for box_type, start, end in _iter_boxes(f, 0, file_size):
+        if box_type != b'moov':
+            continue
+        info = VideoInfo(container)
+        for child_type, child_start, child_end in _iter_boxes(f, start, end):
+            if child_type == b'mvhd':
+                created, timescale, duration = _parse_time_header(_read_box(f, child_start, child_end))
+                info.creation_time = created
+                info.duration = duration / timescale if timescale else 0
+            elif child_type == b'trak' and info.resolution is None:
+                track = _read_track(f, child_start, child_end)
+                if track.get('handler') == b'vide':
+                    info.resolution = track.get('resolution')
+                    info.codec = track.get('codec', "")
+                    media_duration = track.get('duration', 0)
+                    info.fps = track.get('samples', 0) / media_duration if media_duration > 0 else 0
+        return info
+    return None
+
+
+def _parse_time_header(payload: bytes) -> Tuple[Optional[datetime], int, int]:
+    """Parse 'mvhd' or 'mdhd' payload: creation time, timescale and duration in units of the timescale."""
+    if len(payload) < 20 or (payload[0] == 1 and len(payload) < 32):
+        raise ValueError("truncated time header")
+    if payload[0] == 1:
+        created, _, timescale, duration = struct.unpack('>QQIQ', payload[4:32])
+    else:
+        created, _, timescale, duration = struct.unpack('>IIII', payload[4:20])
+    creation_time = None
+    if created > 0:  # zero means that the time was not set
+        creation_time = (_ISO_EPOCH + timedelta(seconds=created)).astimezone().replace(tzinfo=None)
+    return creation_time, timescale, duration
+
+
+def _read_track(f: BinaryIO, start: int, end: int) -> Dict[str, object]:
+    """Collect handler type, resolution, codec, media duration in seconds and number of samples of the track."""
+    track: Dict[str, object] = {}
+    for box_type, box_start, box_end in _iter_boxes(f, start, end):
+        if box_type in (b'mdia', b'minf', b'stbl'):
+            for key, value in _read_track(f, box_start, box_end).items():
+                track.setdefault(key, value)  # the outer box wins, e.g. handler of 'mdia' over handler of 'minf'
+        elif box_type == b'tkhd':
+            payload = _read_box(f, box_start, box_end)
+            width, height = struct.unpack('>II', payload[-8:])  # 16.16 fixed point numbers
+            if width and height:
+                track.setdefault('resolution', (width >> 16, height >> 16))
+        elif box_type == b'hdlr':
+            track['handler'] = _read_box(f, box_start, box_end)[8:12]
+        elif box_type == b'mdhd':
+            _, timescale, duration = _parse_time_header(_read_box(f, box_start, box_end))
+            track['duration'] = duration / timescale if timescale else 0
+        elif box_type == b'stsd':
+            payload = _read_box(f, box_start, box_end)
+            track['codec'] = payload[12:16].decode('latin-1').strip()
+            if len(payload) >= 44:
+                track['resolution'] = struct.unpack('>HH', payload[40:44])  # size of visual sample entry
+        elif box_type == b'stts':
+            payload = _read_box(f, box_start, box_end)
+            count = min(struct.unpack('>I', payload[4:8])[0], (len(payload) - 8) // 8)
+            track['samples'] = sum(struct.unpack(f'>{2 * count}I', payload[8:8 + 8 * count])[::2])
+    return track
+
+
+def _read_transport_stream(f: BinaryIO, file_size: int, container: str) -> VideoInfo:
+    offset = _TS_FORMATS[container]
+    packet_size = _TS_PACKET_SIZE + offset
+    head = f.read(_TS_SCAN_SIZE)
+    tail_start = max(0, file_size - _TS_SCAN_SIZE)
+    tail_start -= tail_start % packet_size  # the file is a sequence of whole packets
+    f.seek(tail_start)
+    tail = f.read(file_size - tail_start)
+    info = VideoInfo(container)
+    first_pcr = next(_iter_pcrs(head, offset, packet_size), None)
+    last_pcr = None
+    for last_pcr in _iter_pcrs(tail, offset, packet_size):
+        pass
+    if first_pcr is not None and last_pcr is not None:
+        info.duration = ((last_pcr - first_pcr) % _PCR_WRAP) / _PCR_CLOCK
+    stream_pid, stream_type = _ts_video_stream(head, offset, packet_size)
+    info.codec = _TS_CODECS.get(stream_type, "")
+    stream = _ts_stream_data(head, offset, packet_size, stream_pid)
+    try:
+        if stream_type == 0x1b:
+            info.resolution, info.fps = _h264_sequence(stream)
+        elif stream_type in (0x01, 0x02):
+            info.resolution, info.fps = _mpeg_sequence(stream)
+    except (IndexError, ValueError):
+        pass  # the sequence header is damaged or is not in the beginning of the stream
+    return info
+
+
+def _iter_packets(data: bytes, offset: int, packet_size: int) -> Iterator[Tuple[int, bool, bytes, bytes]]:
+    """Iterate packets of transport stream: PID, payload unit start flag, adaptation field and payload."""
+    for position in range(offset, len(data) - _TS_PACKET_SIZE + 1, packet_size):
+        packet = data[position:position + _TS_PACKET_SIZE]
+        if packet[0] != 0x47:
+            continue
+        pid = ((packet[1] & 0x1f) << 8) | packet[2]
+        control = (packet[3] >> 4) & 0x3
+        adaptation = b''
+        payload_start = 4
+        if control & 0x2:
+            adaptation = packet[5:5 + packet[4]]
+            payload_start = 5 + packet[4]
+        yield pid, bool(packet[1] & 0x40), adaptation, packet[payload_start:] if control & 0x1 else b''
+
+
+def _iter_pcrs(data: bytes, offset: int, packet_size: int) -> Iterator[int]:
+    for _, _, adaptation, _ in _iter_packets(data, offset, packet_size):
+        if len(adaptation) >= 7 and adaptation[0] & 0x10:  # PCR flag
+            yield int.from_bytes(adaptation[1:6], 'big') >> 7  # 33 bits of PCR base
+
+
+def _ts_video_stream(data: bytes, offset: int, packet_size: int) -> Tuple[int, int]:
+    """Find the program map in the first packets and return PID and stream type of its first video stream."""
+    pmt_pids = set()
+    for pid, unit_start, _, payload in _iter_packets(data, offset, packet_size):
+        if not unit_start or not payload:
+            continue
+        section = payload[1 + payload[0]:]  # skip the pointer field
+        if len(section) < 12:
+            continue
+        section_end = min(len(section), 3 + (((section[1] & 0x0f) << 8) | section[2]) - 4)  # without CRC
+        if pid == 0 and section[0] == 0x00:  # program association table
+            for position in range(8, section_end - 3, 4):
+                if int.from_bytes(section[position:position + 2], 'big') != 0:  # program 0 is network PID
+                    pmt_pids.add(((section[position + 2] & 0x1f) << 8) | section[position + 3])
+        elif pid in pmt_pids and section[0] == 0x02:  # program map table
+            position = 12 + (((section[10] & 0x0f) << 8) | section[11])
+            while position + 5 <= section_end:
+                stream_type = section[position]
+                if stream_type in _TS_CODECS:
+                    return ((section[position + 1] & 0x1f) << 8) | section[position + 2], stream_type
+                position += 5 + (((section[position + 3] & 0x0f) << 8) | section[position + 4])
+    return -1, 0
+
+
+def _ts_stream_data(data: bytes, offset: int, packet_size: int, stream_pid: int) -> bytes:
+    """Payload of packets of the stream from its first PES packet on, PES headers are kept."""
+    chunks = []
+    for pid, unit_start, _, payload in _iter_packets(data, offset, packet_size):
+        if pid == stream_pid and (chunks or unit_start):
+            chunks.append(payload)
+    return b''.join(chunks)
+
+
+class _BitReader:
+    """Reader of big-endian bit fields and Exp-Golomb codes of H.264 headers."""
+
+    def __init__(self, data: bytes) -> None:
+        self.__data = data
+        self.__position = 0
+
+    def bits(self, count: int) -> int:
+        value = 0
+        for _ in range(count):
+            byte = self.__data[self.__position >> 3]
+            value = (value << 1) | ((byte >> (7 - (self.__position & 7))) & 1)
+            self.__position += 1
+        return value
+
+    def unsigned(self) -> int:
+        zeros = 0
+        while self.bits(1) == 0:
+            zeros += 1
+            if zeros > 31:
+                raise ValueError("invalid Exp-Golomb code")
+        return (1 << zeros) - 1 + self.bits(zeros)
+
+    def signed(self) -> int:
+        value = self.unsigned()
+        return (value + 1) // 2 if value & 1 else -(value // 2)
+
+
+def _h264_sequence(stream: bytes) -> Tuple[Optional[Tuple[int, int]], float]:
+    """Resolution and frame rate from the first sequence parameter set of H.264 stream."""
+    position = stream.find(_START_CODE)
+    while position >= 0 and (position + 3 >= len(stream) or stream[position + 3] & 0x9f != 0x07):
+        position = stream.find(_START_CODE, position + 3)
+    if position < 0:
+        return None, 0
+    end = stream.find(_START_CODE, position + 3)
+    rbsp = stream[position + 4:end if end >= 0 else len(stream)].replace(b'\x00\x00\x03', b'\x00\x00')
+    reader = _BitReader(rbsp)
+    profile = reader.bits(8)
+    reader.bits(16)  # constraint flags and level
+    reader.unsigned()  # id of the parameter set
+    chroma_format = 1
+    if profile in _H264_HIGH_PROFILES:
+        chroma_format = reader.unsigned()
+        if chroma_format == 3:
+            reader.bits(1)  # separate colour planes
+        reader.unsigned()  # bit depth of luma
+        reader.unsigned()  # bit depth of chroma
+        reader.bits(1)
+        if reader.bits(1):  # scaling matrices are present
+            for i in range(12 if chroma_format == 3 else 8):
+                if reader.bits(1):
+                    _skip_scaling_list(reader, 16 if i < 6 else 64)
+    reader.unsigned()  # maximal frame number
+    order_type = reader.unsigned()
+    if order_type == 0:
+        reader.unsigned()
+    elif order_type == 1:
+        reader.bits(1)
+        reader.signed()
+        reader.signed()
+        for _ in range(reader.unsigned()):
+            reader.signed()
+    reader.unsigned()  # number of reference frames
+    reader.bits(1)
+    width_in_blocks = reader.unsigned() + 1
+    height_in_units = reader.unsigned() + 1
+    frame_blocks_only = reader.bits(1)
+    if not frame_blocks_only:
+        reader.bits(1)  # adaptive frame/field
+    reader.bits(1)
+    crop = [reader.unsigned() for _ in range(4)] if reader.bits(1) else [0, 0, 0, 0]  # left, right, top, bottom
+    crop_x = 2 if chroma_format in (1, 2) else 1
+    crop_y = (2 if chroma_format == 1 else 1) * (2 - frame_blocks_only)
+    resolution = (width_in_blocks * 16 - crop_x * (crop[0] + crop[1]),
+                  (2 - frame_blocks_only) * height_in_units * 16 - crop_y * (crop[2] + crop[3]))
+    fps = 0.0
+    if reader.bits(1):  # video usability information, the frame rate is in its timing info
+        if reader.bits(1) and reader.bits(8) == 255:  # extended sample aspect ratio
+            reader.bits(32)
+        if reader.bits(1):
+            reader.bits(1)  # overscan
+        if reader.bits(1):
+            reader.bits(4)  # video format and full range
+            if reader.bits(1):
+                reader.bits(24)  # colour description
+        if reader.bits(1):
+            reader.unsigned()  # chroma location
+            reader.unsigned()
+        if reader.bits(1):
+            units_in_tick, time_scale = reader.bits(32), reader.bits(32)
+            fps = time_scale / (2 * units_in_tick) if units_in_tick else 0.0  # a frame lasts two ticks
+    return resolution, fps
+
+
+def _skip_scaling_list(reader: _BitReader, size: int) -> None:
+    last_scale = next_scale = 8
+    for _ in range(size):
+        if next_scale != 0:
+            next_scale = (last_scale + reader.signed()) % 256
+        last_scale = next_scale or last_scale
+
+
+def _mpeg_sequence(stream: bytes) -> Tuple[Optional[Tuple[int, int]], float]:
+    """Resolution and frame rate from the sequence header of MPEG-1/2 video."""
+    position = stream.find(_START_CODE + b'\xb3')
+    if position < 0 or position + 8 > len(stream):
+        return None, 0
+    header = stream[position + 4:position + 8]
+    width, height = (header[0] << 4) | (header[1] >> 4), ((header[1] & 0x0f) << 8) | header[2]
+    return (width, height), _MPEG_FRAME_RATES.get(header[3] & 0x0f, 0.0)
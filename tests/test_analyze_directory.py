@@ -0,0 +1,98 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import pandas as pd
+
+from src.family_album.utility_functions import analyze_directory as analyze_module
+from src.family_album.utility_functions.analyze_directory import (_TEMPLATE, LAZY_COLUMNS, analyze_directory,
+                                                                  analyze_directory_lazily, evaluate_files,
+                                                                  iter_directory_analysis, open_metadata_catalog,
+                                                                  update_analysis)
+from src.family_album_lib.directory_state import FileChanges
+from src.family_album_lib.hash_cache import file_signature
+
+
+class TestAnalyzeDirectory(unittest.TestCase):
+
+    def setUp(self):
+        self._temp_dir = tempfile.TemporaryDirectory()
+        self._data_path = self._temp_dir.name
+        for i in range(25):
+            with open(os.path.join(self._data_path, f'{i}.txt'), 'w') as file:
+                file.write('x' * i)
+
+    def tearDown(self):
+        self._temp_dir.cleanup()
+
+    def test_rows_are_built_with_template_types(self):
+        data_frame = analyze_directory(self._data_path)
+        self.assertEqual(len(data_frame), 25)
+        self.assertEqual(list(data_frame.columns), list(_TEMPLATE))
+        self.assertEqual(str(data_frame["file_date_created"].dtype), _TEMPLATE["file_date_created"])
+        self.assertEqual(str(data_frame["file_size"].dtype), _TEMPLATE["file_size"])
+        self.assertEqual(sorted(data_frame["file_size"]), list(range(25)))
+        self.assertEqual(len(analyze_directory(os.path.join(self._data_path, 'missing'))), 0)
+
+    def test_chunks_and_updates_keep_rows(self):
+        data_frame = analyze_directory(self._data_path)
+        chunks = list(iter_directory_analysis(self._data_path, chunk_size=10))
+        self.assertEqual([len(chunk) for chunk in chunks], [10, 10, 5])
+        self.assertTrue(pd.concat(chunks, ignore_index=True).equals(data_frame))
+        removed = os.path.join(self._data_path, '0.txt')
+        added = os.path.join(self._data_path, 'new.txt')
+        with open(added, 'w') as file:
+            file.write('new')
+        updated = update_analysis(data_frame, FileChanges(added=[added], removed=[removed]))
+        self.assertEqual(len(updated), 25)
+        self.assertNotIn(removed, set(updated["file_path"]))
+        self.assertEqual(updated.iloc[-1]["file_path"], added)
+        self.assertTrue(updated.dtypes.equals(data_frame.dtypes))
+
+    def test_process_pool_matches_single_thread(self):
+        data_frame = analyze_directory(self._data_path)
+        parallel = analyze_directory(self._data_path, processes=2, process_chunk_size=4)
+        self.assertTrue(parallel.equals(data_frame))
+        self.assertEqual(len(analyze_directory(os.path.join(self._data_path, 'missing'), processes=2)), 0)
+
+    def test_catalog_reuses_rows_of_unchanged_files(self):
+        database_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(database_dir.cleanup)
+        database_file = os.path.join(database_dir.name, 'catalog.db')
+        catalog = open_metadata_catalog(database_file)
+        data_frame = analyze_directory(self._data_path)
+        self.assertTrue(analyze_directory(self._data_path, catalog=catalog).equals(data_frame))
+
+        changed = os.path.join(self._data_path, '3.txt')
+        removed = os.path.join(self._data_path, '4.txt')
+        with open(changed, 'w') as file:
+            file.write('changed content')
+        os.remove(removed)
+        catalog.close()
+        catalog = open_metadata_catalog(database_file)
+        with mock.patch.object(analyze_module, '_append_row', wraps=analyze_module._append_row) as append_row:
+            cached = analyze_directory(self._data_path, catalog=catalog)
+        self.assertEqual([call.args[2] for call in append_row.call_args_list], [changed])  # only changed is parsed
+        expected = analyze_directory(self._data_path)
+        self.assertTrue(cached.dtypes.equals(expected.dtypes))
+        self.assertTrue(cached.sort_values("file_path", ignore_index=True).equals(
+            expected.sort_values("file_path", ignore_index=True)))
+        catalog.load(self._data_path)
+        self.assertIsNone(catalog.lookup(removed, file_signature(os.stat(changed))))  # deleted file is pruned
+        self.assertEqual(catalog.lookup(changed, file_signature(os.stat(changed)))["file_size"], 15)
+        catalog.close()
+
+    def test_lazy_analysis_leaves_content_columns_pending(self):
+        data_frame = analyze_directory(self._data_path)
+        lazy, pending = analyze_directory_lazily(self._data_path)
+        self.assertEqual(sorted(pending), sorted(data_frame["file_path"]))
+        self.assertTrue(lazy.dtypes.equals(data_frame.dtypes))
+        stat_columns = [column for column in _TEMPLATE if column not in LAZY_COLUMNS]
+        self.assertTrue(lazy[stat_columns].equals(data_frame[stat_columns]))
+        self.assertTrue(lazy["date_take"].isna().all())
+        self.assertTrue(evaluate_files(pending).equals(data_frame))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,76 @@
+import threading
+import unittest
+from unittest import mock
+
+import pandas as pd
+from PyQt6.QtCore import QCoreApplication, Qt
+
+from src.family_album.gui.dataframe_model import DataFrameModel
+from src.family_album_lib.scan_control import CancellationToken
+
+
+class TestDataFrameModel(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls._app = QCoreApplication.instance() or QCoreApplication([])
+
+    def setUp(self):
+        self._keys = [f'file_{i}' for i in range(100)]
+        self._data_frame = pd.DataFrame({"file_path": self._keys, "size": range(100), "maker": [""] * 100})
+        self._evaluated = []
+
+    def _evaluate(self, keys):
+        self._evaluated.extend(keys)
+        return pd.DataFrame({"file_path": keys, "size": [0] * len(keys),
+                             "maker": [f'maker {key[5:]}' for key in keys]})
+
+    def _evaluate_all(self, model: DataFrameModel) -> int:
+        result = []
+        thread = threading.Thread(target=lambda: result.append(
+            model.evaluate_pending(self._evaluate, CancellationToken(), lambda *args: None)))
+        thread.start()
+        thread.join(10)
+        self._app.processEvents()
+        return result[0]
+
+    def test_visible_rows_are_evaluated_first(self):
+        model = DataFrameModel(self._data_frame, lazy_columns=["maker"], pending=self._keys)
+        self.assertEqual(model.data(model.index(90, 1)), '90')  # columns known at once are shown
+        self.assertEqual(model.data(model.index(90, 2)), '...')
+        self.assertEqual(model.data(model.index(40, 2)), '...')
+        self.assertEqual(self._evaluate_all(model), 100)
+        self.assertEqual(self._evaluated[:2], ['file_40', 'file_90'])  # the most recently shown row goes first
+        self.assertEqual(self._evaluated[2:5], ['file_0', 'file_1', 'file_2'])
+        self.assertEqual(model.pending, set())
+        self.assertEqual(model.data(model.index(90, 2)), 'maker 90')
+        self.assertEqual(self._data_frame.at[90, "maker"], 'maker 90')  # values are memoized in the DataFrame
+        self.assertEqual(self._data_frame.at[90, "size"], 90)  # columns which are not lazy are kept
+
+    def test_sorting_by_lazy_column_is_repeated_when_evaluated(self):
+        model = DataFrameModel(self._data_frame, lazy_columns=["maker"], pending=self._keys[1:])
+        self._data_frame.at[0, "maker"] = 'maker 0'
+        model.sort(2, Qt.SortOrder.DescendingOrder)
+        self._evaluate_all(model)
+        self.assertEqual(model.data(model.index(0, 2)), 'maker 99')
+        self.assertEqual(model.data(model.index(99, 2)), 'maker 0')
+
+    def test_cancelled_evaluation_is_continued(self):
+        model = DataFrameModel(self._data_frame, lazy_columns=["maker"], pending=self._keys)
+        token = CancellationToken()
+
+        def _evaluate_and_cancel(keys):
+            token.cancel()
+            return self._evaluate(keys)
+
+        self.assertEqual(model.evaluate_pending(_evaluate_and_cancel, token, lambda *args: None), 16)
+        with self.assertRaises(OSError):
+            model.evaluate_pending(mock.Mock(side_effect=OSError), CancellationToken(), lambda *args: None)
+        self._app.processEvents()
+        self.assertEqual(len(model.pending), 84)
+        self.assertEqual(self._evaluate_all(model), 84)  # rows of the failed evaluation are taken again
+        self.assertEqual(model.pending, set())
+
+
+if __name__ == '__main__':
+    unittest.main()
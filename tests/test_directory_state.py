@@ -0,0 +1,61 @@
+import os
+import tempfile
+import time
+import unittest
+
+from src.family_album_lib.directory_state import DirectoryState
+
+
+class TestDirectoryState(unittest.TestCase):
+
+    def setUp(self):
+        self._temp_dir = tempfile.TemporaryDirectory()
+        self._data_path = self._temp_dir.name
+        for name in ('a.txt', 'sub/b.txt', 'sub/deep/c.txt'):
+            self._write(name, name)
+        self._state = DirectoryState(self._data_path)
+
+    def tearDown(self):
+        self._temp_dir.cleanup()
+
+    def _write(self, name: str, content: str) -> str:
+        full_name = os.path.join(self._data_path, *name.split('/'))
+        os.makedirs(os.path.dirname(full_name), exist_ok=True)
+        with open(full_name, 'wt') as file:
+            file.write(content)
+        return full_name
+
+    def _touch_directory(self, name: str) -> None:
+        # modification time of the directory may not change within the resolution of the file system
+        full_name = os.path.join(self._data_path, *name.split('/'))
+        future = time.time() + 10
+        os.utime(full_name, (future, future))
+
+    def test_initial_walk(self):
+        self.assertEqual(len(self._state.files), 3)
+        self.assertEqual(len(self._state.directories), 3)
+        self.assertFalse(self._state.poll())
+
+    def test_refresh_finds_changes(self):
+        added = self._write('sub/new.txt', 'new')
+        modified = self._write('a.txt', 'changed content')
+        os.remove(os.path.join(self._data_path, 'sub', 'deep', 'c.txt'))
+        os.rmdir(os.path.join(self._data_path, 'sub', 'deep'))
+        new_directory_file = self._write('sub/other/d.txt', 'd')
+        changes = self._state.refresh([self._data_path, os.path.join(self._data_path, 'sub')])
+        self.assertCountEqual(changes.added, [added, new_directory_file])
+        self.assertEqual(changes.modified, [modified])
+        self.assertEqual(changes.removed, [os.path.join(self._data_path, 'sub', 'deep', 'c.txt')])
+        self.assertNotIn(os.path.join(self._data_path, 'sub', 'deep'), self._state.directories)
+        self.assertFalse(self._state.refresh([self._data_path]))
+
+    def test_poll_lists_changed_directories_only(self):
+        added = self._write('sub/deep/new.txt', 'new')
+        self._touch_directory('sub/deep')
+        changes = self._state.poll()
+        self.assertEqual(changes.added, [added])
+        self.assertFalse(changes.removed or changes.modified)
+
+
+if __name__ == '__main__':
+    unittest.main()
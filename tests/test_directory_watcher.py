@@ -0,0 +1,65 @@
+import os
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+from PyQt6.QtCore import QCoreApplication
+
+from src.family_album.gui.directory_watcher import DirectoryWatcher
+from src.family_album.gui.job_manager import JobManager
+from src.family_album_lib.directory_state import DirectoryState
+
+
+class TestDirectoryWatcher(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls._app = QCoreApplication.instance() or QCoreApplication([])
+
+    def setUp(self):
+        self._temp_dir = tempfile.TemporaryDirectory()
+        os.makedirs(os.path.join(self._temp_dir.name, 'sub'))
+        self._manager = JobManager()
+        self._watcher = DirectoryWatcher(job_manager=self._manager)
+        self._started = []
+        self._watcher.WatchStarted.connect(lambda directory, polling: self._started.append(directory))
+
+    def tearDown(self):
+        self._watcher.stop()
+        self._manager.cancel_all()
+        self._manager.wait()
+        self._temp_dir.cleanup()
+
+    def _wait_for(self, condition):
+        deadline = time.monotonic() + 10
+        while not condition() and time.monotonic() < deadline:
+            self._app.processEvents()
+            time.sleep(0.01)
+
+    def test_directory_is_walked_by_job(self):
+        threads = []
+
+        def _state(directory):
+            threads.append(threading.get_ident())
+            return DirectoryState(directory)
+
+        with mock.patch('src.family_album.gui.directory_watcher.DirectoryState', side_effect=_state):
+            self._watcher.watch(self._temp_dir.name)
+            self.assertEqual((self._watcher.directory, self._started), ("", []))  # the walk has not finished yet
+            self._wait_for(lambda: self._started)
+        self.assertEqual(self._started, [self._temp_dir.name])
+        self.assertNotEqual(threads, [threading.get_ident()])
+        self.assertEqual(self._watcher.directory, self._temp_dir.name)
+
+    def test_stopped_watch_does_not_start(self):
+        self._watcher.watch(self._temp_dir.name)
+        self._watcher.stop()
+        self._wait_for(lambda: not self._manager.jobs)
+        self._app.processEvents()
+        self.assertEqual((self._watcher.directory, self._started), ("", []))
+
+
+if __name__ == '__main__':
+    unittest.main()
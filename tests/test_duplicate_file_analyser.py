@@ -0,0 +1,378 @@
+import asyncio
+import hashlib
+import os.path
+import tempfile
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+from src.family_album.utility_functions.find_duplicate_files_async import find_duplicate_files_async
+from src.family_album.utility_functions.find_duplicate_files_multythreaded import find_duplicate_files_multithreaded
+from src.family_album_lib import block_comparison
+from src.family_album_lib.block_comparison import compare_files
+from src.family_album_lib.directory_state import FileChanges
+from src.family_album_lib.duplicate_file_analyser import DuplicateFileAnalyser
+from src.family_album_lib.file_hashing import BufferPool, get_file_hash
+from src.family_album_lib.hash_cache import HashCache, file_signature
+from src.family_album_lib.hash_index import HashIndex
+from src.family_album_lib.io_concurrency import ConcurrencyController, iter_completed
+from src.family_album_lib.progress import ProgressTracker
+from src.family_album_lib.scan_checkpoint import ScanCheckpoint
+from src.family_album_lib.scan_control import CancellationToken
+from src.family_album_lib.staged_duplicate_search import StagedDuplicateSearch
+
+
+def _digest(text: str) -> str:
+    return hashlib.blake2b(text.encode()).hexdigest()
+
+
+class TestDuplicateFileAnalyser(unittest.TestCase):
+
+    def setUp(self):
+        self._temp_dir = tempfile.TemporaryDirectory()
+        self._data_path = self._temp_dir.name
+        big_block = os.urandom(64 * 1024)
+        self._files = {'unique.bin': os.urandom(1000),
+                       'small.bin': b'small file content',
+                       'small_copy.bin': b'small file content',
+                       'same_size.bin': b'small file CONTENT',
+                       'big.bin': big_block,
+                       'sub/big_copy.bin': big_block,
+                       'big_other_middle.bin': big_block[:30000] + bytes([big_block[30000] ^ 0xff]) + big_block[30001:]}
+        for name, content in self._files.items():
+            self._write(name, content)
+
+    def tearDown(self):
+        self._temp_dir.cleanup()
+
+    def _write(self, name: str, content: bytes) -> str:
+        full_name = os.path.join(self._data_path, *name.split('/'))
+        os.makedirs(os.path.dirname(full_name), exist_ok=True)
+        with open(full_name, 'wb') as file:
+            file.write(content)
+        return full_name
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self._data_path, *name.split('/'))
+
+    def _duplicate_groups(self, duplicates: dict) -> set:
+        return {frozenset([original] + copies) for original, copies in duplicates.items()}
+
+    def test_staged_search(self):
+        analyser = DuplicateFileAnalyser(self._data_path)
+        analyser.start_analysis_thread()
+        expected = {frozenset([self._path('small.bin'), self._path('small_copy.bin')]),
+                    frozenset([self._path('big.bin'), self._path('sub/big_copy.bin')])}
+        self.assertEqual(self._duplicate_groups(analyser.duplicate_files), expected)
+        # every file is reported exactly once
+        reported = [file for files in analyser.files_hashes.values() for file in files]
+        self.assertEqual(sorted(reported), sorted(self._path(name) for name in self._files))
+        self.assertIn(f"size:1000", analyser.files_hashes)
+
+    def test_progress_is_completed(self):
+        progress = []
+        analyser = DuplicateFileAnalyser(self._data_path, instantly_opened_files=8, min_opened_files=2)
+        analyser.update_progress = lambda finished, total, concurrency: progress.append((finished, total,
+                                                                                          concurrency.level))
+        analyser.start_analysis_thread()
+        self.assertEqual(progress[-1][:2], (len(self._files), len(self._files)))
+        self.assertTrue(all(2 <= level <= 8 for _, _, level in progress))
+
+    def test_progress_is_rate_limited(self):
+        now = [0.0]
+        updates = []
+        tracker = ProgressTracker(100, updates.append, rate=10, clock=lambda: now[0])
+        for _ in range(50):
+            now[0] += 0.01
+            tracker.advance(bytes_read=1000)
+        self.assertEqual(len(updates), 5)  # one update per 0.1 second, not one per file
+        self.assertAlmostEqual(updates[-1].files_per_second, 100)
+        self.assertAlmostEqual(updates[-1].bytes_per_second, 100_000)
+        self.assertAlmostEqual(updates[-1].eta, (100 - updates[-1].files_done) / 100)
+        tracker.finish()
+        self.assertTrue(updates[-1].finished)
+
+    def test_search_keeps_discovery_order(self):
+        search = StagedDuplicateSearch()
+        search.add_file('b', 10)
+        search.add_file('a', 10)
+        search.add_file('c', 20)
+        self.assertEqual(search.edge_hash_candidates(), [('b', 10), ('a', 10)])
+        self.assertEqual(search.add_edge_hash('a', 10, _digest('hash'), True), [])
+        self.assertEqual(search.add_edge_hash('b', 10, _digest('hash'), True), [])
+        self.assertEqual(search.duplicate_files, {'b': ['a']})
+        self.assertEqual(search.pending_count, 0)
+
+    def test_size_group_is_confirmed_before_others(self):
+        search = StagedDuplicateSearch()
+        for name, size in (('a', 10), ('b', 10), ('c', 20), ('d', 20)):
+            search.add_file(name, size)
+        search.edge_hash_candidates()
+        self.assertEqual(search.add_edge_hash('c', 20, _digest('edges'), False), [])
+        self.assertEqual(search.add_edge_hash('d', 20, _digest('edges'), False), ['c', 'd'])
+        self.assertEqual(search.add_edge_hash('a', 10, _digest('hash'), True), [])
+        self.assertEqual(search.add_edge_hash('b', 10, _digest('hash'), True), [])
+        self.assertEqual(search.pop_confirmed_groups(), [['a', 'b']])  # size 20 is still being hashed
+        search.add_full_hash('d', _digest('full'))
+        self.assertEqual(search.pop_confirmed_groups(), [])
+        self.assertEqual(search.discard_file('c'), [])
+        self.assertEqual(search.pop_confirmed_groups(), [])  # the only copy was not readable
+        self.assertEqual(search.pending_count, 0)
+
+    def test_hash_index_groups_by_sorting(self):
+        index = HashIndex()
+        names = [os.path.join('dir', name) for name in ('x', 'y', 'z')] + ['other/x', 'other/y']
+        for name in names:
+            index.add_file(name, 64)
+        for file_id, key in enumerate([_digest('b'), _digest('a'), _digest('b'), 'size:64',
+                                       f"edges:64:{_digest('a')}"]):
+            index.resolve(file_id, key)
+        self.assertEqual(index.path(3), names[3])
+        self.assertEqual(index.key(4), f"edges:64:{_digest('a')}")
+        self.assertEqual(list(index.files_hashes), [_digest('b'), _digest('a'), 'size:64', f"edges:64:{_digest('a')}"])
+        self.assertEqual(index.files_hashes[_digest('b')], [names[0], names[2]])
+        self.assertEqual(dict(index.duplicate_files), {names[0]: [names[2]]})
+        self.assertEqual(index.duplicate_files[names[0]], [names[2]])
+        with self.assertRaises(ValueError):
+            index.resolve(0, 'not a digest')
+
+    def test_iter_duplicate_groups(self):
+        analyser = DuplicateFileAnalyser(self._data_path)
+        groups = list(analyser.iter_duplicate_groups())
+        self.assertEqual(len(groups), 2)
+        self.assertEqual(dict(groups), analyser.duplicate_files)
+
+    def test_aiter_duplicate_groups(self):
+        async def _collect():
+            return [group async for group in analyser.aiter_duplicate_groups()]
+
+        analyser = DuplicateFileAnalyser(self._data_path)
+        self.assertEqual(dict(asyncio.run(_collect())), analyser.duplicate_files)
+        self.assertEqual(len(analyser.duplicate_files), 2)
+
+    def test_bounded_finders_match_analyser(self):
+        for i in range(50):
+            self._write(f'many/{i}.bin', self._files['big.bin'][:-1] + bytes([i % 5]))  # 5 groups of 10 copies
+        analyser = DuplicateFileAnalyser(self._data_path, instantly_opened_files=2)  # window is smaller than files
+        analyser.start_analysis_thread()
+        expected = {frozenset(files) for files in analyser.files_hashes.values()}
+        self.assertEqual(len(analyser.duplicate_files), 7)
+        result = asyncio.run(find_duplicate_files_async(self._data_path, readers=2))
+        self.assertEqual({frozenset(files) for files in result.values()}, expected)
+        result = find_duplicate_files_multithreaded(self._data_path, max_open_files=2)
+        self.assertEqual({frozenset(files) for files in result.values()}, expected)
+
+    def test_concurrency_follows_throughput(self):
+        def _settle(throughput) -> list:
+            now = [0.0]
+            controller = ConcurrencyController(1, 32, clock=lambda: now[0])
+            levels = []
+            for _ in range(40):
+                now[0] += 1
+                controller.record(throughput(controller.level), 0.01)
+                levels.append(controller.level)
+            return levels[-10:]
+
+        # fast storage scales up to its saturation point, spinning disk thrashed by parallel reads stays low
+        self.assertTrue(all(8 <= level <= 24 for level in _settle(lambda level: min(level, 16) * 100)))
+        self.assertTrue(all(level <= 3 for level in _settle(lambda level: 200 if level <= 2 else 200 - level * 5)))
+        with self.assertRaises(ValueError):
+            ConcurrencyController(4, 2)
+
+    def test_iter_completed_keeps_window(self):
+        futures = []
+
+        class _Executor(ThreadPoolExecutor):
+            def submit(self, *args, **kwargs):
+                futures.append(super().submit(*args, **kwargs))
+                return futures[-1]
+
+        with _Executor(max_workers=2) as executor:
+            results = []
+            for value, future in iter_completed(executor, lambda value: value * value, range(20), window=3):
+                self.assertLessEqual(len(futures) - len(results), 3)  # submitted and not yielded yet
+                results.append((value, future.result()))
+        self.assertEqual(sorted(results), [(value, value * value) for value in range(20)])
+        futures.clear()
+        with _Executor(max_workers=1) as executor:
+            completed = iter_completed(executor, time.sleep, [0.05] * 10, window=4)
+            next(completed)
+            completed.close()
+        self.assertEqual(len(futures), 4)
+        self.assertGreater(sum(future.cancelled() for future in futures), 0)  # files not started are dropped
+
+    def test_streaming_hash(self):
+        file_name = self._path('big.bin')
+        expected = hashlib.blake2b(self._files['big.bin']).hexdigest()
+        self.assertEqual(get_file_hash(file_name, bytearray(1000)), expected)
+
+    def test_buffer_pool_is_bounded(self):
+        pool = BufferPool(memory_limit=3000, block_size=1000)
+        buffers = [pool.acquire() for _ in range(pool.max_buffers)]
+        self.assertEqual(pool.max_buffers, 3)
+        pool.release(buffers[0])
+        self.assertIs(pool.acquire(), buffers[0])
+
+    def test_block_comparison_stops_at_difference(self):
+        size = 1024 * 1024
+        block = os.urandom(size)
+        names = [self._write('cmp/a.bin', block), self._write('cmp/b.bin', bytes([block[0] ^ 0xff]) + block[1:]),
+                 self._write('cmp/c.bin', block), self._write('cmp/d.bin', block[:-1] + bytes([block[-1] ^ 0xff]))]
+        comparison = compare_files(names, size, memory_limit=5 * 64 * 1024)
+        self.assertEqual(comparison.groups, [[names[0], names[2]], [names[1]], [names[3]]])
+        self.assertEqual(comparison.failed, {})
+        # the file differing in the first block is not read anymore
+        self.assertLess(comparison.bytes_read, 4 * size)
+        self.assertGreater(comparison.bytes_read, 3 * size - 64 * 1024)
+
+    def test_block_comparison_of_large_group_keeps_memory_limit(self):
+        size = 100 * 1024
+        contents = [os.urandom(size) for _ in range(3)]
+        names = [self._write(f'cmp/{i}.bin', contents[i % 3] if i < 9 else os.urandom(size)) for i in range(11)]
+        names.insert(4, self._path('cmp/missing.bin'))
+        memory_limit = 4 * 64 * 1024  # three files at once
+
+        def _compare_batch(file_names, file_size, block_size, max_open_files):
+            self.assertLessEqual((len(file_names) + 1) * block_size, memory_limit)
+            return compare_batch(file_names, file_size, block_size, max_open_files)
+
+        compare_batch = block_comparison._compare_batch
+        with mock.patch.object(block_comparison, '_compare_batch', side_effect=_compare_batch) as batches:
+            comparison = compare_files(names, size, memory_limit=memory_limit)
+        self.assertGreater(batches.call_count, 1)
+        files = [name for name in names if not name.endswith('missing.bin')]
+        self.assertEqual(comparison.groups, [files[0:9:3], files[1:9:3], files[2:9:3], [files[9]], [files[10]]])
+        self.assertEqual(list(comparison.failed), [names[4]])
+
+    def test_block_matching_finds_same_duplicates(self):
+        analyser = DuplicateFileAnalyser(self._data_path)
+        analyser.start_analysis_thread()
+        block_analyser = DuplicateFileAnalyser(self._data_path)
+        block_analyser.matching = DuplicateFileAnalyser.BLOCK_MATCHING
+        block_analyser.start_analysis_thread()
+        self.assertEqual(dict(block_analyser.duplicate_files), dict(analyser.duplicate_files))
+        self.assertEqual(sum(map(len, block_analyser.files_hashes.values())), len(self._files))
+        with self.assertRaises(ValueError):
+            block_analyser.matching = 'unknown'
+
+    def test_update_files_keeps_groups_current(self):
+        analyser = DuplicateFileAnalyser(self._data_path)
+        analyser.start_analysis_thread()
+        unique_copy = self._write('sub/unique_copy.bin', self._files['unique.bin'])
+        new_unique = self._write('new_unique.bin', b'no other file has this size')
+        with mock.patch('src.family_album_lib.duplicate_file_analyser.get_file_hash', wraps=get_file_hash) as hashed:
+            analyser.update_files(FileChanges(added=[unique_copy, new_unique]))
+        self.assertEqual(hashed.call_count, 2)  # the new copy and the file that had unique size
+        self.assertEqual(analyser.duplicate_files[self._path('unique.bin')], [unique_copy])
+        self.assertIn(f"size:{len(b'no other file has this size')}", analyser.files_hashes)
+        os.remove(self._path('small_copy.bin'))
+        self._write('sub/big_copy.bin', b'changed')
+        analyser.update_files(FileChanges(removed=[self._path('small_copy.bin')],
+                                          modified=[self._path('sub/big_copy.bin')]))
+        self.assertEqual(self._duplicate_groups(analyser.duplicate_files),
+                         {frozenset([self._path('unique.bin'), unique_copy])})
+        reported = [file for files in analyser.files_hashes.values() for file in files]
+        self.assertEqual(len(reported), len(self._files) + 1)
+
+    def test_hash_cache_is_reused_and_evicted(self):
+        cache_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(cache_dir.cleanup)
+        cache = HashCache(os.path.join(cache_dir.name, 'cache.db'))
+        self.addCleanup(cache.close)
+        analyser = DuplicateFileAnalyser(self._data_path)
+        analyser.hash_cache = cache
+        analyser.start_analysis_thread()
+        expected = self._duplicate_groups(analyser.duplicate_files)
+        # warm rescan does not read files at all
+        with mock.patch('src.family_album_lib.duplicate_file_analyser.get_file_hash', side_effect=AssertionError), \
+                mock.patch('src.family_album_lib.duplicate_file_analyser.get_file_edges_hash',
+                           side_effect=AssertionError):
+            analyser.start_analysis_thread()
+        self.assertEqual(self._duplicate_groups(analyser.duplicate_files), expected)
+        removed = self._path('small_copy.bin')
+        signature = file_signature(os.stat(removed))
+        os.remove(removed)
+        analyser.start_analysis_thread()
+        self.assertIsNone(cache.lookup(removed, signature))
+
+    def test_cancelled_scan_resumes_from_checkpoint(self):
+        checkpoint_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(checkpoint_dir.cleanup)
+        checkpoint = ScanCheckpoint(os.path.join(checkpoint_dir.name, 'checkpoint.db'))
+        self.addCleanup(checkpoint.close)
+        token = CancellationToken()
+
+        def _hash_and_cancel(file_name, buffer=None):
+            token.cancel()
+            return get_file_hash(file_name, buffer)
+
+        analyser = DuplicateFileAnalyser(self._data_path, instantly_opened_files=1)
+        analyser.checkpoint = checkpoint
+        with mock.patch('src.family_album_lib.duplicate_file_analyser.get_file_hash', side_effect=_hash_and_cancel):
+            analyser.start_analysis_thread(token)
+        self.assertTrue(analyser.cancelled)
+        self.assertEqual(len(checkpoint.load_walk(self._data_path)), 2)
+        # restarted scan does not walk directories nor hash the file done before cancellation again
+        with mock.patch('src.family_album_lib.duplicate_file_analyser.get_file_hash', wraps=get_file_hash) as hashed, \
+                mock.patch('os.stat', wraps=os.stat) as stat:
+            analyser.start_analysis_thread()
+        self.assertFalse(analyser.cancelled)
+        self.assertEqual(hashed.call_count, 2)
+        # directories are not listed again, only their modification time and stat of their files are checked
+        self.assertEqual(stat.call_count, 2 + len(self._files))
+        self.assertEqual(len(analyser.duplicate_files), 2)
+        self.assertEqual(checkpoint.load_walk(self._data_path), {})
+
+    def test_file_edited_after_cancel_is_hashed_again(self):
+        checkpoint_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(checkpoint_dir.cleanup)
+        checkpoint = ScanCheckpoint(os.path.join(checkpoint_dir.name, 'checkpoint.db'))
+        self.addCleanup(checkpoint.close)
+        token = CancellationToken()
+
+        def _hash_and_cancel(file_name, buffer=None):
+            token.cancel()
+            return get_file_hash(file_name, buffer)
+
+        analyser = DuplicateFileAnalyser(self._data_path, instantly_opened_files=1)
+        analyser.checkpoint = checkpoint
+        with mock.patch('src.family_album_lib.duplicate_file_analyser.get_file_hash', side_effect=_hash_and_cancel):
+            analyser.start_analysis_thread(token)
+        self.assertTrue(analyser.cancelled)
+        # editing the file in place keeps modification time of its directory
+        directory_mtime = os.stat(self._data_path).st_mtime_ns
+        self._write('small_copy.bin', b'edited content of the small copy')
+        os.utime(self._data_path, ns=(directory_mtime, directory_mtime))
+        analyser.start_analysis_thread()
+        self.assertFalse(analyser.cancelled)
+        self.assertEqual(self._duplicate_groups(analyser.duplicate_files),
+                         {frozenset([self._path('big.bin'), self._path('sub/big_copy.bin')])})
+
+    def test_paused_scan_waits_for_resume(self):
+        token = CancellationToken()
+        token.pause()
+        self.assertFalse(token.wait_while_paused(0.01))
+        token.resume()
+        self.assertTrue(token.wait_while_paused())
+        token.pause()
+        token.cancel()
+        self.assertFalse(token.wait_while_paused())
+        analyser = DuplicateFileAnalyser(self._data_path)
+        self.assertEqual(list(analyser.iter_duplicate_groups(token)), [])
+        self.assertTrue(analyser.cancelled)
+
+    @unittest.skipUnless(hasattr(os, 'link'), "hardlinks are not supported")
+    def test_hardlinks_are_not_duplicates(self):
+        link_name = self._path('sub/big_link.bin')
+        os.link(self._path('big.bin'), link_name)
+        analyser = DuplicateFileAnalyser(self._data_path)
+        analyser.start_analysis_thread()
+        self.assertEqual(analyser.hardlinked_files, {self._path('big.bin'): [link_name]})
+        reported = [file for files in analyser.files_hashes.values() for file in files]
+        self.assertNotIn(link_name, reported)
+        self.assertIn([self._path('sub/big_copy.bin')], analyser.duplicate_files.values())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,92 @@
+import os
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+from src.family_album.utility_functions.file_utils import get_file_creation_date
+from src.family_album.utility_functions.get_files_and_subdirs_count import get_files_and_subdirs_count
+from src.family_album_lib.file_walker import walk_directory, walk_files
+
+
+class TestFileWalker(unittest.TestCase):
+
+    def setUp(self):
+        self._temp_dir = tempfile.TemporaryDirectory()
+        self._data_path = self._temp_dir.name
+        for name in ('a.txt', 'b/c.txt', 'b/d/e.txt', 'b/d/f.txt', 'g/h.txt'):
+            full_name = os.path.join(self._data_path, *name.split('/'))
+            os.makedirs(os.path.dirname(full_name), exist_ok=True)
+            with open(full_name, 'wb') as file:
+                file.write(name.encode())
+
+    def tearDown(self):
+        self._temp_dir.cleanup()
+
+    def test_walk_follows_os_walk(self):
+        expected = [(dirpath, sorted(dirnames), sorted(filenames))
+                    for dirpath, dirnames, filenames in os.walk(self._data_path)]
+        walked = [(dirpath, sorted(dirnames), sorted(record.name for record in records))
+                  for dirpath, dirnames, records in walk_directory(self._data_path)]
+        self.assertEqual(sorted(walked), sorted(expected))
+        self.assertEqual(get_files_and_subdirs_count(self._data_path), (5, 3))
+
+    def test_pruned_directories_are_not_walked(self):
+        walked = []
+        for dirpath, dirnames, _ in walk_directory(self._data_path):
+            walked.append(dirpath)
+            if 'd' in dirnames:
+                dirnames.remove('d')
+        self.assertNotIn(os.path.join(self._data_path, 'b', 'd'), walked)
+        self.assertEqual(len(walked), 3)
+
+    def test_stat_is_requested_once(self):
+        record = next(record for record in walk_files(self._data_path) if record.name == 'a.txt')
+        self.assertEqual(record.size, len(b'a.txt'))
+        self.assertIs(record.stat, record.stat)
+        with mock.patch('os.stat', side_effect=AssertionError):
+            self.assertIsNotNone(get_file_creation_date(record.path, record.stat))
+
+    def test_parallel_walk_keeps_order(self):
+        expected = [(dirpath, dirnames, [record.path for record in records])
+                    for dirpath, dirnames, records in walk_directory(self._data_path)]
+        walked = [(dirpath, dirnames, [record.path for record in records])
+                  for dirpath, dirnames, records in walk_directory(self._data_path, workers=4)]
+        self.assertEqual(walked, expected)
+        unordered = list(walk_directory(self._data_path, workers=4, ordered=False))
+        self.assertEqual(sorted(dirpath for dirpath, _, _ in unordered), sorted(dirpath for dirpath, _, _ in expected))
+        self.assertEqual(get_files_and_subdirs_count(self._data_path, walk_workers=4), (5, 3))
+
+    def test_parallel_walk_hides_latency(self):
+        for i in range(12):
+            os.makedirs(os.path.join(self._data_path, 'many', str(i)))
+        scandir = os.scandir
+
+        def _slow_scandir(path):
+            time.sleep(0.05)  # latency of a network file system
+            return scandir(path)
+
+        with mock.patch('os.scandir', side_effect=_slow_scandir):
+            start = time.perf_counter()
+            sequential = [dirpath for dirpath, _, _ in walk_directory(self._data_path)]
+            sequential_time = time.perf_counter() - start
+            start = time.perf_counter()
+            parallel = [dirpath for dirpath, _, _ in walk_directory(self._data_path, workers=8)]
+            parallel_time = time.perf_counter() - start
+        self.assertEqual(parallel, sequential)
+        self.assertLess(parallel_time, sequential_time / 2)
+
+    def test_parallel_walk_prunes_and_reports_errors(self):
+        errors = []
+        walked = []
+        for dirpath, dirnames, _ in walk_directory(self._data_path, errors.append, workers=4, ordered=False):
+            walked.append(dirpath)
+            if 'd' in dirnames:
+                dirnames.remove('d')
+        self.assertEqual(len(walked), 3)
+        list(walk_directory(os.path.join(self._data_path, 'missing'), errors.append, workers=4))
+        self.assertEqual(len(errors), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
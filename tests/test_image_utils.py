@@ -1,10 +1,14 @@
 import pandas as pd
 import os.path
+import tempfile
 import unittest
 from datetime import datetime
 
+from PIL import Image
+
 from src.family_album.utility_functions.image_utils import (is_image_file, get_image_size, get_image_creation_date,
-                                                            get_image_exif)
+                                                            get_image_exif, get_image_metadata, get_image_maker,
+                                                            get_image_gps_coordinates)
 
 
 class TestImageUtils(unittest.TestCase):
@@ -59,3 +63,31 @@ class TestImageUtils(unittest.TestCase):
                 exif_ = get_image_exif(full_name)
                 expected_size = self._exif_size[file]
                 self.assertEqual(expected_size, len(exif_))
+
+
+    def test_image_metadata(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            file_name = os.path.join(temp_dir, 'exif.jpg')
+            image = Image.new('RGB', (64, 48))
+            exif = image.getexif()
+            exif[271] = 'Maker'  # Make
+            exif[272] = 'Model'
+            exif[306] = '2021:05:06 07:08:09'  # DateTime
+            exif.get_ifd(0x8769)[36867] = '2020:01:02 03:04:05'  # DateTimeOriginal
+            exif.get_ifd(0x8825).update({1: 'N', 2: (50.0, 30.0, 0.0), 3: 'W', 4: (10.0, 15.0, 36.0)})
+            image.save(file_name, exif=exif)
+
+            metadata = get_image_metadata(file_name)
+            self.assertEqual(metadata.resolution, (64, 48))
+            self.assertEqual((metadata.make, metadata.model), ('Maker', 'Model'))
+            self.assertEqual(set(metadata.dates), {'DateTime', 'DateTimeOriginal'})
+            self.assertEqual(metadata.date_taken, datetime(2020, 1, 2, 3, 4, 5))
+            self.assertEqual(get_image_creation_date(file_name), metadata.date_taken)
+            self.assertEqual(get_image_maker(file_name), 'Maker')
+            self.assertEqual(get_image_gps_coordinates(file_name), (50.5, -10.26))
+
+            text_file = os.path.join(temp_dir, 'text.txt')
+            with open(text_file, 'w') as f:
+                f.write('not an image')
+            self.assertIsNone(get_image_metadata(text_file))
+            self.assertEqual(get_image_maker(text_file), '')
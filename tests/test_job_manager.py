@@ -0,0 +1,95 @@
+import threading
+import time
+import unittest
+
+from PyQt6.QtCore import QCoreApplication
+
+from src.family_album.gui.job_manager import JobManager
+from src.family_album_lib.progress import ProgressTracker
+
+
+class TestJobManager(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls._app = QCoreApplication.instance() or QCoreApplication([])
+
+    def setUp(self):
+        self._manager = JobManager(max_jobs=1)
+        self._events = []
+        self._manager.JobStarted.connect(lambda job_id, name: self._events.append(('started', job_id)))
+        self._manager.JobProgress.connect(lambda job_id, progress: self._events.append(('progress', job_id)))
+        self._manager.JobFinished.connect(lambda job_id, result: self._events.append(('finished', job_id, result)))
+        self._manager.JobCancelled.connect(lambda job_id: self._events.append(('cancelled', job_id)))
+
+    def tearDown(self):
+        self._manager.cancel_all()
+        self._manager.wait()
+
+    def _wait_for_jobs(self):
+        deadline = time.monotonic() + 10
+        while self._manager.jobs and time.monotonic() < deadline:
+            self._app.processEvents()
+            time.sleep(0.01)
+        self._app.processEvents()
+
+    def test_result_is_delivered_by_signal(self):
+        def _job(token, report):
+            progress = ProgressTracker(10, lambda snapshot: report(snapshot.files_done, snapshot.files_total,
+                                                                   snapshot))
+            for _ in range(10):
+                progress.advance()
+            progress.finish()
+            return threading.get_ident()
+
+        job_id = self._manager.submit("job", _job)
+        self._wait_for_jobs()
+        self.assertEqual(self._events[0], ('started', job_id))
+        self.assertIn(('progress', job_id), self._events)
+        self.assertEqual(self._events[-1][:2], ('finished', job_id))
+        self.assertNotEqual(self._events[-1][2], threading.get_ident())  # the job ran in the background
+
+    def test_paused_and_queued_jobs_are_cancelled(self):
+        running = threading.Event()
+
+        def _job(token, report):
+            running.set()
+            while token.wait_while_paused(0.01) or token.is_paused:
+                time.sleep(0.01)
+            return "not cancelled"
+
+        first = self._manager.submit("first", _job)
+        queued = self._manager.submit("queued", _job)  # one job runs at a time
+        self.assertTrue(running.wait(5))
+        self._manager.pause_all()
+        self.assertTrue(self._manager.is_paused)
+        self._manager.cancel(queued)
+        self.assertEqual(self._events[-1], ('cancelled', queued))  # queued job is dropped at once
+        self._manager.cancel(first)
+        self._wait_for_jobs()
+        self.assertEqual(self._events[-1], ('cancelled', first))
+        self.assertNotIn('finished', [event[0] for event in self._events])
+
+    def test_running_job_is_cancelled_when_it_returns(self):
+        running = threading.Event()
+        reported = []
+
+        def _job(token, report):
+            running.set()
+            while not token.is_cancelled:
+                time.sleep(0.01)
+            report(0, 0)  # the progress bus still exists after cancellation
+            reported.append(True)
+            return "cancelled"
+
+        job_id = self._manager.submit("job", _job)
+        self.assertTrue(running.wait(5))
+        self._manager.cancel(job_id)  # the job has not reported progress yet
+        self.assertIn(job_id, self._manager.jobs)
+        self._wait_for_jobs()
+        self.assertEqual(reported, [True])
+        self.assertEqual([event for event in self._events if event[0] == 'cancelled'], [('cancelled', job_id)])
+
+
+if __name__ == '__main__':
+    unittest.main()
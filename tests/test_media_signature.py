@@ -0,0 +1,46 @@
+import os
+import tempfile
+import unittest
+
+from src.family_album_lib.media_signature import MediaType, detect_media_type
+
+
+class TestMediaSignature(unittest.TestCase):
+
+    def setUp(self):
+        self._data_path = os.path.abspath('./data/')
+
+    def test_data_files_are_classified(self):
+        expected = {'test.jpg': MediaType("jpeg", True, False), 'test.gif': MediaType("gif", True, True),
+                    'test.mp4': MediaType("mp4", False, True), 'test.mov': MediaType("mov", False, True),
+                    'test.3g2': MediaType("3g2", False, True), 'test.flv': MediaType("flv", False, True)}
+        for sub_dir in ('images', 'video'):
+            for file in os.listdir(os.path.join(self._data_path, sub_dir)):
+                media_type = detect_media_type(os.path.join(self._data_path, sub_dir, file))
+                self.assertIsNotNone(media_type, file)
+                self.assertEqual(media_type.is_video, sub_dir == 'video', file)
+                if file in expected:
+                    self.assertEqual(media_type, expected[file])
+
+    def test_headers(self):
+        packet = b'\x47' + b'\x00' * 187
+        headers = {b'\x00\x00\x00\x18ftypheic\x00\x00\x00\x00mif1heic': MediaType("heic", True, False),
+                   b'RIFF\x00\x00\x00\x00AVI LIST': MediaType("avi", False, True),
+                   b'\x1a\x45\xdf\xa3\x93\x42\x82\x88matroska': MediaType("mkv", False, True),
+                   b'II*\x00\x10\x00\x00\x00CR\x02\x00': MediaType("cr2", True, False),
+                   (b'\x00' * 4 + packet) * 3: MediaType("mts", False, True),
+                   b'GIF89a\x01\x00\x01\x00\x00\x00\x00': MediaType("gif", True, False)}
+        with tempfile.TemporaryDirectory() as temp_dir:
+            file_name = os.path.join(temp_dir, 'media')
+            for header, media_type in headers.items():
+                with open(file_name, 'wb') as f:
+                    f.write(header)
+                self.assertEqual(detect_media_type(file_name), media_type)
+            with open(file_name, 'w') as f:
+                f.write('plain text')
+            self.assertIsNone(detect_media_type(file_name))
+            self.assertIsNone(detect_media_type(temp_dir))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,69 @@
+import os.path
+import random
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from PIL import Image
+
+from src.family_album_lib.io_concurrency import iter_completed
+from src.family_album_lib.similar_image_analyser import (BKTree, SimilarImageAnalyser, hamming_distance,
+                                                         image_dhash, image_phash)
+
+
+class TestSimilarImageAnalyser(unittest.TestCase):
+
+    def setUp(self):
+        self._data_path = os.path.abspath('./data/duplication_check/')
+        self._temp_dir = tempfile.TemporaryDirectory()
+        self._original = os.path.join(self._data_path, 'test_image_1.jpg')
+        with Image.open(self._original) as image:
+            self._resized = os.path.join(self._temp_dir.name, 'resized.jpg')
+            image.resize((image.width // 3, image.height // 3)).save(self._resized, quality=60)
+
+    def tearDown(self):
+        self._temp_dir.cleanup()
+
+    def test_resized_image_is_similar(self):
+        for hash_function in (image_dhash, image_phash):
+            distance = hamming_distance(hash_function(self._original), hash_function(self._resized))
+            self.assertLessEqual(distance, 10)
+            other = hash_function(os.path.join(self._data_path, 'test_image_2.jpg'))
+            self.assertGreater(hamming_distance(hash_function(self._original), other), 10)
+
+    def test_bk_tree_search(self):
+        generator = random.Random(5)
+        hashes = [generator.getrandbits(64) for _ in range(500)]
+        tree = BKTree()
+        for i, value in enumerate(hashes):
+            tree.add(value, str(i))
+        query = hashes[0] ^ 0b1011
+        expected = sorted((hamming_distance(query, value), str(i)) for i, value in enumerate(hashes)
+                          if hamming_distance(query, value) <= 20)
+        self.assertEqual(tree.search(query, 20), expected)
+        self.assertEqual(len(tree), 500)
+
+    def test_analyser_groups_similar_images(self):
+        shutil.copy(self._original, self._temp_dir.name)
+        shutil.copy(os.path.join(self._data_path, 'test_image_2.jpg'), self._temp_dir.name)
+        analyser = SimilarImageAnalyser(self._temp_dir.name)
+        analyser.start_analysis_thread()
+        groups = {frozenset([original] + files) for original, files in analyser.duplicate_files.items()}
+        self.assertEqual(groups, {frozenset([os.path.join(self._temp_dir.name, 'test_image_1.jpg'),
+                                             self._resized])})
+
+    def test_analyser_bounds_submitted_files(self):
+        for i in range(12):
+            shutil.copy(self._resized, os.path.join(self._temp_dir.name, f'copy_{i}.jpg'))
+        analyser = SimilarImageAnalyser(self._temp_dir.name, workers=1)
+        analyser._WINDOW_FACTOR = 2
+        with mock.patch('src.family_album_lib.similar_files_analyser.iter_completed',
+                        wraps=iter_completed) as completed:
+            analyser.start_analysis_thread()
+        self.assertEqual(completed.call_args.args[3], 2)  # files submitted at most
+        self.assertEqual(len(analyser.duplicate_files), 1)
+        self.assertEqual(len(analyser.signatures), 13)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,55 @@
+import os.path
+import tempfile
+import unittest
+
+import cv2
+import numpy as np
+
+from src.family_album_lib.similar_video_analyser import SimilarVideoAnalyser, signature_distance, video_signature
+
+
+class TestSimilarVideoAnalyser(unittest.TestCase):
+
+    def setUp(self):
+        self._temp_dir = tempfile.TemporaryDirectory()
+        generator = np.random.default_rng(7)
+        scenes = [cv2.resize(generator.integers(0, 255, (6, 8, 3), dtype=np.uint8), (320, 240),
+                             interpolation=cv2.INTER_CUBIC) for _ in range(10)]
+        other_scenes = [cv2.resize(generator.integers(0, 255, (6, 8, 3), dtype=np.uint8), (320, 240),
+                                   interpolation=cv2.INTER_CUBIC) for _ in range(10)]
+        self._original = self._write('original.avi', scenes, (320, 240))
+        self._reencoded = self._write('reencoded.avi', scenes[1:], (160, 120))  # smaller and trimmed
+        self._other = self._write('other.avi', other_scenes, (320, 240))
+
+    def tearDown(self):
+        self._temp_dir.cleanup()
+
+    def _write(self, name: str, scenes: list, size: tuple) -> str:
+        file_name = os.path.join(self._temp_dir.name, name)
+        writer = cv2.VideoWriter(file_name, cv2.VideoWriter_fourcc(*'MJPG'), 10, size)
+        for scene in scenes:
+            for _ in range(10):  # one second per scene
+                writer.write(cv2.resize(scene, size))
+        writer.release()
+        return file_name
+
+    def test_video_signature(self):
+        signature = video_signature(self._original)
+        self.assertAlmostEqual(signature.duration, 10, delta=0.5)
+        self.assertEqual(len(signature.frame_hashes), 10)
+        self.assertIsNone(video_signature(os.path.join(self._temp_dir.name, 'missing.avi')))
+
+    def test_reencoded_video_is_similar(self):
+        original = video_signature(self._original)
+        self.assertLess(signature_distance(original, video_signature(self._reencoded)), 8)
+        self.assertGreater(signature_distance(original, video_signature(self._other)), 8)
+
+    def test_analyser_groups_similar_videos(self):
+        analyser = SimilarVideoAnalyser(self._temp_dir.name)
+        analyser.start_analysis_thread()
+        groups = {frozenset([original] + files) for original, files in analyser.duplicate_files.items()}
+        self.assertEqual(groups, {frozenset([self._original, self._reencoded])})
+
+
+if __name__ == '__main__':
+    unittest.main()
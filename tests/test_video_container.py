@@ -0,0 +1,115 @@
+import os
+import struct
+import tempfile
+import unittest
+from unittest import mock
+from datetime import datetime, timezone
+
+from src.family_album.utility_functions.analyze_directory import analyze_directory
+from src.family_album.utility_functions.video_utils import get_video_creation_date, get_video_metadata
+from src.family_album_lib.video_container import read_video_info
+
+
+_VIDEO_UTILS = 'src.family_album.utility_functions.video_utils'
+# sequence parameter set of 640x360 H.264 stream at 30 frames per second written by x264
+_SPS = bytes.fromhex('6764001eacd940a02ff970110000030001000003003c0f162d96')
+
+
+def _box(box_type: bytes, *children: bytes) -> bytes:
+    payload = b''.join(children)
+    return struct.pack('>I4s', 8 + len(payload), box_type) + payload
+
+
+def _ts_packet(pid: int, payload: bytes = b'', pcr: int = None, timestamp: bool = False) -> bytes:
+    control = 0x10 if payload else 0x00
+    adaptation = b''
+    if pcr is not None:
+        control |= 0x20
+        adaptation = bytes([7, 0x10]) + ((pcr << 15) | (0x3f << 9)).to_bytes(6, 'big')
+    start = 0x40 if payload else 0x00
+    packet = bytes([0x47, start | (pid >> 8), pid & 0xff, control]) + adaptation + (b'\x00' + payload if payload
+                                                                                      else b'')
+    return (b'\x00' * 4 if timestamp else b'') + packet + b'\xff' * (188 - len(packet))
+
+
+class TestVideoContainer(unittest.TestCase):
+
+    def setUp(self):
+        self._temp_dir = tempfile.TemporaryDirectory()
+        self._created = datetime(2021, 10, 9, 11, 52, 44, tzinfo=timezone.utc)
+
+    def tearDown(self):
+        self._temp_dir.cleanup()
+
+    def _write(self, file_name: str, data: bytes) -> str:
+        full_name = os.path.join(self._temp_dir.name, file_name)
+        with open(full_name, 'wb') as f:
+            f.write(data)
+        return full_name
+
+    def test_mp4_atoms(self):
+        seconds = int((self._created - datetime(1904, 1, 1, tzinfo=timezone.utc)).total_seconds())
+        mvhd = _box(b'mvhd', b'\x00' * 4, struct.pack('>IIII', seconds, seconds, 1000, 5000), b'\x00' * 80)
+        audio = _box(b'trak', _box(b'mdia', _box(b'hdlr', b'\x00' * 8, b'soun', b'\x00' * 12)))
+        sample_entry = struct.pack('>I4s', 86, b'avc1') + b'\x00' * 24 + struct.pack('>HH', 640, 480)
+        video = _box(b'trak', _box(b'tkhd', b'\x00' * 76, struct.pack('>II', 640 << 16, 480 << 16)),
+                     _box(b'mdia', _box(b'hdlr', b'\x00' * 8, b'vide', b'\x00' * 12),
+                          _box(b'mdhd', b'\x00' * 4, struct.pack('>IIII', 0, 0, 25, 125), b'\x00' * 4),
+                          _box(b'minf', _box(b'hdlr', b'\x00' * 8, b'alis', b'\x00' * 12),
+                               _box(b'stbl', _box(b'stsd', b'\x00' * 4, struct.pack('>I', 1), sample_entry),
+                                    _box(b'stts', b'\x00' * 4, struct.pack('>III', 1, 125, 1))))))
+        # 'moov' is written after the media data as cameras do
+        file_name = self._write('video.mp4', _box(b'ftyp', b'isom', b'\x00' * 4, b'isommp41') +
+                                _box(b'mdat', b'\x00' * 100000) + _box(b'moov', mvhd, audio, video))
+
+        info = read_video_info(file_name)
+        local_created = self._created.astimezone().replace(tzinfo=None)
+        self.assertEqual((info.container, info.creation_time, info.duration), ('mp4', local_created, 5.0))
+        self.assertEqual((info.resolution, info.fps, info.codec), ((640, 480), 25.0, 'avc1'))
+        metadata = get_video_metadata(file_name)
+        self.assertEqual((metadata['resolution'], metadata['bitrate']), ([640, 480], 25))
+        self.assertEqual(get_video_creation_date(file_name, metadata), local_created)
+
+    def test_fragmented_mp4_without_frame_rate(self):
+        mvhd = _box(b'mvhd', b'\x00' * 4, struct.pack('>IIII', 0, 0, 1000, 0), b'\x00' * 80)
+        video = _box(b'trak', _box(b'tkhd', b'\x00' * 76, struct.pack('>II', 640 << 16, 480 << 16)),
+                     _box(b'mdia', _box(b'hdlr', b'\x00' * 8, b'vide', b'\x00' * 12),
+                          _box(b'mdhd', b'\x00' * 4, struct.pack('>IIII', 0, 0, 25, 0), b'\x00' * 4),
+                          _box(b'minf', _box(b'stbl', _box(b'stts', b'\x00' * 4, struct.pack('>I', 0))))))
+        file_name = self._write('fragmented.mp4', _box(b'ftyp', b'isom', b'\x00' * 4, b'isomiso5') +
+                                _box(b'moov', mvhd, video) + _box(b'moof') + _box(b'mdat', b'\x00' * 1000))
+        self.assertEqual(read_video_info(file_name).as_metadata(),
+                         {'container': 'mp4', 'resolution': [640, 480]})
+        with mock.patch(f'{_VIDEO_UTILS}._get_video_meta_data_from_moviepy', side_effect=OSError), \
+                mock.patch(f'{_VIDEO_UTILS}._get_video_meta_data_from_cv2', side_effect=OSError):
+            data_frame = analyze_directory(self._temp_dir.name)  # the video can not be decoded either
+        self.assertEqual(list(data_frame['resolution']), ['[640, 480]'])
+        self.assertEqual((data_frame['video_bitrate'][0], data_frame['video_duration'][0]), (0, 0))
+
+    def test_mts_packets(self):
+        pat = bytes([0x00, 0xb0, 13, 0x00, 0x01, 0xc1, 0x00, 0x00, 0x00, 0x01, 0xe1, 0x00]) + b'\x00' * 4
+        pmt = bytes([0x02, 0xb0, 18, 0x00, 0x01, 0xc1, 0x00, 0x00, 0xe1, 0x01, 0xf0, 0x00,
+                     0x1b, 0xe1, 0x01, 0xf0, 0x00]) + b'\x00' * 4
+        pes = b'\x00\x00\x01\xe0\x00\x00\x80\x00\x00' + b'\x00\x00\x00\x01\x09\xf0' + b'\x00\x00\x00\x01' + _SPS
+        packets = [_ts_packet(0, pat, timestamp=True), _ts_packet(0x100, pmt, timestamp=True),
+                   _ts_packet(0x101, pcr=90000, timestamp=True), _ts_packet(0x101, pes[1:], timestamp=True)]
+        packets += [_ts_packet(0x101, timestamp=True)] * 500 + [_ts_packet(0x101, pcr=90000 * 4, timestamp=True)]
+        file_name = self._write('video.mts', b''.join(packets))
+        info = read_video_info(file_name)
+        self.assertEqual((info.container, info.duration, info.codec), ('mts', 3.0, 'h264'))
+        self.assertEqual((info.resolution, info.fps), ((640, 360), 30.0))
+        with mock.patch(f'{_VIDEO_UTILS}.VideoFileClip', side_effect=AssertionError):
+            self.assertEqual(get_video_metadata(file_name)['resolution'], [640, 360])  # ffmpeg is not started
+        self.assertIsNone(read_video_info(self._write('text.mts', b'not a video')))
+
+    def test_malformed_movie_header(self):
+        ftyp = _box(b'ftyp', b'isom', b'\x00' * 4, b'isommp41')
+        headers = {'empty.mp4': _box(b'mvhd'), 'truncated.mp4': _box(b'mvhd', b'\x00' * 10),
+                   'overflow.mp4': _box(b'mvhd', b'\x01\x00\x00\x00', struct.pack('>QQIQ', 1 << 63, 0, 1000, 1))}
+        for file_name, mvhd in headers.items():
+            self.assertIsNone(read_video_info(self._write(file_name, ftyp + _box(b'moov', mvhd))), file_name)
+            self.assertIsInstance(get_video_metadata(os.path.join(self._temp_dir.name, file_name)), dict)
+
+
+if __name__ == '__main__':
+    unittest.main()